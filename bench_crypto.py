@@ -0,0 +1,345 @@
+"""Crypto micro-benchmarks for the card, ballot, export and key formats.
+
+Times the code paths the BMD actually runs, with throwaway keys so no
+device secrets are needed:
+
+  card_rsa_oaep   RSA-OAEP-SHA256 voter card payloads (rfid_service.decrypt_card_ciphertext)
+  card_x25519     compact X25519 + AES-GCM voter card payloads (card_crypto)
+  ballot_decrypt  chunked AES-GCM ballot envelopes, JSON parse + decrypt (chunked_aead)
+  ballot_encrypt  chunked AES-GCM ballot envelopes, encrypt + JSON dump
+  export_aes_gcm  whole-file AES-GCM export (ExportService.encrypt_file_with_stored_aes)
+  export_stream   chunked AES-GCM stream export (ExportService.encrypt_file_stream)
+  pem_unlock      PKCS#8 passphrase-protected private.pem load
+
+Plaintexts come from a seeded PRNG so runs are repeatable.  Results are JSON
+(ops/sec and latency percentiles per case, plus platform and firmware info)
+so runs from different boards or firmware versions can be diffed.
+
+Usage:
+  python bench_crypto.py
+  python bench_crypto.py --quick --out bench_pi4.json
+  python bench_crypto.py --only ballot_decrypt --iterations 200
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from cryptography import __version__ as cryptography_version
+from cryptography.hazmat.backends.openssl.backend import backend as openssl_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from card_crypto import decrypt_card_token_x25519, encrypt_card_token_x25519
+from card_format import blocks_for_length
+from chunked_aead import decrypt_envelope, encrypt_envelope
+from export_service import ExportService
+from rfid_service import decrypt_card_ciphertext
+
+RSA_KEY_BITS = 2048
+RSA_OAEP_MAX_PLAINTEXT = RSA_KEY_BITS // 8 - 2 * 32 - 2   # 190 bytes for SHA-256 OAEP
+
+CARD_RSA_BLOCKS = [1, 2, 3]
+BALLOT_SIZES = [1024, 16 * 1024, 256 * 1024]
+BALLOT_CHUNK_SIZES = [4 * 1024, 64 * 1024]
+EXPORT_SIZES = [64 * 1024, 1024 * 1024, 8 * 1024 * 1024]
+
+QUICK_BALLOT_SIZES = [1024, 16 * 1024]
+QUICK_EXPORT_SIZES = [64 * 1024, 1024 * 1024]
+
+BENCHMARKS = [
+    "card_rsa_oaep", "card_x25519", "ballot_decrypt", "ballot_encrypt", "export_aes_gcm", "export_stream", "pem_unlock",
+]
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _time_case(fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    samples.sort()
+    total = sum(samples)
+    return {
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / total, 2) if total > 0 else None,
+        "mean_ms": round(total / iterations * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+        "p50_ms": round(_percentile(samples, 50) * 1000, 4),
+        "p90_ms": round(_percentile(samples, 90) * 1000, 4),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 4),
+        "max_ms": round(samples[-1] * 1000, 4),
+    }
+
+
+def _read_text(path):
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read().strip().strip("\x00")
+    except Exception:
+        return None
+
+
+def _run_command_text(cmd):
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def collect_platform_info():
+    uname = platform.uname()
+    return {
+        "hostname": uname.node,
+        "system": uname.system,
+        "kernel": uname.release,
+        "kernel_build": uname.version,
+        "machine": uname.machine,
+        "board_model": _read_text("/proc/device-tree/model"),
+        "firmware": _run_command_text(["vcgencmd", "version"]),
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "cryptography": cryptography_version,
+        "openssl": openssl_backend.openssl_version_text(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Benchmark cases
+# ---------------------------------------------------------------------------
+
+def bench_card_rsa_oaep(ctx, rng, iterations, warmup):
+    private_key = ctx["private_key"]
+    public_key = private_key.public_key()
+    oaep_padding = padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None
+    )
+
+    results = []
+    for blocks in CARD_RSA_BLOCKS:
+        plaintext = rng.randbytes(blocks * RSA_OAEP_MAX_PLAINTEXT)
+        ciphertext = b"".join(
+            public_key.encrypt(plaintext[i:i + RSA_OAEP_MAX_PLAINTEXT], oaep_padding)
+            for i in range(0, len(plaintext), RSA_OAEP_MAX_PLAINTEXT)
+        )
+        card_text = base64.b64encode(ciphertext).decode("utf-8")
+
+        def run(card_text=card_text):
+            decrypt_card_ciphertext(private_key, base64.b64decode(card_text))
+
+        case = {"rsa_blocks": blocks, "card_text_bytes": len(card_text)}
+        case.update(_time_case(run, iterations, warmup))
+        results.append(case)
+    return results
+
+
+def bench_card_x25519(ctx, rng, iterations, warmup):
+    private_key = X25519PrivateKey.generate()
+
+    results = []
+    for blocks in CARD_RSA_BLOCKS:
+        # Same token sizes as card_rsa_oaep so the two can be compared directly.
+        plaintext = rng.randbytes(blocks * RSA_OAEP_MAX_PLAINTEXT)
+        payload = encrypt_card_token_x25519(private_key.public_key(), plaintext)
+
+        def run(payload=payload):
+            decrypt_card_token_x25519(private_key, payload)
+
+        case = {
+            "token_bytes": len(plaintext),
+            "card_payload_bytes": len(payload),
+            "card_data_blocks": 1 + blocks_for_length(len(payload)),
+        }
+        case.update(_time_case(run, iterations, warmup))
+        results.append(case)
+    return results
+
+
+def _ballot_cases(rng, sizes):
+    for size in sizes:
+        plaintext = rng.randbytes(size)
+        for chunk_size in BALLOT_CHUNK_SIZES:
+            if chunk_size > size and chunk_size != BALLOT_CHUNK_SIZES[0]:
+                continue
+            yield size, chunk_size, plaintext
+
+
+def bench_ballot_decrypt(ctx, rng, iterations, warmup):
+    aes_key = ctx["aes_key"]
+    aesgcm = AESGCM(aes_key)
+
+    results = []
+    for size, chunk_size, plaintext in _ballot_cases(rng, ctx["ballot_sizes"]):
+        envelope = encrypt_envelope(aes_key, plaintext, chunk_size, aesgcm=aesgcm)
+        file_text = json.dumps(envelope, separators=(",", ":"))
+
+        def run(file_text=file_text):
+            decrypt_envelope(aes_key, json.loads(file_text), aesgcm=aesgcm)
+
+        case = {"plaintext_bytes": size, "chunk_size": chunk_size, "num_chunks": envelope["num_chunks"]}
+        case.update(_time_case(run, iterations, warmup))
+        results.append(case)
+    return results
+
+
+def bench_ballot_encrypt(ctx, rng, iterations, warmup):
+    aes_key = ctx["aes_key"]
+    aesgcm = AESGCM(aes_key)
+
+    results = []
+    for size, chunk_size, plaintext in _ballot_cases(rng, ctx["ballot_sizes"]):
+        def run(plaintext=plaintext, chunk_size=chunk_size):
+            json.dumps(encrypt_envelope(aes_key, plaintext, chunk_size, aesgcm=aesgcm), separators=(",", ":"))
+
+        case = {
+            "plaintext_bytes": size,
+            "chunk_size": chunk_size,
+            "num_chunks": max(1, -(-size // chunk_size)),
+        }
+        case.update(_time_case(run, iterations, warmup))
+        results.append(case)
+    return results
+
+
+def _bench_export(ctx, rng, iterations, warmup, encrypt):
+    results = []
+    for size in ctx["export_sizes"]:
+        source_path = os.path.join(ctx["work_dir"], f"export_src_{size}.json")
+        dest_path = os.path.join(ctx["work_dir"], f"export_dst_{size}.enc")
+        with open(source_path, "wb") as f:
+            f.write(rng.randbytes(size))
+
+        def run(source_path=source_path, dest_path=dest_path):
+            encrypt(source_path, dest_path, ctx["aes_key"])
+
+        case = {"plaintext_bytes": size}
+        # Large exports are slow on a Pi; cap iterations so a full run stays short.
+        case.update(_time_case(run, max(3, iterations // max(1, size // (256 * 1024))), min(warmup, 1)))
+        results.append(case)
+    return results
+
+
+def bench_export_aes_gcm(ctx, rng, iterations, warmup):
+    return _bench_export(ctx, rng, iterations, warmup, ExportService().encrypt_file_with_stored_aes)
+
+
+def bench_export_stream(ctx, rng, iterations, warmup):
+    return _bench_export(ctx, rng, iterations, warmup, ExportService().encrypt_file_stream)
+
+
+def bench_pem_unlock(ctx, rng, iterations, warmup):
+    passphrase = base64.b64encode(rng.randbytes(32))
+    pem = ctx["private_key"].private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.BestAvailableEncryption(passphrase)
+    )
+
+    def run():
+        serialization.load_pem_private_key(pem, password=passphrase)
+
+    case = {"key_bits": RSA_KEY_BITS, "format": "PKCS8-BestAvailableEncryption"}
+    case.update(_time_case(run, max(3, iterations // 10), min(warmup, 1)))
+    return [case]
+
+
+BENCH_FUNCS = {
+    "card_rsa_oaep": bench_card_rsa_oaep,
+    "card_x25519": bench_card_x25519,
+    "ballot_decrypt": bench_ballot_decrypt,
+    "ballot_encrypt": bench_ballot_encrypt,
+    "export_aes_gcm": bench_export_aes_gcm,
+    "export_stream": bench_export_stream,
+    "pem_unlock": bench_pem_unlock,
+}
+
+
+def run_benchmarks(names, iterations, warmup, seed, quick):
+    rng = random.Random(seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="evoting_bench_") as work_dir:
+        ctx = {
+            "private_key": rsa.generate_private_key(public_exponent=65537, key_size=RSA_KEY_BITS),
+            "aes_key": rng.randbytes(32),
+            "work_dir": work_dir,
+            "ballot_sizes": QUICK_BALLOT_SIZES if quick else BALLOT_SIZES,
+            "export_sizes": QUICK_EXPORT_SIZES if quick else EXPORT_SIZES,
+        }
+        for name in names:
+            print(f"[bench] {name} ...", file=sys.stderr)
+            start = time.perf_counter()
+            results[name] = BENCH_FUNCS[name](ctx, rng, iterations, warmup)
+            print(f"[bench] {name} done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BMD card, ballot, export and key crypto formats")
+    parser.add_argument("--only", action="append", choices=BENCHMARKS,
+                        help="Run only this benchmark (repeatable; default: all)")
+    parser.add_argument("--iterations", type=int, default=50,
+                        help="Timed iterations per case (default: 50)")
+    parser.add_argument("--warmup", type=int, default=3,
+                        help="Untimed warm-up iterations per case (default: 3)")
+    parser.add_argument("--seed", type=int, default=1234,
+                        help="PRNG seed for plaintexts and the AES key (default: 1234)")
+    parser.add_argument("--quick", action="store_true",
+                        help="Skip the largest ballot and export sizes")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.iterations < 1:
+        raise SystemExit("--iterations must be at least 1")
+
+    names = args.only or BENCHMARKS
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "platform": collect_platform_info(),
+        "config": {
+            "benchmarks": names,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "quick": args.quick,
+        },
+        "results": run_benchmarks(names, args.iterations, args.warmup, args.seed, args.quick),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Benchmark report written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+card_crypto.py  ─  Voter-card payload encryption.
+
+Legacy voter cards carry the token JSON as RSA-2048-OAEP ciphertext: one
+256-byte block per 190 bytes of token, base64-encoded to 344 characters and
+22 card blocks, and every tap costs an RSA private-key operation.
+
+The compact format (card_format.FORMAT_X25519_AESGCM) is ECIES-style:
+
+    ephemeral X25519 public key (32) | AES-256-GCM ciphertext + tag
+
+The AES key and nonce come from HKDF-SHA256 over the X25519 shared secret,
+salted with both public keys.  The ephemeral key is fresh for every card, so
+the derived nonce is never reused.  A typical token (~70 bytes) needs
+32 + 70 + 16 = 118 bytes: 8 payload blocks plus the v2 header block.
+
+The BMD's card key lives in card_x25519.pem, encrypted with the hardware
+passphrase like private.pem and unlocked through KeyService.  The public half
+(card_x25519_pub.pem, also listed in bmd_key.json) is what the card-issuing
+side encrypts to.
+
+Usage:
+    python card_crypto.py --generate-key      # existing devices: create the card key pair
+"""
+
+import argparse
+import os
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+CARD_KEY_FILE = "card_x25519.pem"
+CARD_PUBLIC_KEY_FILE = "card_x25519_pub.pem"
+
+X25519_KEY_SIZE = 32
+AES_KEY_SIZE = 32
+GCM_NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+HKDF_INFO = b"evoting card x25519-aesgcm v1"
+
+RSA_OAEP_SHA256_OVERHEAD = 2 * 32 + 2
+
+
+def _derive_key_nonce(shared_secret, ephemeral_public, recipient_public):
+    okm = HKDF(
+        algorithm=hashes.SHA256(),
+        length=AES_KEY_SIZE + GCM_NONCE_SIZE,
+        salt=ephemeral_public + recipient_public,
+        info=HKDF_INFO,
+    ).derive(shared_secret)
+    return okm[:AES_KEY_SIZE], okm[AES_KEY_SIZE:]
+
+
+def _raw_public(public_key):
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+
+
+def encrypt_card_token_x25519(public_key, plaintext):
+    """Encrypt token bytes to the BMD's X25519 card public key."""
+    ephemeral = X25519PrivateKey.generate()
+    ephemeral_public = _raw_public(ephemeral.public_key())
+    aes_key, nonce = _derive_key_nonce(
+        ephemeral.exchange(public_key), ephemeral_public, _raw_public(public_key)
+    )
+    return ephemeral_public + AESGCM(aes_key).encrypt(nonce, plaintext, None)
+
+
+def decrypt_card_token_x25519(private_key, payload):
+    """Inverse of encrypt_card_token_x25519; raises InvalidTag / ValueError on a bad payload."""
+    if len(payload) < X25519_KEY_SIZE + GCM_TAG_SIZE:
+        raise ValueError(f"X25519 card payload too short ({len(payload)} bytes)")
+    ephemeral_public = payload[:X25519_KEY_SIZE]
+    aes_key, nonce = _derive_key_nonce(
+        private_key.exchange(X25519PublicKey.from_public_bytes(ephemeral_public)),
+        ephemeral_public,
+        _raw_public(private_key.public_key()),
+    )
+    return AESGCM(aes_key).decrypt(nonce, payload[X25519_KEY_SIZE:], None)
+
+
+def encrypt_card_token_rsa(public_key, plaintext):
+    """RSA-OAEP-SHA256 encrypt token bytes in key-size blocks (the legacy card payload)."""
+    oaep_padding = padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None
+    )
+    step = public_key.key_size // 8 - RSA_OAEP_SHA256_OVERHEAD
+    return b"".join(
+        public_key.encrypt(plaintext[i:i + step], oaep_padding)
+        for i in range(0, len(plaintext), step)
+    )
+
+
+def load_public_key(path):
+    with open(path, "rb") as f:
+        return serialization.load_pem_public_key(f.read())
+
+
+def generate_card_keypair(out_dir, passphrase):
+    """
+    Create card_x25519.pem (PKCS#8, encrypted with passphrase) and
+    card_x25519_pub.pem in out_dir.  Returns the public key PEM bytes.
+    """
+    private_key = X25519PrivateKey.generate()
+    private_pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.BestAvailableEncryption(passphrase)
+    )
+    public_pem = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    with open(os.path.join(out_dir, CARD_KEY_FILE), "wb") as f:
+        f.write(private_pem)
+    with open(os.path.join(out_dir, CARD_PUBLIC_KEY_FILE), "wb") as f:
+        f.write(public_pem)
+    return public_pem
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the BMD's X25519 voter-card key")
+    parser.add_argument("--generate-key", action="store_true",
+                        help=f"Create {CARD_KEY_FILE} / {CARD_PUBLIC_KEY_FILE} next to this script")
+    parser.add_argument("--force", action="store_true", help="Overwrite an existing card key")
+    args = parser.parse_args()
+
+    if not args.generate_key:
+        parser.print_help()
+        return
+
+    from hardware_crypto import get_hardware_passphrase
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if os.path.exists(os.path.join(script_dir, CARD_KEY_FILE)) and not args.force:
+        raise SystemExit(f"{CARD_KEY_FILE} already exists; pass --force to replace it "
+                         "(cards issued to the old key stop working).")
+
+    generate_card_keypair(script_dir, get_hardware_passphrase())
+    print(f"Generated '{CARD_KEY_FILE}' (hardware-locked) and '{CARD_PUBLIC_KEY_FILE}'.")
+    print(f"Give '{CARD_PUBLIC_KEY_FILE}' to the card issuer to write compact voter cards.")
+
+
+if __name__ == "__main__":
+    main()
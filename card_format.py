@@ -0,0 +1,160 @@
+"""
+card_format.py  ─  On-card payload layout for voter and officer RFID cards.
+
+Legacy (v1) cards hold a UTF-8 string (plain text, or base64 RSA-OAEP
+ciphertext) from block 4 onwards, terminated by the first null byte.  The
+reader cannot tell a short read from the real end of the payload, so a
+truncated voter card is only caught when RSA decryption fails.
+
+v2 cards start with a 16-byte header in the first data block:
+
+    offset  size  field
+    0       2     magic 0xEB 0x56 (never valid at the start of v1 text/base64)
+    2       1     version (2)
+    3       1     payload format (FORMAT_*)
+    4       2     payload length, big-endian
+    6       4     CRC32 of the payload, big-endian
+    10      6     reserved, zero
+
+The payload follows in the next data blocks (trailer blocks skipped), so
+the reader fetches exactly ceil(length / 16) more blocks and checks the CRC
+before spending an RSA operation.
+"""
+
+import struct
+import zlib
+
+BLOCK_SIZE = 16
+HEADER_SIZE = 16
+
+CARD_MAGIC = b"\xEB\x56"
+CARD_VERSION = 2
+
+FORMAT_PLAIN_TEXT = 1      # UTF-8 text (officer phrase / commands)
+FORMAT_RSA_OAEP_B64 = 2    # base64 RSA-OAEP-SHA256 ciphertext (v1 voter payload, now length-prefixed)
+FORMAT_RSA_OAEP_RAW = 3    # raw RSA-OAEP-SHA256 ciphertext blocks (no base64 inflation)
+FORMAT_X25519_AESGCM = 4   # compact ECIES token (card_crypto.py)
+
+FORMAT_NAMES = {
+    FORMAT_PLAIN_TEXT: "plain-text",
+    FORMAT_RSA_OAEP_B64: "rsa-oaep-b64",
+    FORMAT_RSA_OAEP_RAW: "rsa-oaep-raw",
+    FORMAT_X25519_AESGCM: "x25519-aesgcm",
+}
+
+MAX_PAYLOAD_LENGTH = 0xFFFF
+
+_HEADER_STRUCT = struct.Struct(">2sBBHI6s")
+
+
+def blocks_for_length(length):
+    return (length + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+
+def encode_card_payload(payload, card_format):
+    """Return the list of 16-byte blocks (header first) for a v2 card."""
+    if card_format not in FORMAT_NAMES:
+        raise ValueError(f"Unknown card payload format {card_format}")
+    if len(payload) > MAX_PAYLOAD_LENGTH:
+        raise ValueError(f"Card payload too large ({len(payload)} bytes)")
+
+    header = _HEADER_STRUCT.pack(
+        CARD_MAGIC, CARD_VERSION, card_format, len(payload),
+        zlib.crc32(payload) & 0xFFFFFFFF, b"\x00" * 6
+    )
+    padded = payload + b"\x00" * (blocks_for_length(len(payload)) * BLOCK_SIZE - len(payload))
+    return [header] + [padded[i:i + BLOCK_SIZE] for i in range(0, len(padded), BLOCK_SIZE)]
+
+
+def encode_legacy_payload(payload):
+    """Return the null-terminated v1 blocks for payload bytes."""
+    data = payload + b"\x00"
+    data += b"\x00" * (blocks_for_length(len(data)) * BLOCK_SIZE - len(data))
+    return [data[i:i + BLOCK_SIZE] for i in range(0, len(data), BLOCK_SIZE)]
+
+
+def parse_card_header(block):
+    """
+    Parse the first data block.  Returns None for a legacy (v1) card, or a
+    dict with format/length/crc32.  Raises ValueError for a v2 magic with an
+    unsupported version or format (e.g. a card from newer firmware).
+    """
+    if len(block) < HEADER_SIZE or block[:2] != CARD_MAGIC:
+        return None
+
+    _, version, card_format, length, crc32, _ = _HEADER_STRUCT.unpack(block[:HEADER_SIZE])
+    if version != CARD_VERSION:
+        raise ValueError(f"Unsupported card layout version {version}")
+    if card_format not in FORMAT_NAMES:
+        raise ValueError(f"Unknown card payload format {card_format}")
+    return {"version": version, "format": card_format, "length": length, "crc32": crc32}
+
+
+class CardPayloadAssembler:
+    """
+    Accumulates card blocks in read order and knows when the payload is
+    complete: after `length` bytes for v2 cards, at the first null byte for
+    legacy cards.  Readers feed() each block and stop when it returns True.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.blocks_fed = 0
+        self.done = False
+        self._buf = bytearray()
+
+    @property
+    def is_v2(self):
+        return self.header is not None
+
+    @property
+    def blocks_needed(self):
+        """Total data blocks this card needs (v2 only; None while unknown)."""
+        if self.header is None:
+            return None
+        return 1 + blocks_for_length(self.header["length"])
+
+    def feed(self, block):
+        if self.done:
+            return True
+
+        if self.blocks_fed == 0:
+            self.blocks_fed = 1
+            self.header = parse_card_header(block)
+            if self.header is not None:
+                self.done = self.header["length"] == 0
+                return self.done
+
+        else:
+            self.blocks_fed += 1
+
+        if self.header is not None:
+            self._buf.extend(block)
+            if len(self._buf) >= self.header["length"]:
+                del self._buf[self.header["length"]:]
+                self.done = True
+            return self.done
+
+        if b"\x00" in block:
+            self._buf.extend(block.split(b"\x00")[0])
+            self.done = True
+        else:
+            self._buf.extend(block)
+        return self.done
+
+    def result(self):
+        """
+        Return (card_format, payload_bytes); card_format is None for legacy
+        cards.  Raises ValueError if a v2 payload is short or fails its CRC.
+        """
+        payload = bytes(self._buf)
+        if self.header is None:
+            return None, payload
+
+        if len(payload) != self.header["length"]:
+            raise ValueError(
+                f"short read: {len(payload)} of {self.header['length']} payload bytes"
+            )
+        if zlib.crc32(payload) & 0xFFFFFFFF != self.header["crc32"]:
+            raise ValueError("payload CRC32 mismatch")
+        return self.header["format"], payload
@@ -0,0 +1,271 @@
+"""
+chunked_aead.py  ─  Chunked AES-256-GCM envelope shared by ballots and tools.
+
+Ballot files on the USB stick are JSON envelopes of the form:
+
+    {
+      "algorithm": "AES-256-GCM",
+      "nonce": "<base64 12-byte base nonce>",
+      "num_chunks": N,
+      "chunks": ["<base64 ciphertext+tag>", ...]
+    }
+
+Chunk i is encrypted with nonce = base_nonce XOR big-endian(i) in the last
+4 bytes and AAD = big-endian uint32(i), so chunks cannot be reordered or
+swapped between positions.  DataHandler and USBBallotImporter decrypt this
+format; encrypt_ballots_aes.py produces it.
+
+Export logs use the binary stream variant of the same scheme, written and
+read incrementally so memory stays bounded by one chunk:
+
+    header : magic "EVSX" | version u8 | chunk_size u32 | base nonce (12)
+             | name_len u16 | source name (utf-8)
+    record : ciphertext_len u32 | ciphertext+tag           (repeated)
+
+Chunk i uses the same XOR-derived nonce and AAD = header bytes
+|| uint32(i) || final_flag u8.  Binding the header stops records being
+moved between files, and the final flag on the last record detects a
+truncated file (e.g. a USB stick pulled mid-export).  Records may be
+shorter than chunk_size, so a stream can be extended with further
+non-final records before it is closed (see shadow_export.py).
+"""
+
+import base64
+import os
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+ENVELOPE_ALGORITHM = "AES-256-GCM"
+DEFAULT_CHUNK_SIZE = 64 * 1024
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+STREAM_MAGIC = b"EVSX"
+STREAM_VERSION = 1
+STREAM_ALGORITHM = "AES-256-GCM-STREAM"
+MAX_STREAM_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def derive_chunk_nonce(nonce_base, chunk_index):
+    """XOR the chunk index into the last 4 bytes of the 12-byte base nonce."""
+    chunk_nonce = bytearray(nonce_base)
+    idx_bytes = struct.pack(">I", chunk_index)
+    for i in range(4):
+        chunk_nonce[-(i + 1)] ^= idx_bytes[-(i + 1)]
+    return bytes(chunk_nonce)
+
+
+def chunk_aad(chunk_index):
+    return struct.pack(">I", chunk_index)
+
+
+def encrypt_envelope(aes_key, plaintext, chunk_size=DEFAULT_CHUNK_SIZE, aesgcm=None):
+    """Encrypt plaintext bytes into a chunked AES-GCM envelope dict."""
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+
+    aesgcm = aesgcm or AESGCM(aes_key)
+    nonce_base = os.urandom(NONCE_SIZE)
+
+    chunks = []
+    for chunk_index, offset in enumerate(range(0, max(len(plaintext), 1), chunk_size)):
+        ciphertext = aesgcm.encrypt(
+            derive_chunk_nonce(nonce_base, chunk_index),
+            plaintext[offset:offset + chunk_size],
+            chunk_aad(chunk_index)
+        )
+        chunks.append(base64.b64encode(ciphertext).decode("utf-8"))
+
+    return {
+        "algorithm": ENVELOPE_ALGORITHM,
+        "nonce": base64.b64encode(nonce_base).decode("utf-8"),
+        "num_chunks": len(chunks),
+        "chunks": chunks,
+    }
+
+
+def decrypt_envelope(aes_key, envelope, aesgcm=None):
+    """Decrypt a chunked AES-GCM envelope dict back into plaintext bytes."""
+    nonce_b64 = envelope.get("nonce")
+    chunks = envelope.get("chunks", [])
+    num_chunks = envelope.get("num_chunks")
+
+    if not nonce_b64 or not chunks:
+        raise ValueError("Invalid encrypted ballot envelope: missing nonce/chunks")
+    if num_chunks is not None and int(num_chunks) != len(chunks):
+        raise ValueError(
+            f"Chunk count mismatch: num_chunks={num_chunks}, actual={len(chunks)}"
+        )
+
+    nonce_base = base64.b64decode(nonce_b64)
+    if len(nonce_base) != NONCE_SIZE:
+        raise ValueError(f"Invalid nonce length {len(nonce_base)}; expected {NONCE_SIZE} bytes")
+
+    aesgcm = aesgcm or AESGCM(aes_key)
+    plaintext_parts = []
+    for chunk_index, chunk_b64 in enumerate(chunks):
+        plaintext_parts.append(
+            aesgcm.decrypt(
+                derive_chunk_nonce(nonce_base, chunk_index),
+                base64.b64decode(chunk_b64),
+                chunk_aad(chunk_index)
+            )
+        )
+    return b"".join(plaintext_parts)
+
+
+# ---------------------------------------------------------------------------
+# Binary streaming format (exports)
+# ---------------------------------------------------------------------------
+
+def build_stream_header(nonce_base, chunk_size, source_name=""):
+    name_bytes = (source_name or "").encode("utf-8")[:0xFFFF]
+    return (
+        STREAM_MAGIC
+        + struct.pack(">BI", STREAM_VERSION, chunk_size)
+        + nonce_base
+        + struct.pack(">H", len(name_bytes))
+        + name_bytes
+    )
+
+
+def read_stream_header(src):
+    """Read and validate a stream header from a binary file object.
+
+    Returns a dict with chunk_size, nonce, source_name and the raw header
+    bytes (needed for the per-chunk AAD).
+    """
+    fixed = src.read(4 + 1 + 4 + NONCE_SIZE + 2)
+    if len(fixed) < 4 + 1 + 4 + NONCE_SIZE + 2 or fixed[:4] != STREAM_MAGIC:
+        raise ValueError("Not an encrypted export stream (bad magic or short header)")
+
+    version, chunk_size = struct.unpack(">BI", fixed[4:9])
+    if version != STREAM_VERSION:
+        raise ValueError(f"Unsupported export stream version {version}")
+    if chunk_size <= 0 or chunk_size > MAX_STREAM_CHUNK_SIZE:
+        raise ValueError(f"Invalid export stream chunk size {chunk_size}")
+
+    nonce_base = fixed[9:9 + NONCE_SIZE]
+    (name_len,) = struct.unpack(">H", fixed[9 + NONCE_SIZE:])
+    name_bytes = src.read(name_len)
+    if len(name_bytes) != name_len:
+        raise ValueError("Truncated export stream header")
+
+    return {
+        "chunk_size": chunk_size,
+        "nonce": nonce_base,
+        "source_name": name_bytes.decode("utf-8", errors="replace"),
+        "header": fixed + name_bytes,
+    }
+
+
+def stream_aad(header, chunk_index, final):
+    return header + struct.pack(">IB", chunk_index, 1 if final else 0)
+
+
+def read_stream_record(src, max_record):
+    """Read one length-prefixed record; returns None at a clean end of file."""
+    length_bytes = src.read(4)
+    if not length_bytes:
+        return None
+    if len(length_bytes) != 4:
+        raise ValueError("Truncated export stream record header")
+
+    (record_len,) = struct.unpack(">I", length_bytes)
+    if record_len < TAG_SIZE or record_len > max_record:
+        raise ValueError(f"Invalid export stream record length {record_len}")
+    ciphertext = src.read(record_len)
+    if len(ciphertext) != record_len:
+        raise ValueError("Truncated export stream record")
+    return ciphertext
+
+
+def encrypt_stream(aes_key, src, dst, chunk_size=DEFAULT_CHUNK_SIZE, source_name="", aesgcm=None):
+    """Encrypt binary file object src into dst using the streaming format.
+
+    src is read one chunk ahead so the last record can carry the final flag
+    without knowing the total length up front.  Returns a stats dict.
+    """
+    if chunk_size <= 0 or chunk_size > MAX_STREAM_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_STREAM_CHUNK_SIZE}")
+
+    aesgcm = aesgcm or AESGCM(aes_key)
+    nonce_base = os.urandom(NONCE_SIZE)
+    header = build_stream_header(nonce_base, chunk_size, source_name)
+    dst.write(header)
+
+    bytes_in = 0
+    bytes_out = len(header)
+    chunk_index = 0
+    current = src.read(chunk_size)
+    while True:
+        following = src.read(chunk_size) if len(current) == chunk_size else b""
+        final = not following
+        ciphertext = aesgcm.encrypt(
+            derive_chunk_nonce(nonce_base, chunk_index),
+            current,
+            stream_aad(header, chunk_index, final)
+        )
+        dst.write(struct.pack(">I", len(ciphertext)))
+        dst.write(ciphertext)
+
+        bytes_in += len(current)
+        bytes_out += 4 + len(ciphertext)
+        chunk_index += 1
+        if final:
+            break
+        current = following
+
+    return {
+        "algorithm": STREAM_ALGORITHM,
+        "num_chunks": chunk_index,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+    }
+
+
+def decrypt_stream(aes_key, src, dst, aesgcm=None):
+    """Decrypt a streaming-format file object src into dst, chunk by chunk.
+
+    Records may be shorter than chunk_size anywhere in the stream (appended
+    segments flush partial chunks); the last record must carry the final
+    flag.  Raises ValueError for malformed or truncated streams and
+    cryptography.exceptions.InvalidTag for tampered records.  Plaintext is
+    written as it is authenticated, so callers should write to a temporary
+    file and discard it on error.  Returns the parsed header dict.
+    """
+    info = read_stream_header(src)
+    header = info["header"]
+    max_record = info["chunk_size"] + TAG_SIZE
+    aesgcm = aesgcm or AESGCM(aes_key)
+
+    chunk_index = 0
+    record = read_stream_record(src, max_record)
+    if record is None:
+        raise ValueError("Truncated export stream: no chunks after header")
+
+    while True:
+        following = read_stream_record(src, max_record)
+        final = following is None
+        nonce = derive_chunk_nonce(info["nonce"], chunk_index)
+        try:
+            plaintext = aesgcm.decrypt(nonce, record, stream_aad(header, chunk_index, final))
+        except InvalidTag:
+            if final:
+                # Authentic record that is not flagged final: the tail was cut off.
+                aesgcm.decrypt(nonce, record, stream_aad(header, chunk_index, False))
+                raise ValueError(
+                    f"Truncated export stream: no final chunk after {chunk_index + 1} chunk(s)"
+                )
+            raise
+
+        dst.write(plaintext)
+        chunk_index += 1
+        if final:
+            break
+        record = following
+
+    info["num_chunks"] = chunk_index
+    return info
@@ -2,9 +2,9 @@ import json
 import csv
 import os
 import base64
-import struct
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from chunked_aead import decrypt_envelope
 
 class DataHandler:
     def __init__(self, candidates_file, log_file="votes.json", token_log_file="tokens.log"):
@@ -12,6 +12,10 @@ class DataHandler:
         self.candidates_file = candidates_file 
         self.log_file = log_file
         self.token_log_file = token_log_file
+        # Token IDs in token_log_file, reloaded only when the file changes
+        # behind our back (see _used_token_ids).
+        self._used_tokens = None
+        self._used_tokens_sig = None
         self.election_id = ""
         self.election_hash = ""
         self.election_type = "Normal"
@@ -25,8 +29,11 @@ class DataHandler:
         self.pref_tuple_size = 2
         self.max_preferences = 1
         self.decrypted_aes_key = None
+        self._aesgcm = None
+        self._aesgcm_key = None
         self.pref_debug_log_file = os.path.join("logs", "preferential_debug.jsonl")
         self.current_ballot_plain = None
+        self.shadow_exporter = None  # set by the GUI; see shadow_export.py
         
         # Initialize cryptographic hash chain
         self.last_hash = None
@@ -109,38 +116,13 @@ class DataHandler:
 
     def _decrypt_aes_wrapped_ballot(self, envelope):
         """Decrypt AES-GCM chunked ballot envelope into ballot JSON dict."""
-        nonce_b64 = envelope.get("nonce")
-        chunks = envelope.get("chunks", [])
-        num_chunks = envelope.get("num_chunks")
-
-        if not nonce_b64 or not chunks:
-            raise ValueError("Invalid encrypted ballot envelope: missing nonce/chunks")
-        if num_chunks is not None and int(num_chunks) != len(chunks):
-            raise ValueError(
-                f"Chunk count mismatch: num_chunks={num_chunks}, actual={len(chunks)}"
-            )
-
-        nonce_base = base64.b64decode(nonce_b64)
-        if len(nonce_base) != 12:
-            raise ValueError(f"Invalid nonce length {len(nonce_base)}; expected 12 bytes")
-
         aes_key = self._load_stored_aes_key()
-        aesgcm = AESGCM(aes_key)
-
-        plaintext_parts = []
-        for chunk_index, chunk_b64 in enumerate(chunks):
-            chunk_ciphertext = base64.b64decode(chunk_b64)
-
-            chunk_nonce = bytearray(nonce_base)
-            idx_bytes = struct.pack(">I", chunk_index)
-            for i in range(4):
-                chunk_nonce[-(i + 1)] ^= idx_bytes[-(i + 1)]
+        # Reuse the AESGCM key schedule across ballot loads.
+        if self._aesgcm is None or self._aesgcm_key is not aes_key:
+            self._aesgcm = AESGCM(aes_key)
+            self._aesgcm_key = aes_key
 
-            aad = struct.pack(">I", chunk_index)
-            chunk_plaintext = aesgcm.decrypt(bytes(chunk_nonce), chunk_ciphertext, aad)
-            plaintext_parts.append(chunk_plaintext)
-
-        decrypted_ballot = b"".join(plaintext_parts)
+        decrypted_ballot = decrypt_envelope(aes_key, envelope, aesgcm=self._aesgcm)
         return json.loads(decrypted_ballot.decode("utf-8"))
 
     def load_candidates(self):
@@ -173,21 +155,15 @@ class DataHandler:
                 # If plain JSON parsing fails, try to decrypt with RSA Chunks
                 from cryptography.hazmat.primitives.asymmetric import padding
                 from cryptography.hazmat.primitives import hashes
-                from cryptography.hazmat.primitives import serialization
-                import hardware_crypto
+                from key_service import get_key_service
 
                 key_path = "private.pem"
                 if not os.path.exists(key_path):
                     raise Exception(f"File appears encrypted but {key_path} not found!")
 
-                # 1. Unlock Private Key using Hardware Identity
+                # 1. Unlock Private Key using Hardware Identity (shared, unlocked once)
                 try:
-                    passphrase = hardware_crypto.get_hardware_passphrase()
-                    with open(key_path, "rb") as kf:
-                        private_key = serialization.load_pem_private_key(
-                            kf.read(),
-                            password=passphrase
-                        )
+                    private_key = get_key_service().get_private_key(key_path)
                 except Exception as e:
                     raise Exception(f"Hardware Identity mismatch or corrupt key! Could not unlock private.pem: {e}")
 
@@ -554,21 +530,46 @@ class DataHandler:
         except Exception as e:
             print(f"Warning: failed to store used ballot snapshot: {e}")
 
-    def is_token_used(self, token_id):
-        """Checks if the token_id has already been logged."""
-        if not os.path.exists(self.token_log_file):
-            return False
-            
+    def _token_log_signature(self):
         try:
+            st = os.stat(self.token_log_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    @staticmethod
+    def _logged_token_id(line):
+        # Format: Timestamp,TokenID
+        parts = line.strip().split(',')
+        if len(parts) >= 2:
+            return parts[1].strip()
+        return None
+
+    def _used_token_ids(self):
+        """
+        Set of token IDs in token_log_file.  Loaded once and kept up to date
+        by log_token; re-read only if the file was changed elsewhere (reset,
+        restore), so a check no longer scans the whole log.
+        """
+        sig = self._token_log_signature()
+        if self._used_tokens is not None and sig == self._used_tokens_sig:
+            return self._used_tokens
+
+        used = set()
+        if sig is not None:
             with open(self.token_log_file, "r", encoding='utf-8') as f:
                 for line in f:
-                    # Format: Timestamp,TokenID
-                    parts = line.strip().split(',')
-                    if len(parts) >= 2:
-                        logged_id = parts[1].strip()
-                        if logged_id == str(token_id):
-                            return True
-            return False
+                    logged_id = self._logged_token_id(line)
+                    if logged_id is not None:
+                        used.add(logged_id)
+        self._used_tokens = used
+        self._used_tokens_sig = sig
+        return used
+
+    def is_token_used(self, token_id):
+        """Checks if the token_id has already been logged."""
+        try:
+            return str(token_id) in self._used_token_ids()
         except Exception as e:
             print(f"Error checking token log: {e}")
             return False
@@ -589,9 +590,15 @@ class DataHandler:
                 pass # Use full string if not JSON
 
             timestamp = datetime.datetime.now().isoformat()
+            in_sync = self._used_tokens is not None and self._token_log_signature() == self._used_tokens_sig
+            line = f"{timestamp},{token_id}\n"
             with open(self.token_log_file, "a", encoding='utf-8') as f:
-                f.write(f"{timestamp},{token_id}\n")
+                f.write(line)
+            if in_sync:
+                self._used_tokens.add(self._logged_token_id(line))
+                self._used_tokens_sig = self._token_log_signature()
             print(f"Token Logged: {token_id}")
+            self._notify_shadow_export()
         except Exception as e:
             print(f"Error logging token: {e}")
 
@@ -657,12 +664,17 @@ class DataHandler:
         
         return vote_record
 
+    def _notify_shadow_export(self):
+        if self.shadow_exporter is not None:
+            self.shadow_exporter.notify()
+
     def save_json(self, record):
         """Writes the JSON object as a new line in the log file (JSONL format)."""
         try:
             with open(self.log_file, "a", encoding='utf-8') as f:
                 f.write(json.dumps(record) + "\n")
             print("Vote committed to JSON log.")
+            self._notify_shadow_export()
         except Exception as e:
             print(f"Error saving JSON: {e}")
             raise e
@@ -0,0 +1,268 @@
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import struct
+from pathlib import Path
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from chunked_aead import STREAM_MAGIC, decrypt_stream
+from encrypt_usb_export import load_stored_aes_key
+from export_service import HYBRID_MAGIC, HYBRID_VERSION
+
+SEGMENT_FILE_RE = re.compile(r"^(?P<base>.+)\.(?P<start>\d{12})\.enc$")
+
+
+def decrypt_stream_file(input_path, output_path, aes_key):
+    """Decrypt a chunked .enc export; output only appears once every chunk verified."""
+    tmp_path = f"{output_path}.part"
+    try:
+        with open(input_path, "rb") as src, open(tmp_path, "wb") as dst:
+            info = decrypt_stream(aes_key, src, dst)
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return info
+
+
+def load_server_private_key(key_path, password=None):
+    with open(key_path, "rb") as f:
+        return serialization.load_pem_private_key(
+            f.read(), password=password.encode("utf-8") if password else None
+        )
+
+
+def decrypt_hybrid_file(input_path, output_path, server_private_key):
+    """Decrypt an ExportService.hybrid_encrypt_file container with the server RSA key."""
+    tmp_path = f"{output_path}.part"
+    try:
+        with open(input_path, "rb") as src:
+            fixed = src.read(len(HYBRID_MAGIC) + 3)
+            if len(fixed) != len(HYBRID_MAGIC) + 3 or fixed[:len(HYBRID_MAGIC)] != HYBRID_MAGIC:
+                raise ValueError("Not a hybrid export container")
+            version, wrapped_len = struct.unpack(">BH", fixed[len(HYBRID_MAGIC):])
+            if version != HYBRID_VERSION:
+                raise ValueError(f"Unsupported hybrid container version {version}")
+            wrapped_key = src.read(wrapped_len)
+            if len(wrapped_key) != wrapped_len:
+                raise ValueError("Truncated hybrid container key block")
+
+            aes_key = server_private_key.decrypt(
+                wrapped_key,
+                padding.OAEP(
+                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                    algorithm=hashes.SHA256(),
+                    label=None
+                )
+            )
+            with open(tmp_path, "wb") as dst:
+                info = decrypt_stream(aes_key, src, dst)
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return info
+
+
+def decrypt_segment_group(segment_paths, output_path, aes_key):
+    """Decrypt shadow-export segments (<name>.<offset>.enc) and join them in order.
+
+    Each segment header records the log offset it starts at; a gap or
+    overlap between segments is rejected.
+    """
+    tmp_path = f"{output_path}.part"
+    total_chunks = 0
+    try:
+        with open(tmp_path, "wb") as dst:
+            for segment_path in segment_paths:
+                expected = dst.tell()
+                with open(segment_path, "rb") as src:
+                    info = decrypt_stream(aes_key, src, dst)
+                _, _, start = info["source_name"].rpartition("@")
+                if not start.isdigit() or int(start) != expected:
+                    raise ValueError(
+                        f"{Path(segment_path).name} starts at {start or '?'}, expected offset {expected}"
+                    )
+                total_chunks += info["num_chunks"]
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {"num_chunks": total_chunks, "segments": len(segment_paths)}
+
+
+def decrypt_json_file(input_path, output_path, aes_key):
+    """Decrypt a legacy single-shot .enc.json export envelope."""
+    with open(input_path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+
+    nonce = base64.b64decode(payload["nonce"])
+    ciphertext = base64.b64decode(payload["ciphertext"])
+    plaintext = AESGCM(aes_key).decrypt(nonce, ciphertext, None)
+
+    with open(output_path, "wb") as f:
+        f.write(plaintext)
+    return {"source_name": payload.get("source_name", "")}
+
+
+def _file_magic(path):
+    with open(path, "rb") as f:
+        return f.read(len(STREAM_MAGIC))
+
+
+def check_export_manifests(export_dir):
+    """Compare manifest_*.json in export_dir against the files on disk.
+
+    The BMD writes the manifest last, so a directory without one holds an
+    unfinished export.  Returns a list of problems (empty when consistent).
+    """
+    export_dir = Path(export_dir)
+    manifests = sorted(export_dir.glob("manifest_*.json"))
+    if not manifests:
+        return [f"{export_dir}: no manifest found - export did not complete"]
+
+    problems = []
+    for manifest_path in manifests:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if not Path(str(manifest_path) + ".sig").exists():
+            problems.append(f"{manifest_path.name}: manifest is not signed")
+        for entry in manifest.get("files", []):
+            path = export_dir / entry["name"]
+            if not path.exists():
+                problems.append(f"{entry['name']}: listed in {manifest_path.name} but missing")
+                continue
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(64 * 1024), b""):
+                    digest.update(block)
+            if digest.hexdigest() != entry.get("sha256"):
+                problems.append(f"{entry['name']}: SHA-256 does not match {manifest_path.name}")
+    return problems
+
+
+def _collect_inputs(paths):
+    files = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            files.extend(
+                sorted(p for p in path.iterdir() if p.name.endswith(".enc") or p.name.endswith(".enc.json"))
+            )
+        elif path.exists():
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"Input not found: {path}")
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Decrypt BMD USB exports (chunked .enc streams, hybrid containers or legacy .enc.json)"
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Encrypted export files, or directories containing them (example: /media/usb/exports)",
+    )
+    parser.add_argument(
+        "--aes-key-file",
+        default=os.environ.get("EVOTING_AES_KEY_PATH", "aes_key.dec"),
+        help="Path to stored AES key file (default: EVOTING_AES_KEY_PATH or aes_key.dec)",
+    )
+    parser.add_argument(
+        "--server-key",
+        help="Server RSA private key for hybrid containers (hybrid_encrypt_file output)",
+    )
+    parser.add_argument(
+        "--server-key-password",
+        default=os.environ.get("EVOTING_SERVER_KEY_PASSWORD"),
+        help="Password for --server-key (default: EVOTING_SERVER_KEY_PASSWORD, or none)",
+    )
+    parser.add_argument(
+        "--out-dir",
+        default="decrypted_exports",
+        help="Output directory for decrypted files (default: decrypted_exports)",
+    )
+
+    args = parser.parse_args()
+
+    for raw in args.inputs:
+        if Path(raw).is_dir():
+            for problem in check_export_manifests(raw):
+                print(f"WARNING: {problem}")
+
+    inputs = _collect_inputs(args.inputs)
+    magics = {path: _file_magic(path) for path in inputs}
+
+    aes_key = None
+    if any(magic != HYBRID_MAGIC for magic in magics.values()):
+        aes_key = load_stored_aes_key(args.aes_key_file)
+    server_private_key = None
+    if any(magic == HYBRID_MAGIC for magic in magics.values()):
+        if not args.server_key:
+            raise SystemExit("Hybrid containers found; pass --server-key to decrypt them")
+        server_private_key = load_server_private_key(args.server_key, args.server_key_password)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    failures = 0
+
+    # Shadow-export segments are decrypted as one joined output per log.
+    segment_groups = {}
+    for input_path in inputs:
+        match = SEGMENT_FILE_RE.match(input_path.name)
+        if match and magics[input_path] == STREAM_MAGIC:
+            segment_groups.setdefault(match.group("base"), []).append((int(match.group("start")), input_path))
+    for base_name, members in sorted(segment_groups.items()):
+        members.sort()
+        output_path = out_dir / f"{base_name}.dec"
+        try:
+            info = decrypt_segment_group([str(p) for _, p in members], str(output_path), aes_key)
+            print(f"Decrypted {info['segments']} segment(s) of {base_name} -> {output_path} "
+                  f"({info['num_chunks']} chunks)")
+        except Exception as e:
+            failures += 1
+            print(f"FAILED {base_name} segments: {e!r}")
+        for _, path in members:
+            inputs.remove(path)
+
+    for input_path in inputs:
+        base_name = input_path.name
+        for suffix in (".enc.json", ".enc"):
+            if base_name.endswith(suffix):
+                base_name = base_name[:-len(suffix)]
+                break
+        output_path = out_dir / f"{base_name}.dec"
+        try:
+            if magics[input_path] == HYBRID_MAGIC:
+                info = decrypt_hybrid_file(str(input_path), str(output_path), server_private_key)
+                print(f"Decrypted {input_path} -> {output_path} "
+                      f"(hybrid, {info['num_chunks']} chunks, source: {info['source_name'] or '-'})")
+            elif magics[input_path] == STREAM_MAGIC:
+                info = decrypt_stream_file(str(input_path), str(output_path), aes_key)
+                print(f"Decrypted {input_path} -> {output_path} "
+                      f"({info['num_chunks']} chunks, source: {info['source_name'] or '-'})")
+            else:
+                info = decrypt_json_file(str(input_path), str(output_path), aes_key)
+                print(f"Decrypted {input_path} -> {output_path} (legacy JSON, source: {info['source_name'] or '-'})")
+        except Exception as e:
+            failures += 1
+            print(f"FAILED {input_path}: {e!r}")
+
+    if failures:
+        raise SystemExit(f"{failures} file(s) failed to decrypt")
+
+
+if __name__ == "__main__":
+    main()
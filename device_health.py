@@ -0,0 +1,222 @@
+"""
+device_health.py  ─  Cached device-health probes (WiFi, SSH, Bluetooth, device ID).
+
+The startup ticket used to probe these one after another while the printer
+waited: nmcli, a `bash -lc ip link | grep` pipeline and two or three
+`systemctl is-active` calls, none with a timeout, plus the hardware
+identity lookup.  DeviceHealth runs the probes concurrently with a timeout
+on every command, keeps the results for a TTL and refreshes them on a
+background thread, so ticket printing and the System Status screen read a
+snapshot instead of spawning subprocesses.
+
+    snapshot()   the latest values; probes once (concurrently) if nothing
+                 has been probed yet, and starts a background refresh when
+                 the values are older than the TTL
+    refresh()    probe now and wait for the result (the officer tickets use
+                 this, so they never print values from before the call)
+    start()      refresh every TTL seconds in the background
+
+Usage:
+    from device_health import get_device_health
+    health = get_device_health().snapshot()
+    health["wifi"], health["ssh"], health["bluetooth"], health["mac"]
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    PROBE_TTL = float(os.environ.get("EVOTING_HEALTH_TTL_SECONDS", "30"))
+except ValueError:
+    PROBE_TTL = 30.0
+
+# Seconds a single probe command may take before it reports UNKNOWN.
+COMMAND_TIMEOUT = 3.0
+
+WIFI_INTERFACE = "wlan0"
+
+
+def _run_command_text(command, timeout=COMMAND_TIMEOUT):
+    try:
+        result = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=False,
+            timeout=timeout,
+        )
+        return (result.stdout or result.stderr or "").strip()
+    except Exception:
+        return "UNKNOWN"
+
+
+def _yes_no_unknown(value):
+    text = str(value or "").strip().lower()
+    if not text:
+        return "UNKNOWN"
+    if text in ("active", "enabled", "yes", "on", "up"):
+        return "ON"
+    if text in ("inactive", "disabled", "no", "off", "down", "failed"):
+        return "OFF"
+    return text.upper()
+
+
+def probe_wifi():
+    if shutil.which("nmcli"):
+        output = _run_command_text(["nmcli", "-t", "-f", "WIFI", "general"])
+        if output:
+            return _yes_no_unknown(output)
+    # Same answer as `ip link show wlan0 | grep 'state UP'`, without a shell.
+    try:
+        with open(f"/sys/class/net/{WIFI_INTERFACE}/operstate", "r") as f:
+            return "ON" if f.read().strip() == "up" else "OFF"
+    except OSError:
+        return "OFF"
+
+
+def probe_ssh():
+    if shutil.which("systemctl"):
+        for service_name in ("ssh", "sshd"):
+            output = _run_command_text(["systemctl", "is-active", service_name])
+            if output and output != "unknown":
+                return _yes_no_unknown(output)
+    return "UNKNOWN"
+
+
+def probe_bluetooth():
+    if shutil.which("systemctl"):
+        output = _run_command_text(["systemctl", "is-active", "bluetooth"])
+        if output and output != "unknown":
+            return _yes_no_unknown(output)
+    return "UNKNOWN"
+
+
+def probe_mac():
+    try:
+        import hardware_crypto
+        return hardware_crypto.get_mac_address()
+    except Exception:
+        return "UNKNOWN"
+
+
+PROBES = {
+    "wifi": probe_wifi,
+    "ssh": probe_ssh,
+    "bluetooth": probe_bluetooth,
+    "mac": probe_mac,
+}
+
+
+class DeviceHealth:
+    def __init__(self, probes=None, ttl=PROBE_TTL):
+        self.probes = dict(probes or PROBES)
+        self.ttl = ttl
+        self._values = {}
+        self._taken_at = None
+        self._probed_from = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(self.probes), thread_name_prefix="health-probe")
+        self._background = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"refreshes": 0, "last_refresh_seconds": None}
+
+    def refresh(self):
+        """Run every probe concurrently and return values probed after this call started."""
+        requested = time.monotonic()
+        with self._refresh_lock:
+            with self._lock:
+                if self._probed_from is not None and self._probed_from >= requested:
+                    # A run that began after our call finished while we waited; share it.
+                    return dict(self._values)
+            started = time.perf_counter()
+            probed_from = time.monotonic()
+            futures = {name: self._executor.submit(probe) for name, probe in self.probes.items()}
+            values = {}
+            for name, future in futures.items():
+                try:
+                    values[name] = future.result()
+                except Exception:
+                    values[name] = "UNKNOWN"
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._values = values
+                self._taken_at = time.monotonic()
+                self._probed_from = probed_from
+                self.stats["refreshes"] += 1
+                self.stats["last_refresh_seconds"] = elapsed
+            return dict(values)
+
+    def _current(self):
+        with self._lock:
+            return dict(self._values)
+
+    def age(self):
+        """Seconds since the last refresh, or None before the first."""
+        with self._lock:
+            return None if self._taken_at is None else time.monotonic() - self._taken_at
+
+    def snapshot(self):
+        """Latest probe values; probes now only if there are none yet."""
+        age = self.age()
+        if age is None:
+            return self.refresh()
+        if age > self.ttl:
+            self._refresh_in_background()
+        return self._current()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._background is not None and self._background.is_alive():
+                return
+            self._background = threading.Thread(target=self.refresh, name="device-health-refresh", daemon=True)
+            self._background.start()
+
+    def start(self):
+        """Refresh every ttl seconds on a daemon thread (the first refresh runs immediately)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="device-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[health] Refresh failed: {e}")
+            self._stop.wait(self.ttl)
+
+    def status_text(self):
+        values = self._current()
+        if not values:
+            return "not probed yet"
+        age = self.age()
+        elapsed = self.stats["last_refresh_seconds"]
+        return (
+            f"WiFi {values.get('wifi', 'UNKNOWN')}, SSH {values.get('ssh', 'UNKNOWN')}, "
+            f"Bluetooth {values.get('bluetooth', 'UNKNOWN')} "
+            f"({age:.0f}s old, probed in {elapsed * 1000:.0f} ms)"
+        )
+
+
+_device_health = None
+_device_health_lock = threading.Lock()
+
+
+def get_device_health():
+    global _device_health
+    with _device_health_lock:
+        if _device_health is None:
+            _device_health = DeviceHealth()
+        return _device_health
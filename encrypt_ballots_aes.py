@@ -0,0 +1,328 @@
+"""Offline ballot encryptor producing the chunked AES-GCM USB ballot layout.
+
+Replaces the pure-RSA chunking in encrypt_ballots_rsa.py.  One random AES-256
+key is generated per run (or reused with --aes-key-file) and wrapped once with
+the BMD public key into aes_key.enc.  Every ballot is then encrypted with AES-GCM
+in the chunked envelope format that DataHandler._decrypt_aes_wrapped_ballot and
+USBBallotImporter already read, so loading a ballot costs no RSA operation.
+
+Ballots are encrypted across a process pool in batches, so large runs
+(e.g. 100k ballots) scale with the number of cores.
+
+Input layout (same as init_elections.py output):
+  elections/<election_id>/candidates.json     (plaintext JSON)
+  elections/<election_id>/ballots/*.json      (optional plain ballots)
+
+The candidates.json files committed under elections/ are RSA-encrypted
+copies for the BMD, not input for this tool; point --elections-dir at the
+plaintext election definitions instead.
+
+Output layout (copy to the USB root):
+  <out>/aes_key.enc
+  <out>/election_id_<n>/candidates.json
+  <out>/election_id_<n>/ballot/ballot_<n>.enc.json
+
+Source elections named E<n>, <n> or election_id_<n> are written as
+election_id_<n>, the only folders USBBallotImporter imports; any other name
+is rejected.  After encrypting, the output is run through the BMD's own
+import step (with the run's AES key) and one ballot per election is
+decrypted, so a layout the BMD would skip fails here instead.
+
+Usage:
+  python encrypt_ballots_aes.py --out /media/pi/USB/ballot --bmd-id 1
+  python encrypt_ballots_aes.py --out ballot_load --count 100000 --workers 4
+"""
+
+import argparse
+import base64
+import copy
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from chunked_aead import DEFAULT_CHUNK_SIZE, encrypt_envelope
+
+BATCH_SIZE = 500
+
+# USBBallotImporter only imports folders with this prefix.
+USB_ELECTION_PREFIX = "election_id_"
+
+_worker_key = None
+_worker_aesgcm = None
+
+
+def _init_worker(aes_key):
+    global _worker_key, _worker_aesgcm
+    _worker_key = aes_key
+    _worker_aesgcm = AESGCM(aes_key)
+
+
+def _synthesize_ballot(template):
+    """Build a synthetic ballot from candidates.json (same shuffle as init_elections.py)."""
+    ballot = copy.deepcopy(template)
+    ballot["ballot_id"] = uuid.uuid4().hex[:8].upper()
+    candidates = ballot.get("candidates", [])
+    if isinstance(candidates, list) and candidates:
+        pref_ids = [c.get("pref_id") for c in candidates]
+        random.shuffle(pref_ids)
+        for idx, cand in enumerate(candidates):
+            cand["pref_id"] = pref_ids[idx]
+    return ballot
+
+
+def _encrypt_batch(task):
+    """Worker entry point: encrypt one batch of ballots and write them to disk."""
+    out_dir, start_index, sources, template, synthetic_count, chunk_size = task
+    written = 0
+    index = start_index
+
+    for source_path in sources:
+        with open(source_path, "rb") as f:
+            plaintext = f.read()
+        envelope = encrypt_envelope(_worker_key, plaintext, chunk_size, aesgcm=_worker_aesgcm)
+        _write_envelope(out_dir, index, envelope)
+        index += 1
+        written += 1
+
+    for _ in range(synthetic_count):
+        plaintext = json.dumps(_synthesize_ballot(template), separators=(",", ":")).encode("utf-8")
+        envelope = encrypt_envelope(_worker_key, plaintext, chunk_size, aesgcm=_worker_aesgcm)
+        _write_envelope(out_dir, index, envelope)
+        index += 1
+        written += 1
+
+    return written
+
+
+def _write_envelope(out_dir, index, envelope):
+    with open(os.path.join(out_dir, f"ballot_{index}.enc.json"), "w", encoding="utf-8") as f:
+        json.dump(envelope, f, separators=(",", ":"))
+
+
+def load_or_create_aes_key(aes_key_file):
+    if aes_key_file:
+        with open(aes_key_file, "r", encoding="utf-8") as f:
+            key_data = json.load(f)
+        aes_key = base64.b64decode(key_data["aes_key_b64"])
+        if len(aes_key) != 32:
+            raise ValueError(f"Invalid AES key length {len(aes_key)} bytes; expected 32")
+        return aes_key
+    return AESGCM.generate_key(bit_length=256)
+
+
+def write_wrapped_aes_key(out_root, aes_key, public_key_path, bmd_id):
+    """Wrap the AES key with the BMD RSA public key into aes_key.enc (one RSA op per run)."""
+    with open(public_key_path, "rb") as f:
+        public_key = serialization.load_pem_public_key(f.read())
+
+    encrypted_aes_key = public_key.encrypt(
+        aes_key,
+        padding.OAEP(
+            mgf=padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None
+        )
+    )
+
+    key_path = os.path.join(out_root, "aes_key.enc")
+    with open(key_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "bmd_id": str(bmd_id),
+            "encrypted_aes_key": base64.b64encode(encrypted_aes_key).decode("utf-8"),
+            "algorithm": "RSA-OAEP-SHA256",
+        }, f, indent=2)
+    return key_path
+
+
+def usb_election_folder(election_id):
+    """USB folder name for a source election id (E1, 1 or election_id_1), or None if it has none."""
+    if election_id.startswith(USB_ELECTION_PREFIX):
+        return election_id
+    if election_id[:1] in ("E", "e") and election_id[1:].isdigit():
+        return f"{USB_ELECTION_PREFIX}{int(election_id[1:])}"
+    if election_id.isdigit():
+        return f"{USB_ELECTION_PREFIX}{int(election_id)}"
+    return None
+
+
+def verify_usb_import(out_root, aes_key, expected):
+    """Import out_root the way the BMD does and decrypt one ballot per election; exit on any mismatch."""
+    from usb_ballot_import import USBBallotImporter
+
+    importer = USBBallotImporter(demo_mode=True, demo_aes_key_b64=base64.b64encode(aes_key).decode("utf-8"))
+    summary = {"elections_imported": [], "total_ballots": 0, "errors": []}
+    with tempfile.TemporaryDirectory() as local_dir:
+        try:
+            importer._import_elections(out_root, local_dir, summary)
+        except ValueError as e:
+            raise SystemExit(f"Import check failed: {e}")
+
+    imported = {e["election_id"]: e["ballots_imported"] for e in summary["elections_imported"]}
+    problems = list(summary["errors"])
+    for folder, count in sorted(expected.items()):
+        if imported.get(folder) != count:
+            problems.append(f"{folder}: expected {count} ballots, import found {imported.get(folder, 0)}")
+            continue
+        if count:
+            sample = os.path.join(out_root, folder, "ballot", "ballot_1.enc.json")
+            try:
+                importer.decrypt_ballot_file(sample)
+            except Exception as e:
+                problems.append(f"{folder}: {sample} does not decrypt ({e})")
+    if problems:
+        raise SystemExit("Import check failed:\n  " + "\n  ".join(problems))
+    print(f"Import check passed: {len(expected)} elections, {sum(expected.values())} ballots.")
+
+
+def _plan_election(election_dir, out_election_dir, count, chunk_size):
+    """Split one election into (out_dir, start_index, sources, template, synthetic) batches."""
+    template_path = os.path.join(election_dir, "candidates.json")
+    template = None
+    if os.path.exists(template_path):
+        try:
+            with open(template_path, "r", encoding="utf-8") as f:
+                template = json.load(f)
+        except (UnicodeDecodeError, ValueError):
+            raise SystemExit(
+                f"{template_path} is not plaintext JSON (already encrypted?). "
+                "--elections-dir must contain the plaintext election definitions."
+            )
+
+    plain_dir = os.path.join(election_dir, "ballots")
+    sources = []
+    if os.path.isdir(plain_dir):
+        sources = sorted(
+            os.path.join(plain_dir, name) for name in os.listdir(plain_dir)
+            if name.endswith(".json") and not name.startswith(".")
+        )
+
+    target = len(sources) if count is None else int(count)
+    sources = sources[:target]
+    synthetic = max(0, target - len(sources))
+    if synthetic and template is None:
+        raise FileNotFoundError(
+            f"{template_path} is required to synthesize {synthetic} extra ballots"
+        )
+
+    tasks = []
+    index = 1
+    for i in range(0, len(sources), BATCH_SIZE):
+        batch = sources[i:i + BATCH_SIZE]
+        tasks.append((out_election_dir, index, batch, template, 0, chunk_size))
+        index += len(batch)
+    while synthetic > 0:
+        n = min(BATCH_SIZE, synthetic)
+        tasks.append((out_election_dir, index, [], template, n, chunk_size))
+        index += n
+        synthetic -= n
+
+    return template_path if template is not None else None, tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Encrypt election ballots into the chunked AES-GCM USB ballot layout"
+    )
+    parser.add_argument("--elections-dir", default="elections",
+                        help="Source directory with one folder per election holding a plaintext "
+                             "candidates.json (default: elections; the copies committed there are "
+                             "RSA-encrypted and will be rejected)")
+    parser.add_argument("--out", required=True,
+                        help="Output 'ballot' folder to copy onto the USB stick")
+    parser.add_argument("--count", type=int, default=None,
+                        help="Target ballots per election; synthetic ballots from candidates.json fill any gap")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--public-key", default="public.pem",
+                        help="BMD RSA public key used to wrap the AES key (default: public.pem)")
+    parser.add_argument("--bmd-id", default=os.environ.get("EVOTING_BMD_ID", "1"),
+                        help="BMD ID recorded in aes_key.enc (default: EVOTING_BMD_ID or 1)")
+    parser.add_argument("--aes-key-file",
+                        help="Reuse an existing aes_key.dec style JSON key instead of generating one")
+    parser.add_argument("--key-out",
+                        help="Also write the plain AES key (aes_key.dec JSON format) here for the tally server")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Plaintext bytes per AES-GCM chunk (default: {DEFAULT_CHUNK_SIZE})")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.elections_dir):
+        raise SystemExit(f"Elections directory not found: {args.elections_dir}")
+    if not os.path.exists(args.public_key):
+        raise SystemExit(f"Public key not found: {args.public_key}")
+
+    # Plan (and validate every candidates.json) before writing any output.
+    plans = []
+    folders = {}
+    for election_id in sorted(os.listdir(args.elections_dir)):
+        election_dir = os.path.join(args.elections_dir, election_id)
+        if not os.path.isdir(election_dir):
+            continue
+        folder = usb_election_folder(election_id)
+        if folder is None:
+            raise SystemExit(
+                f"Election folder {election_id!r} has no USB name: name source elections "
+                f"E<n>, <n> or {USB_ELECTION_PREFIX}<n> so the BMD imports them."
+            )
+        if folder in folders:
+            raise SystemExit(f"Elections {folders[folder]!r} and {election_id!r} both map to {folder}")
+        folders[folder] = election_id
+        out_election_dir = os.path.join(args.out, folder, "ballot")
+        template_path, tasks = _plan_election(election_dir, out_election_dir, args.count, args.chunk_size)
+        plans.append((folder, out_election_dir, template_path, tasks))
+
+    aes_key = load_or_create_aes_key(args.aes_key_file)
+    os.makedirs(args.out, exist_ok=True)
+    write_wrapped_aes_key(args.out, aes_key, args.public_key, args.bmd_id)
+    if args.key_out:
+        with open(args.key_out, "w", encoding="utf-8") as f:
+            json.dump({
+                "aes_key_b64": base64.b64encode(aes_key).decode("utf-8"),
+                "key_size": len(aes_key),
+                "algorithm": "AES-256-GCM",
+                "bmd_id": str(args.bmd_id),
+            }, f, indent=2)
+
+    all_tasks = []
+    for folder, out_election_dir, template_path, tasks in plans:
+        os.makedirs(out_election_dir, exist_ok=True)
+        if template_path:
+            shutil.copy2(template_path, os.path.join(args.out, folder, "candidates.json"))
+        all_tasks.extend(tasks)
+        planned = sum(len(t[2]) + t[4] for t in tasks)
+        print(f"{folder}: {planned} ballots planned")
+
+    if not all_tasks:
+        print("No ballots to encrypt.")
+        return
+
+    start = time.perf_counter()
+    total = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers),
+                             initializer=_init_worker, initargs=(aes_key,)) as pool:
+        for written in pool.map(_encrypt_batch, all_tasks):
+            total += written
+    elapsed = time.perf_counter() - start
+
+    rate = total / elapsed if elapsed > 0 else 0.0
+    verify_usb_import(args.out, aes_key, {
+        folder: sum(len(t[2]) + t[4] for t in tasks) for folder, _, _, tasks in plans
+    })
+
+    print(f"\nDone! Encrypted {total} ballots in {elapsed:.1f}s ({rate:.0f} ballots/s, {args.workers} workers).")
+    print(f"AES key wrapped for BMD {args.bmd_id}: {os.path.join(args.out, 'aes_key.enc')}")
+    if not args.aes_key_file and not args.key_out:
+        print("Warning: the AES key exists only inside aes_key.enc. Use --key-out to keep a server-side copy.")
+
+
+if __name__ == "__main__":
+    main()
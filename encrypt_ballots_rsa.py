@@ -1,3 +1,10 @@
+"""Legacy pure-RSA ballot encryptor.
+
+Every 150-byte chunk costs one RSA operation here and one RSA private-key
+operation on the BMD at load time.  Use encrypt_ballots_aes.py for new ballot
+sets; this script is kept only for re-encrypting old development data.
+"""
+
 import os
 import glob
 from cryptography.hazmat.primitives.asymmetric import padding
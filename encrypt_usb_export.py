@@ -6,6 +6,8 @@ from pathlib import Path
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
+from chunked_aead import DEFAULT_CHUNK_SIZE, encrypt_stream
+
 
 def load_stored_aes_key(aes_key_file):
     if not os.path.exists(aes_key_file):
@@ -85,6 +87,13 @@ def encrypt_json_file(input_json, output_file, aes_key):
         json.dump(payload, f, indent=2)
 
 
+def encrypt_stream_file(input_path, output_file, aes_key, chunk_size=DEFAULT_CHUNK_SIZE):
+    with open(input_path, "rb") as src, open(output_file, "wb") as dst:
+        return encrypt_stream(
+            aes_key, src, dst, chunk_size=chunk_size, source_name=os.path.basename(input_path)
+        )
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Encrypt JSON file for USB export using stored AES key"
@@ -108,6 +117,18 @@ def main():
         default="final_votes",
         help="Output filename prefix (default: final_votes)",
     )
+    parser.add_argument(
+        "--format",
+        choices=["stream", "json"],
+        default=os.environ.get("EVOTING_EXPORT_FORMAT", "stream"),
+        help="stream: chunked AES-GCM .enc (default); json: legacy single-shot .enc.json",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Plaintext bytes per AES-GCM chunk in stream format (default: {DEFAULT_CHUNK_SIZE})",
+    )
 
     args = parser.parse_args()
 
@@ -121,8 +142,12 @@ def main():
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    out_file = out_dir / f"{args.prefix}_{bmd_id}.enc.json"
-    encrypt_json_file(str(input_path), str(out_file), aes_key)
+    if args.format == "stream":
+        out_file = out_dir / f"{args.prefix}_{bmd_id}.enc"
+        encrypt_stream_file(str(input_path), str(out_file), aes_key, args.chunk_size)
+    else:
+        out_file = out_dir / f"{args.prefix}_{bmd_id}.enc.json"
+        encrypt_json_file(str(input_path), str(out_file), aes_key)
 
     print(f"Encrypted export created: {out_file}")
 
@@ -1,12 +1,38 @@
 import os
 import json
 import base64
+import hashlib
+import shutil
+import sqlite3
+import struct
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import padding, utils
 from cryptography.hazmat.primitives import serialization
 from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-import hardware_crypto
+from key_service import get_key_service
+from chunked_aead import encrypt_stream
+from shadow_export import SEGMENT_NAME_RE as SHADOW_SEGMENT_RE, key_id as shadow_key_id
+
+HASH_BLOCK_SIZE = 64 * 1024
+EXPORT_WRITE_BUFFER = 1024 * 1024
+EXPORT_MAX_WORKERS = 4
+EXPORT_TMP_PREFIX = ".partial_"
+
+HYBRID_MAGIC = b"EVHY"
+HYBRID_VERSION = 1
+
+EXPORT_FORMAT_STREAM = "stream"
+EXPORT_FORMAT_JSON = "json"
+EXPORT_EXTENSIONS = {
+    EXPORT_FORMAT_STREAM: ".enc",
+    EXPORT_FORMAT_JSON: ".enc.json",
+}
 
 class ExportService:
     def __init__(self, key_path="private.pem", aes_key_storage_path=None, usb_mount_point=None):
@@ -53,21 +79,74 @@ class ExportService:
         return None
 
     def _load_private_key(self):
-        """Loads and unlocks the private key using the hardware-bound passphrase."""
+        """Loads the private key from the shared KeyService (unlocked once per process)."""
         if not os.path.exists(self.key_path):
             raise FileNotFoundError(f"Private key not found at {self.key_path}")
-            
-        # Get hardware-specific passphrase
-        passphrase = hardware_crypto.get_hardware_passphrase()
-        
-        with open(self.key_path, "rb") as key_file:
-            self.private_key = serialization.load_pem_private_key(
-                key_file.read(),
-                password=passphrase if isinstance(passphrase, bytes) else passphrase.encode('utf-8')
-            )
+
+        self.private_key = get_key_service().get_private_key(self.key_path)
+
+    def _hash_file(self, file_path):
+        """Stream file_path through SHA-256; returns (digest_bytes, size)."""
+        digest = hashlib.sha256()
+        size = 0
+        with open(file_path, "rb") as f:
+            while True:
+                block = f.read(HASH_BLOCK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                size += len(block)
+        return digest.digest(), size
+
+    def _sign_digest(self, digest):
+        """RSA-PSS sign a precomputed SHA-256 digest (same signature as signing the data)."""
+        if not self.private_key:
+            self._load_private_key()
+
+        return self.private_key.sign(
+            digest,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH
+            ),
+            utils.Prehashed(hashes.SHA256())
+        )
+
+    def _fsync_dir(self, dir_path):
+        """Flush a directory entry (rename) to disk; not supported on every platform/filesystem."""
+        try:
+            fd = os.open(dir_path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _commit_file(self, tmp_path, final_path):
+        """fsync tmp_path, rename it over final_path and fsync the directory."""
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+        self._fsync_dir(os.path.dirname(os.path.abspath(final_path)))
+
+    def _atomic_write_bytes(self, final_path, data):
+        tmp_path = os.path.join(
+            os.path.dirname(os.path.abspath(final_path)),
+            EXPORT_TMP_PREFIX + os.path.basename(final_path)
+        )
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        self._commit_file(tmp_path, final_path)
 
     def sign_file(self, file_path):
-        """Generates an RSA signature for the given file."""
+        """Generates an RSA signature for the given file.
+
+        The file is hashed in fixed-size blocks, so memory use does not grow
+        with the file size.
+        """
         if not self.private_key:
             self._load_private_key()
             
@@ -75,18 +154,9 @@ class ExportService:
             raise FileNotFoundError(f"Source file not found: {file_path}")
 
         print(f"Generating RSA signature for {file_path}...")
-        
-        with open(file_path, "rb") as f:
-            data = f.read()
 
-        signature = self.private_key.sign(
-            data,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+        digest, _ = self._hash_file(file_path)
+        signature = self._sign_digest(digest)
         
         sig_path = file_path + ".sig"
         with open(sig_path, "wb") as f:
@@ -95,12 +165,58 @@ class ExportService:
         print(f"Signature saved to {sig_path}")
         return sig_path
 
-    def hybrid_encrypt_file(self, source_path, server_key_path="server_key.pem"):
+    def _manifest_entry(self, file_path):
+        digest, size = self._hash_file(file_path)
+        return {
+            "name": os.path.basename(file_path),
+            "size": size,
+            "sha256": digest.hex(),
+        }
+
+    def sign_manifest(self, file_paths, manifest_path, bmd_id=None, entries=None):
         """
-        Encrypts a file of any size using Hybrid Encryption:
-        1. Generates a random AES key (Fernet).
-        2. Encrypts the large file with AES.
-        3. Encrypts the AES key itself with the Server's RSA Public Key.
+        Write a JSON manifest (name, size, sha256) of file_paths and sign it.
+
+        Every file is hashed in blocks (unless precomputed entries are given)
+        and the whole export is covered by a single RSA-PSS signature over the
+        manifest.  The signature (manifest_path + ".sig") is written first and
+        the manifest itself last, both atomically, so a manifest on the stick
+        means the export finished.  If the private key is unavailable the
+        manifest is still written unsigned and sig_path is None.
+        Returns (manifest_path, sig_path).
+        """
+        if entries is None:
+            entries = [self._manifest_entry(path) for path in file_paths]
+
+        manifest = {
+            "bmd_id": bmd_id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "hash_algorithm": "SHA-256",
+            "signature_algorithm": "RSA-PSS-SHA256",
+            "files": entries,
+        }
+        manifest_bytes = json.dumps(manifest, indent=2).encode("utf-8")
+
+        sig_path = manifest_path + ".sig"
+        try:
+            signature = self._sign_digest(hashlib.sha256(manifest_bytes).digest())
+            self._atomic_write_bytes(sig_path, signature)
+        except Exception as e:
+            print(f"Warning: export manifest not signed: {e}")
+            sig_path = None
+
+        self._atomic_write_bytes(manifest_path, manifest_bytes)
+        return manifest_path, sig_path
+
+    def hybrid_encrypt_file(self, source_path, server_key_path="server_key.pem", dest_path=None):
+        """
+        Encrypts a file of any size using Hybrid Encryption into one container:
+        1. Generates a random AES-256-GCM key.
+        2. Wraps it with the Server's RSA Public Key (OAEP-SHA256).
+        3. Streams the file through chunked AES-GCM (chunked_aead.encrypt_stream).
+
+        Container layout (single write pass, bounded memory):
+            magic "EVHY" | version u8 | wrapped_key_len u16 | wrapped key | stream
         """
         if not os.path.exists(server_key_path):
             raise FileNotFoundError(f"Server public key not found at {server_key_path}")
@@ -109,24 +225,10 @@ class ExportService:
         with open(server_key_path, "rb") as key_file:
             server_public_key = serialization.load_pem_public_key(key_file.read())
             
-        print(f"Encrypting {source_path} using Hybrid Encryption (AES + RSA)...")
+        print(f"Encrypting {source_path} using Hybrid Encryption (AES-GCM + RSA)...")
             
-        # 2. Generate random AES (Fernet) key
-        from cryptography.fernet import Fernet
-        aes_key = Fernet.generate_key()
-        fernet = Fernet(aes_key)
-        
-        # 3. Encrypt the actual file data with AES
-        with open(source_path, "rb") as f:
-            plaintext_data = f.read()
-            
-        encrypted_data = fernet.encrypt(plaintext_data)
-        
-        enc_file_path = source_path + ".enc"
-        with open(enc_file_path, "wb") as f:
-            f.write(encrypted_data)
-            
-        # 4. Encrypt the AES key with the Server's Public RSA Key
+        # 2. Generate random AES key and wrap it for the server
+        aes_key = AESGCM.generate_key(bit_length=256)
         encrypted_aes_key = server_public_key.encrypt(
             aes_key,
             padding.OAEP(
@@ -136,13 +238,15 @@ class ExportService:
             )
         )
         
-        enc_key_path = source_path + ".key.enc"
-        with open(enc_key_path, "wb") as f:
-            f.write(encrypted_aes_key)
+        # 3. Write header + wrapped key, then stream the file data
+        enc_file_path = dest_path or source_path + ".enc"
+        with open(source_path, "rb") as src, open(enc_file_path, "wb", buffering=EXPORT_WRITE_BUFFER) as dst:
+            dst.write(HYBRID_MAGIC + struct.pack(">BH", HYBRID_VERSION, len(encrypted_aes_key)))
+            dst.write(encrypted_aes_key)
+            encrypt_stream(aes_key, src, dst, source_name=os.path.basename(source_path))
             
-        print(f"Generated encrypted payload: {enc_file_path}")
-        print(f"Generated encrypted AES key: {enc_key_path}")
-        return enc_file_path, enc_key_path
+        print(f"Generated hybrid encrypted container: {enc_file_path}")
+        return enc_file_path
 
     def _load_stored_aes_key(self):
         """Load previously decrypted ballot AES key from USB/env/local fallback."""
@@ -210,10 +314,28 @@ class ExportService:
 
         return "UNKNOWN_BMD"
 
+    def _export_format(self):
+        """Export container format: "stream" (default) or legacy "json" (EVOTING_EXPORT_FORMAT)."""
+        fmt = os.environ.get("EVOTING_EXPORT_FORMAT", EXPORT_FORMAT_STREAM).strip().lower()
+        if fmt not in EXPORT_EXTENSIONS:
+            print(f"Warning: unknown EVOTING_EXPORT_FORMAT '{fmt}', using '{EXPORT_FORMAT_STREAM}'")
+            return EXPORT_FORMAT_STREAM
+        return fmt
+
+    def encrypt_file_stream(self, source_path, dest_path, aes_key):
+        """
+        Encrypt file with stored AES-256 key as a chunked AES-GCM stream.
+        Reads and writes one chunk at a time (see chunked_aead.encrypt_stream),
+        so memory does not grow with the log size.
+        """
+        with open(source_path, "rb") as src, open(dest_path, "wb", buffering=EXPORT_WRITE_BUFFER) as dst:
+            return encrypt_stream(aes_key, src, dst, source_name=os.path.basename(source_path))
+
     def encrypt_file_with_stored_aes(self, source_path, dest_path, aes_key):
         """
         Encrypt file with stored AES-256 key using AESGCM.
         Output is a JSON envelope (no plaintext transferred to USB).
+        Legacy single-shot format; kept for EVOTING_EXPORT_FORMAT=json.
         """
         with open(source_path, "rb") as f:
             plaintext = f.read()
@@ -232,10 +354,138 @@ class ExportService:
         with open(dest_path, "w", encoding="utf-8") as f:
             json.dump(payload, f, indent=2)
 
-    def export_election_data(self, source_log_dir, usb_mount_point):
+    def _stage_directory_tar(self, source_dir, staging_dir, arcname):
+        """Bundle source_dir into an uncompressed tar in staging_dir (local disk, not USB)."""
+        tar_path = os.path.join(staging_dir, f"{arcname}.tar")
+        with tarfile.open(tar_path, "w") as tar:
+            tar.add(source_dir, arcname=arcname)
+        return tar_path
+
+    def _stage_sqlite_db(self, db_path, staging_dir):
+        """Take a consistent copy of the live ballot DB with the SQLite backup API."""
+        copy_path = os.path.join(staging_dir, os.path.basename(db_path))
+        src = sqlite3.connect(db_path)
+        try:
+            dst = sqlite3.connect(copy_path)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+        return copy_path
+
+    def _shadow_segment_artefacts(self, label, prefix, bmd_id, segments):
+        """One copy-only artefact per closed shadow segment (already encrypted)."""
+        artefacts = []
+        for segment_path in segments:
+            match = SHADOW_SEGMENT_RE.match(os.path.basename(segment_path))
+            start = int(match.group("start")) if match else 0
+            artefacts.append((
+                f"{label} segment @{start}",
+                f"{prefix}_{bmd_id}.{start:012d}.enc",
+                lambda p=segment_path: p,
+                lambda src, dst: shutil.copyfile(src, dst),
+            ))
+        return artefacts
+
+    def _collect_export_artefacts(self, source_log_dir, staging_dir, bmd_id, extension, write_encrypted,
+                                  shadow_segments=None):
+        """
+        Return [(label, dest_name, stage_fn, write_fn)] for every artefact present.
+        stage_fn returns the local source path; write_fn(source, tmp_dest) produces
+        the encrypted file.  Logs covered by shadow_segments are copied as-is.
+        """
+        artefacts = []
+        shadow_segments = shadow_segments or {}
+
+        for name, prefix in (("votes.json", "final_votes"), ("tokens.log", "final_tokens")):
+            log_path = os.path.join(source_log_dir, name)
+            segments = shadow_segments.get(os.path.abspath(log_path))
+            if segments:
+                artefacts.extend(self._shadow_segment_artefacts(name, prefix, bmd_id, segments))
+            elif os.path.exists(log_path):
+                artefacts.append((name, f"{prefix}_{bmd_id}{extension}", lambda p=log_path: p, write_encrypted))
+
+        # DataHandler writes snapshots relative to the working directory.
+        for snapshots_dir in (
+            os.path.join(source_log_dir, "used_ballots"),
+            os.path.join("logs", "used_ballots"),
+        ):
+            if os.path.isdir(snapshots_dir) and os.listdir(snapshots_dir):
+                artefacts.append((
+                    "used ballot snapshots", f"final_used_ballots_{bmd_id}{extension}",
+                    lambda d=snapshots_dir: self._stage_directory_tar(d, staging_dir, "used_ballots"),
+                    write_encrypted,
+                ))
+                break
+
+        applogs_dir = os.path.join(source_log_dir, "applogs")
+        if os.path.isdir(applogs_dir) and os.listdir(applogs_dir):
+            artefacts.append((
+                "applogs", f"final_applogs_{bmd_id}{extension}",
+                lambda: self._stage_directory_tar(applogs_dir, staging_dir, "applogs"),
+                write_encrypted,
+            ))
+
+        db_path = os.path.join(source_log_dir, "evoting_ballots.db")
+        if os.path.exists(db_path):
+            artefacts.append((
+                "ballot database", f"final_ballots_db_{bmd_id}{extension}",
+                lambda: self._stage_sqlite_db(db_path, staging_dir),
+                write_encrypted,
+            ))
+
+        return artefacts
+
+    def _finalize_shadow_export(self, shadow_exporter, aes_key, export_format):
+        """Close the shadow segments; returns {log path: segments} or None to export in full."""
+        if shadow_exporter is None:
+            return None
+        if export_format != EXPORT_FORMAT_STREAM:
+            print("Shadow export ignored: EVOTING_EXPORT_FORMAT is not 'stream'")
+            return None
+        if shadow_exporter.key_id != shadow_key_id(aes_key):
+            print("Shadow export ignored: it was encrypted with a different AES key")
+            return None
+        try:
+            start = time.perf_counter()
+            segments = shadow_exporter.finalize()
+            print(f"Shadow export finalized in {time.perf_counter() - start:.2f}s")
+            return segments
+        except Exception as e:
+            print(f"Shadow export unusable, exporting logs in full: {e}")
+            return None
+
+    def _export_artefact(self, label, stage_fn, final_path, write_fn):
+        """Worker: stage, write to a temp name, fsync, rename into place, hash."""
+        tmp_path = os.path.join(os.path.dirname(final_path), EXPORT_TMP_PREFIX + os.path.basename(final_path))
+        start = time.perf_counter()
+        try:
+            source_path = stage_fn()
+            write_fn(source_path, tmp_path)
+            self._commit_file(tmp_path, final_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        entry = self._manifest_entry(final_path)
+        print(f"Exported: Encrypted {label} ({entry['size']} bytes, {time.perf_counter() - start:.2f}s)")
+        return entry
+
+    def export_election_data(self, source_log_dir, usb_mount_point, shadow_exporter=None):
         """
         Encrypt critical log files using stored AES-GCM-256 key before writing to USB.
 
+        Votes, tokens, used-ballot snapshots, application logs and a backup of
+        the ballot database are encrypted concurrently.  Each file is written
+        under a temporary name, fsync'd and renamed into place; the manifest is
+        written last, so an export without a manifest is incomplete.
+
+        With a ShadowExporter the vote and token logs are already encrypted on
+        the LOGS partition; only the last delta is encrypted and the segments
+        are copied as final_<log>_<bmd>.<offset>.enc.
+
         No plaintext files are transferred to USB.
         Returns the path to the export directory on the USB drive.
         """
@@ -249,32 +499,58 @@ class ExportService:
 
         bmd_id = self._resolve_bmd_id()
         print(f"Using BMD ID for export naming: {bmd_id}")
-        
-        # Files to export
-        votes_log = os.path.join(source_log_dir, "votes.json")
-        tokens_log = os.path.join(source_log_dir, "tokens.log")
 
         # Load stored AES key from ballot import stage.
         aes_key = self._load_stored_aes_key()
-        
-        exported_files = []
-        
-        # 1. Encrypt votes log
-        if os.path.exists(votes_log):
-            dest_votes_enc = os.path.join(export_dir, f"final_votes_{bmd_id}.enc.json")
-            self.encrypt_file_with_stored_aes(votes_log, dest_votes_enc, aes_key)
-            exported_files.append(dest_votes_enc)
-            print("Exported: Encrypted votes.json")
-
-        # 2. Encrypt tokens log
-        if os.path.exists(tokens_log):
-            dest_tokens_enc = os.path.join(export_dir, f"final_tokens_{bmd_id}.enc.json")
-            self.encrypt_file_with_stored_aes(tokens_log, dest_tokens_enc, aes_key)
-            exported_files.append(dest_tokens_enc)
-            print("Exported: Encrypted tokens.log")
-            
-        if not exported_files:
-            raise Exception("No log files found to export.")
-            
-        print(f"Successfully exported {len(exported_files)} files to {export_dir}")
+
+        export_format = self._export_format()
+        extension = EXPORT_EXTENSIONS[export_format]
+        encrypt = (
+            self.encrypt_file_stream if export_format == EXPORT_FORMAT_STREAM
+            else self.encrypt_file_with_stored_aes
+        )
+        shadow_segments = self._finalize_shadow_export(shadow_exporter, aes_key, export_format)
+
+        # A manifest from an earlier run would make a half-finished export look complete.
+        manifest_path = os.path.join(export_dir, f"manifest_{bmd_id}.json")
+        for stale in (manifest_path, manifest_path + ".sig"):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        staging_dir = tempfile.mkdtemp(prefix=".export_staging_", dir=source_log_dir)
+        start = time.perf_counter()
+        try:
+            artefacts = self._collect_export_artefacts(
+                source_log_dir, staging_dir, bmd_id, extension,
+                lambda src, dst: encrypt(src, dst, aes_key),
+                shadow_segments=shadow_segments,
+            )
+            if not any(name.startswith(("final_votes_", "final_tokens_")) for _, name, _, _ in artefacts):
+                raise Exception("No log files found to export.")
+
+            workers = max(1, min(EXPORT_MAX_WORKERS, len(artefacts)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+                futures = [
+                    pool.submit(
+                        self._export_artefact, label, stage_fn,
+                        os.path.join(export_dir, dest_name), write_fn
+                    )
+                    for label, dest_name, stage_fn, write_fn in artefacts
+                ]
+                # Collect in submission order so the manifest is deterministic.
+                entries = [future.result() for future in futures]
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        # Signed manifest over everything exported (one RSA operation), written last.
+        _, sig_path = self.sign_manifest(
+            [os.path.join(export_dir, e["name"]) for e in entries],
+            manifest_path, bmd_id=bmd_id, entries=entries
+        )
+        print("Exported: Signed manifest" if sig_path else "Exported: Manifest (unsigned)")
+
+        print(
+            f"Successfully exported {len(entries)} files to {export_dir} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
         return export_dir
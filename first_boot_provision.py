@@ -601,7 +601,7 @@ class ProvisionApp:
             def __init__(self):
                 self.project_dir = os.path.dirname(os.path.abspath(__file__))
         
-        ps = PrinterService(DummyDataHandler())
+        ps = PrinterService(DummyDataHandler(), state_dir=self.log_dir)
         
         try:
             ps.connect_printer()
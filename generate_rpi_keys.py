@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 from hardware_crypto import get_hardware_passphrase
+from card_crypto import CARD_PUBLIC_KEY_FILE, generate_card_keypair
 
 
 def _resolve_bmd_id(default_value=1):
@@ -75,11 +76,15 @@ def generate_keys():
     with open(os.path.join(_script_dir, 'public.pem'), 'wb') as f:
         f.write(public_pem)
 
-    # 5. Generate bmd_key.json for key distribution workflows.
+    # 5. Generate the X25519 key for compact voter cards (same hardware lock)
+    card_public_pem = generate_card_keypair(_script_dir, passphrase)
+
+    # 6. Generate bmd_key.json for key distribution workflows.
     bmd_key_payload = [
         {
             "bmd_id": _resolve_bmd_id(1),
             "rsa_public_key_pem": public_pem.decode("utf-8"),
+            "x25519_card_public_key_pem": card_public_pem.decode("utf-8"),
             "is_active": True,
             "key_version": _resolve_key_version(1),
             "created_at": _iso_utc_now()
@@ -89,8 +94,9 @@ def generate_keys():
     with open(os.path.join(_script_dir, 'bmd_key.json'), 'w', encoding='utf-8') as f:
         json.dump(bmd_key_payload, f, indent=2)
 
-    print("Success! Generated 'public.pem', 'private.pem', and 'bmd_key.json'.")
+    print("Success! Generated 'public.pem', 'private.pem', the card X25519 key pair and 'bmd_key.json'.")
     print("Give 'public.pem' to the Election Admin to encrypt ballots.")
+    print(f"Give '{CARD_PUBLIC_KEY_FILE}' to the card issuer to write compact voter cards.")
     print("Keep 'private.pem' on this exact Raspberry Pi.")
 
 if __name__ == "__main__":
@@ -9,6 +9,11 @@ import subprocess
 import json
 import calendar
 
+from device_health import get_device_health
+from print_spooler import PrintSpooler, PrintSpoolerBusy
+from rfid_daemon import RFIDClient
+from rfid_worker import RFIDWorker
+
 class VotingApp:
     def __init__(self, root, data_handler, printer_service, ballot_manager, rfid_service, db_path, votes_log, tokens_log, log_dir):
         self.root = root
@@ -16,12 +21,38 @@ class VotingApp:
         self.printer_service = printer_service
         self.ballot_manager = ballot_manager
         self.rfid_service = rfid_service
+
+        # One worker thread owns the reader; screens switch its scan mode and
+        # read results from the queue the current scan was started with.
+        self._rfid_sink = None
+        self.stop_scanning = True
+        # An rfid_daemon.RFIDClient already is the worker (the reader lives in
+        # the daemon process); a local RFIDService gets an in-process worker.
+        if isinstance(rfid_service, RFIDClient):
+            self.rfid_worker = rfid_service
+        else:
+            self.rfid_worker = RFIDWorker(rfid_service)
+        self.rfid_worker.subscribe(self._on_rfid_result)
+        self.rfid_worker.start()
         
         # Store paths for deferred initialization
         self.db_path = db_path
         self.votes_log = votes_log
         self.tokens_log = tokens_log
         self.log_dir = log_dir
+
+        # One spooler thread owns the printer.  Job events come back through
+        # _print_events and go to the handler of the job that submitted them.
+        self._print_events = queue.Queue()
+        self._print_handlers = {}
+        spool_dir = os.path.join(log_dir, "print_spool") if log_dir and os.path.isdir(log_dir) else None
+        self.print_spooler = PrintSpooler(printer_service, spool_dir=spool_dir)
+        self.print_spooler.subscribe(self._on_print_event)
+        self.print_spooler.start()
+
+        # WiFi/SSH/Bluetooth/device ID are probed in the background so the
+        # startup ticket and System Status never wait on subprocesses.
+        get_device_health().start()
         
         self.active_token = None
         self.challenge_counts_by_election = {}
@@ -58,8 +89,6 @@ class VotingApp:
         self.print_enabled = True
         self.pending_print_job = None
         self.pending_batch_receipts = None
-        self.print_status_after_id = None
-        self.batch_print_status_after_id = None
         self.session_complete_after_id = None
         self.clock_after_id = None
         self.clock_label = None
@@ -73,6 +102,8 @@ class VotingApp:
         self.main_container = tk.Frame(self.root, bg="#ffffff")
         self.main_container.pack(fill=tk.BOTH, expand=True)
         
+        self._pump_print_events()
+
         # Start with USB Polling Screen
         self.show_usb_waiting_screen()
 
@@ -135,20 +166,15 @@ class VotingApp:
             fg="#555"
         ).pack(pady=(16, 0))
 
-        # Ensure RFID is initialized on USB waiting screen too.
+        # Ensure the RFID key is unlocked on USB waiting screen too; the
+        # RFID worker connects the reader when scanning starts.
         try:
             self.rfid_service.load_key()
-            self.rfid_service.connect()
         except Exception as e:
             print(f"RFID init warning on USB wait screen: {e}")
 
         # USB waiting screen allows polling officer menu access only via RFID authorization.
-        self.stop_scanning = False
-        self.officer_scan_queue = queue.Queue()
-        self.officer_scan_thread = threading.Thread(target=self.officer_scan_loop)
-        self.officer_scan_thread.daemon = True
-        self.officer_scan_thread.start()
-        self.check_officer_scan_queue()
+        self._start_officer_scan()
 
         self.check_usb_loop()
 
@@ -170,7 +196,7 @@ class VotingApp:
 
         if ballot_path and os.path.exists(ballot_path):
             # Found USB with encrypted ballot folder - trigger import
-            self.stop_scanning = True
+            self._stop_rfid_scan()
             self.last_usb_import_error = None
             self.ballot_manager.usb_mount_point = usb_path
             self.import_encrypted_ballots(usb_path)
@@ -181,7 +207,7 @@ class VotingApp:
 
     def import_encrypted_ballots(self, usb_path):
         """Import encrypted ballots from USB and prepare for voting."""
-        self.stop_scanning = True
+        self._stop_rfid_scan()
         self.clear_container()
         frame = tk.Frame(self.main_container, bg="#E8F5E9")
         frame.pack(expand=True, fill=tk.BOTH)
@@ -248,7 +274,7 @@ class VotingApp:
     def end_election(self):
         """Triggers secure export process without automatic shutdown."""
         if self._show_custom_confirm("Confirm End Election", "Are you sure you want to officially end the election?\nThis will export data to USB."):
-            self.stop_scanning = True
+            self._stop_rfid_scan()
             
             try:
                 schedule = self._load_election_schedule()
@@ -262,6 +288,23 @@ class VotingApp:
             self.show_printing_modal(text="Ending election and exporting logs...")
             threading.Thread(target=self._end_election_worker, daemon=True).start()
 
+    def _start_shadow_export(self):
+        """Keep an encrypted copy of votes/tokens on the LOGS partition as they are written."""
+        if getattr(self, 'shadow_exporter', None) is not None:
+            self.data_handler.shadow_exporter = self.shadow_exporter
+            return
+        try:
+            from shadow_export import ShadowExporter
+            aes_key = self.data_handler._load_stored_aes_key()
+            self.shadow_exporter = ShadowExporter(self.log_dir, [self.votes_log, self.tokens_log], aes_key)
+            self.shadow_exporter.start()
+            self.shadow_exporter.notify()  # catch up on anything logged before this start
+            self.data_handler.shadow_exporter = self.shadow_exporter
+            print(f"[shadow] Incremental export active: {self.shadow_exporter.status_text()}")
+        except Exception as e:
+            self.shadow_exporter = None
+            print(f"[shadow] Incremental export disabled, full export at end of election: {e}")
+
     def _end_election_worker(self):
         try:
             # Find the USB drive explicitly in case it was unplugged.
@@ -271,12 +314,14 @@ class VotingApp:
 
             from export_service import ExportService
             exporter = ExportService("private.pem", usb_mount_point=usb_path)
-            export_path = exporter.export_election_data(self.log_dir, usb_path)
+            export_path = exporter.export_election_data(
+                self.log_dir, usb_path, shadow_exporter=getattr(self, 'shadow_exporter', None)
+            )
 
             # Fetch final hash and force printing of final receipt before shutdown.
             if self.print_enabled and hasattr(self, 'data_handler') and hasattr(self, 'printer_service'):
                 final_hash = self.data_handler.last_hash or "UNKNOWN_HASH"
-                self.printer_service.print_end_election_ticket(final_hash, export_path)
+                self.print_spooler.submit("end", final_hash=final_hash, export_path=export_path).future.result()
             elif self.print_enabled:
                 raise Exception("Core services unavailable for end-of-election receipt printing.")
 
@@ -331,10 +376,12 @@ class VotingApp:
 
             print(f"Initializing DataHandler with candidate map: {candidate_path}")
             self.data_handler = DataHandler(candidate_path, log_file=self.votes_log, token_log_file=self.tokens_log) 
-            self.printer_service = PrinterService(self.data_handler)
+            self._start_shadow_export()
+            self.printer_service = PrinterService(self.data_handler, state_dir=self._printer_state_dir())
+            self.print_spooler.printer_service = self.printer_service
             
             # Perform an initial cut to clear the printer roll on startup
-            if not self.printer_service.is_printer_connected():
+            if not self._probe_printer(wait=30):
                 self._show_custom_messagebox("Printer Error", "No USB thermal printer detected! Cannot safely run election. Please connect printer and restart system.", alert_type='error')
                 return
 
@@ -344,17 +391,17 @@ class VotingApp:
                 else:
                     # Just do an initial feed+cut to clear any previous partial print on the roll.
                     # The genesis/startup ticket is printed later when the election window first activates.
-                    self.printer_service.printer.text("\n\n\n\n\n\n\n\n\n\n") # Feed past blade
-                    self.printer_service.printer.cut()
-                    self.printer_service.printer.text("\n\n\n\n\n\n") # Extra feed after cut
+                    self.print_spooler.submit("cut").future.result(timeout=30)
                     print("Printer initialized with a startup cut.")
             except Exception as e:
                 self._show_custom_messagebox("Printer Error", f"Startup print failed, printer may be jammed: {e}", alert_type='error')
                 return
+
+            if self.print_enabled:
+                self._offer_recovered_print_jobs()
                     
-            # Initialize RFID
+            # Initialize RFID (the RFID worker connects the reader when scanning starts)
             self.rfid_service.load_key()
-            self.rfid_service.connect()
             
             # Try to load base candidates mapping
             try:
@@ -529,18 +576,17 @@ class VotingApp:
         if not hasattr(self, 'printer_service') or not self.printer_service:
             return
 
-        if not self.printer_service.is_printer_connected():
-            print("[schedule] Start-window ticket pending: printer not connected.")
-            return
-
-        try:
-            election_hash = getattr(self.data_handler, 'last_hash', None) if hasattr(self, 'data_handler') else None
-            self.printer_service.print_startup_ticket(election_hash or "UNKNOWN_HASH", self.log_dir)
+        def on_printed(result):
+            if isinstance(result, Exception):
+                # Left pending: the next active window tries again.
+                print(f"[schedule] Start-window ticket pending: {result}")
+                return
             schedule["start_ticket_printed_for"] = start_text
             self._save_election_schedule()
             print("[schedule] Start-window ticket printed.")
-        except Exception as exc:
-            print(f"[schedule] Failed printing start-window ticket: {exc}")
+
+        election_hash = getattr(self.data_handler, 'last_hash', None) if hasattr(self, 'data_handler') else None
+        self._submit_print("startup", on_printed, genesis_hash=election_hash or "UNKNOWN_HASH", log_dir=self.log_dir)
 
     def show_idle_screen(self):
         is_active = self._is_election_active_now()
@@ -629,12 +675,7 @@ class VotingApp:
         self.clock_label.place(relx=0.985, rely=0.03, anchor='ne')
         self._refresh_clock_label()
 
-        self.stop_scanning = False
-        self.officer_scan_queue = queue.Queue()
-        self.officer_scan_thread = threading.Thread(target=self.officer_scan_loop)
-        self.officer_scan_thread.daemon = True
-        self.officer_scan_thread.start()
-        self.check_officer_scan_queue()
+        self._start_officer_scan()
 
         self._schedule_inactive_recheck()
 
@@ -740,35 +781,44 @@ class VotingApp:
         self.clock_label.place(relx=0.985, rely=0.03, anchor='ne')
         self._refresh_clock_label()
 
-        # Start Scanning Thread — voter cards only (encrypted mode).
+        # Start scanning — voter cards only (encrypted mode).
+        self._start_voter_scan()
+
+    # ─────────────────────────────────────────────────────────────
+    # RFID scanning (rfid_worker.RFIDWorker owns the reader)
+    # ─────────────────────────────────────────────────────────────
+
+    def _on_rfid_result(self, mode, result):
+        # Runs on the RFID worker thread: hand the result to the queue the
+        # current scan was started with, dropping results of a superseded scan.
+        sink = self._rfid_sink
+        if sink is not None and sink[0] == mode:
+            sink[1].put(result)
+
+    def _start_rfid_scan(self, mode, result_queue):
         self.stop_scanning = False
+        self._rfid_sink = (mode, result_queue)
+        self.rfid_worker.set_mode(mode)
+
+    def _stop_rfid_scan(self):
+        self.stop_scanning = True
+        self._rfid_sink = None
+        self.rfid_worker.set_mode(None)
+
+    def _start_voter_scan(self):
+        # Voter-only scan: use 'encrypted' mode so only encrypted voter cards
+        # are processed.  Officer access is handled exclusively via the
+        # dedicated 'Polling Officer' button which triggers its own plain-mode
+        # scan, keeping the two workflows cleanly separated.
         self.scan_queue = queue.Queue()
-        self.scan_thread = threading.Thread(target=self.rfid_scan_loop)
-        self.scan_thread.daemon = True
-        self.scan_thread.start()
-        
+        self._start_rfid_scan('encrypted', self.scan_queue)
         self.check_scan_queue()
 
-    def rfid_scan_loop(self):
-        while not self.stop_scanning:
-            if not getattr(self.rfid_service, 'connected', False):
-                try:
-                    self.rfid_service.connect()
-                except Exception:
-                    pass
-                time.sleep(0.5)
-                continue
-
-            # Voter-only scan: use 'encrypted' mode so only RSA-encrypted voter
-            # cards are processed.  Officer access is handled exclusively via the
-            # dedicated 'Polling Officer' button which triggers its own plain-mode
-            # scan, keeping the two workflows cleanly separated.
-            result = self.rfid_service.read_card(mode='encrypted')
-            if result:
-                self.scan_queue.put(result)
-                break
-            # No card or transient failure — short poll before next attempt.
-            time.sleep(0.15)
+    def _start_officer_scan(self):
+        # Admin/officer cards carry a plain-text phrase — use explicit plain mode.
+        self.officer_scan_queue = queue.Queue()
+        self._start_rfid_scan('plain', self.officer_scan_queue)
+        self.check_officer_scan_queue()
 
     def check_scan_queue(self):
         try:
@@ -804,7 +854,7 @@ class VotingApp:
             self._show_custom_messagebox("Error", f"Failed to reset log: {e}", alert_type='error')
 
     def skip_rfid_check(self):
-        self.stop_scanning = True
+        self._stop_rfid_scan()
         # Simulate a dev token that grants access only to election_id_1.
         payload = '{"token_id": "DEV_SKIP_' + str(int(time.time())) + '", "eid_vector": "election_id_1"}'
         self.on_card_scanned(payload)
@@ -844,7 +894,8 @@ class VotingApp:
             return
 
         # 0. Check Printer Status First
-        if hasattr(self.printer_service, 'is_printer_connected') and not self.printer_service.is_printer_connected():
+        # A probe the spooler cannot reach in time means it is printing; let the vote's own job report.
+        if self._probe_printer(wait=2.0) is False:
             print("❌ Printer not connected. Rejecting voter session.")
             self.show_rfid_error("Printer Error\nPlease check printer connection.")
             return
@@ -957,6 +1008,7 @@ class VotingApp:
         else:
             # Abort session and return to home screen
             self.election_queue = []
+            self._clear_rfid_token_cache()
             self.active_token = None
             self.current_election_id = None
             self.show_idle_screen()
@@ -967,22 +1019,11 @@ class VotingApp:
         if not aborted and self.merge_receipts and hasattr(self, 'receipt_buffer') and self.receipt_buffer and self.print_enabled:
             self.pending_batch_receipts = list(self.receipt_buffer)
             self.show_printing_modal(text="Printing Consolidated VVPAT...")
-            
-            self.batch_print_queue = queue.Queue()
-            
-            def batch_printer_worker(receipts):
-                try:
-                    result = self.printer_service.print_session_receipts(receipts, stage="vvpat")
-                    self.batch_print_queue.put(result)
-                except Exception as e:
-                    self.batch_print_queue.put(e)
-
-            self.batch_print_thread = threading.Thread(target=batch_printer_worker, args=(self.receipt_buffer,))
-            self.batch_print_thread.daemon = True
-            self.batch_print_thread.start()
-            
-            self.batch_print_start_time = datetime.datetime.now()
-            self.check_batch_print_status(aborted)
+            self._submit_print(
+                "batch",
+                lambda result: self._on_batch_print_result(result, aborted),
+                receipts=list(self.receipt_buffer),
+            )
             return
 
         # If printing is disabled, persist buffered votes without printing.
@@ -1001,64 +1042,54 @@ class VotingApp:
 
         self._finalize_session(aborted)
 
-    def check_batch_print_status(self, aborted=False):
-        try:
-            result = self.batch_print_queue.get_nowait()
-            if isinstance(result, dict) and result.get('stage') == 'vvpat_complete':
-                self.close_printing_modal()
-                self._show_vvpat_confirmation_modal(
-                        "",
-                    self._start_receipt_stage_for_batch,
-                )
-                return
+    def _on_batch_print_result(self, result, aborted=False):
+        if isinstance(result, dict) and result.get('stage') == 'vvpat_complete':
             self.close_printing_modal()
-            if result is True:
-                # 2. Log Votes (Only if Print Succeeded)
-                all_records = []
-                source_buffer = self.pending_batch_receipts if self.pending_batch_receipts is not None else self.receipt_buffer
-                for entry in source_buffer:
-                    vr = entry.get('vote_record')
-                    if isinstance(vr, list):
-                        all_records.extend(vr)
-                    elif vr:
-                        all_records.append(vr)
-                
-                if all_records:
-                    for r in all_records:
-                        self.data_handler.save_json(r)
-                self.receipt_buffer = []
-                self.pending_batch_receipts = None
-                self._cancel_pending_print_polling()
-                self._finalize_session(aborted)
-            else:
-                print(f"Batch print error: {result}")
-                if self._show_custom_confirm("Printer Error", f"Failed to print session receipt: {result}\n\nRetry?", yes_text="Retry", no_text="Cancel"):
-                    self.finish_voter_session(aborted)
-                else:
-                    self.receipt_buffer = []
-                    self.pending_batch_receipts = None
-                    # Pass True so we don't log votes if the receipt failed to print!
-                    self._finalize_session(True)
+            self._show_vvpat_confirmation_modal(
+                    "",
+                self._start_receipt_stage_for_batch,
+            )
             return
-        except queue.Empty:
-            pass
-
-        elapsed = (datetime.datetime.now() - self.batch_print_start_time).total_seconds()
-        if elapsed > 60:
-            self.close_printing_modal()
-            if self._show_custom_confirm("Printer Timeout", "Printer is taking too long.\n\nRetry?"):
+        self.close_printing_modal()
+        if result is True:
+            # 2. Log Votes (Only if Print Succeeded)
+            all_records = []
+            source_buffer = self.pending_batch_receipts if self.pending_batch_receipts is not None else self.receipt_buffer
+            for entry in source_buffer:
+                vr = entry.get('vote_record')
+                if isinstance(vr, list):
+                    all_records.extend(vr)
+                elif vr:
+                    all_records.append(vr)
+            
+            if all_records:
+                for r in all_records:
+                    self.data_handler.save_json(r)
+            self.receipt_buffer = []
+            self.pending_batch_receipts = None
+            self._finalize_session(aborted)
+        else:
+            print(f"Batch print error: {result}")
+            if self._show_custom_confirm("Printer Error", f"Failed to print session receipt: {result}\n\nRetry?", yes_text="Retry", no_text="Cancel"):
                 self.finish_voter_session(aborted)
             else:
                 self.receipt_buffer = []
+                self.pending_batch_receipts = None
+                # Pass True so we don't log votes if the receipt failed to print!
                 self._finalize_session(True)
-            return
 
-        self.batch_print_status_after_id = self.root.after(500, self.check_batch_print_status, aborted)
+    def _clear_rfid_token_cache(self):
+        """Decrypted tokens cached for re-taps must not outlive the voter session."""
+        try:
+            self.rfid_service.clear_token_cache()
+        except Exception as e:
+            print(f"[rfid] Could not clear token cache: {e}")
 
     def _finalize_session(self, aborted=False):
         # 2. LOG SESSION TOKEN
         if not aborted and self.active_token:
             self.data_handler.log_token(self.active_token)
+        self._clear_rfid_token_cache()
             
         if not aborted:
             self.active_token = None
@@ -1585,11 +1616,8 @@ class VotingApp:
             # Show "Saving..." briefly
             self.show_printing_modal(text="Recording Vote...")
 
-            # Simulate Success (Skip Printer Thread)
-            self.print_queue = queue.Queue()
-            self.print_queue.put(True)
-            self.print_start_time = datetime.datetime.now()
-            self.check_print_status()
+            # Nothing to print until the session ends (batch VVPAT).
+            self._on_vote_print_result(True)
 
         else:
             # NORMAL PRINTING
@@ -1604,25 +1632,12 @@ class VotingApp:
                 return
 
             self.show_printing_modal()
-            self.print_queue = queue.Queue()
-
-            def printer_worker(mode, sel):
-                try:
-                    result = self.printer_service.print_vote(mode, sel, is_final=True, stage="vvpat")
-                    self.print_queue.put(result)
-                except Exception as e:
-                    self.print_queue.put(e)
-
-            self.print_thread = threading.Thread(target=printer_worker, args=(self.voting_mode, self.selections))
-            self.print_thread.daemon = True
-            self.print_thread.start()
-
-            self.print_start_time = datetime.datetime.now()
-            self.check_print_status()
+            self._submit_print(
+                "vvpat", self._on_vote_print_result, mode=self.voting_mode, selections=dict(self.selections)
+            )
 
     def _show_vvpat_confirmation_modal(self, message, on_ok):
         self.close_printing_modal()
-        self._cancel_pending_print_polling()
         self.close_vvpat_confirmation_modal()
         self.vvpat_confirmation_overlay = tk.Toplevel(self.root)
         self.vvpat_confirmation_overlay.title("VVPAT Confirmation")
@@ -1736,16 +1751,6 @@ class VotingApp:
             self.vvpat_confirmation_overlay.destroy()
             self.vvpat_confirmation_overlay = None
 
-    def _cancel_pending_print_polling(self):
-        for attr in ("print_status_after_id", "batch_print_status_after_id"):
-            after_id = getattr(self, attr, None)
-            if after_id:
-                try:
-                    self.root.after_cancel(after_id)
-                except Exception:
-                    pass
-                setattr(self, attr, None)
-
     def _start_receipt_stage_for_vote(self):
         if not self.pending_print_job:
             return
@@ -1760,7 +1765,6 @@ class VotingApp:
 
     def _complete_vote_after_vvpat(self):
         self.close_vvpat_confirmation_modal()
-        self._cancel_pending_print_polling()
 
         try:
             if not self.merge_receipts:
@@ -1793,7 +1797,6 @@ class VotingApp:
 
     def _complete_batch_after_vvpat(self):
         self.close_vvpat_confirmation_modal()
-        self._cancel_pending_print_polling()
 
         try:
             all_records = []
@@ -1877,89 +1880,67 @@ class VotingApp:
         ], separators=(",", ":"))
 
         self.show_printing_modal(text="Printing Challenge Receipt..." if self.print_enabled else "Processing Challenge...")
-        self.print_queue = queue.Queue()
 
         if not self.print_enabled:
-            self.print_queue.put(True)
-            self.print_start_time = datetime.datetime.now()
-            self._check_challenge_print_status()
+            self._on_challenge_print_result(True)
             return
 
-        def _worker():
+        self._submit_print(
+            "challenge", self._on_challenge_print_result,
+            ballot_id=ballot_id, sel_str=sel_str, voter_qr_data=voter_qr_data,
+        )
+
+    def _on_challenge_print_result(self, result):
+        self.close_printing_modal()
+        if result is True:
+            self.challenge_counts_by_election[self.current_election_id] = (
+                self.challenge_counts_by_election.get(self.current_election_id, 0) + 1
+            )
             try:
-                self.printer_service.print_challenge_receipt(ballot_id, sel_str, voter_qr_data)
-                self.print_queue.put(True)
+                self.ballot_manager.mark_as_challenged(
+                    self.data_handler.ballot_file_id,
+                    self.current_election_id
+                )
             except Exception as e:
-                self.print_queue.put(e)
-
-        t = threading.Thread(target=_worker)
-        t.daemon = True
-        t.start()
-
-        self.print_start_time = datetime.datetime.now()
-        self._check_challenge_print_status()
-
-    def _check_challenge_print_status(self):
-        try:
-            result = self.print_queue.get_nowait()
-            self.close_printing_modal()
-            if result is True:
-                self.challenge_counts_by_election[self.current_election_id] = (
-                    self.challenge_counts_by_election.get(self.current_election_id, 0) + 1
+                print(f"Error marking ballot as challenged: {e}")
+            self._show_custom_messagebox(
+                "Ballot Challenged",
+                (
+                    "Your challenge receipt has been printed.\n"
+                    "This ballot has been invalidated and will NOT be counted.\n\n"
+                    "You may use your receipt to verify the commitments independently."
+                    if self.print_enabled else
+                    "Printing is OFF, so no challenge receipt was printed.\n"
+                    "This ballot has been invalidated and will NOT be counted."
                 )
-                try:
-                    self.ballot_manager.mark_as_challenged(
-                        self.data_handler.ballot_file_id,
-                        self.current_election_id
-                    )
-                except Exception as e:
-                    print(f"Error marking ballot as challenged: {e}")
-                self._show_custom_messagebox(
-                    "Ballot Challenged",
-                    (
-                        "Your challenge receipt has been printed.\n"
-                        "This ballot has been invalidated and will NOT be counted.\n\n"
-                        "You may use your receipt to verify the commitments independently."
-                        if self.print_enabled else
-                        "Printing is OFF, so no challenge receipt was printed.\n"
-                        "This ballot has been invalidated and will NOT be counted."
-                    )
+            )
+            while True:
+                satisfied = self._show_large_yes_no_dialog(
+                    "Challenge Verification",
+                    "Are you satisfied after the challenge verification?\n\n"
+                    "Yes: You will vote again in this same election using a new ballot.\n"
+                    "No: Session will be paused/aborted for Presiding Officer review.",
+                    yes_text="Yes",
+                    no_text="No"
                 )
-                while True:
-                    satisfied = self._show_large_yes_no_dialog(
-                        "Challenge Verification",
-                        "Are you satisfied after the challenge verification?\n\n"
-                        "Yes: You will vote again in this same election using a new ballot.\n"
-                        "No: Session will be paused/aborted for Presiding Officer review.",
-                        yes_text="Yes",
-                        no_text="No"
-                    )
-                    chosen_label = "SATISFIED" if satisfied else "NOT SATISFIED"
-                    confirmed = self._show_large_yes_no_dialog(
-                        "Confirm Selection",
-                        f"You selected: {chosen_label}.\n\n"
-                        "Press Yes to confirm this choice, or No to choose again.",
-                        yes_text="Yes",
-                        no_text="No"
-                    )
-                    if confirmed:
-                        break
-                if satisfied:
-                    self.restart_current_election_after_challenge()
-                else:
-                    self.show_temporarily_down_screen()
+                chosen_label = "SATISFIED" if satisfied else "NOT SATISFIED"
+                confirmed = self._show_large_yes_no_dialog(
+                    "Confirm Selection",
+                    f"You selected: {chosen_label}.\n\n"
+                    "Press Yes to confirm this choice, or No to choose again.",
+                    yes_text="Yes",
+                    no_text="No"
+                )
+                if confirmed:
+                    break
+            if satisfied:
+                self.restart_current_election_after_challenge()
             else:
-                self.close_printing_modal()
-                if self._show_custom_confirm("Printer Error", f"Printing Failed: {result}\n\nRetry?", yes_text="Retry", no_text="Cancel"):
-                    self.challenge_vote()
-            return
-        except queue.Empty:
-            elapsed = (datetime.datetime.now() - self.print_start_time).total_seconds()
-            if elapsed > 30:
-                self.close_printing_modal()
-                self._show_custom_messagebox("Timeout", "Challenge receipt print timed out.", alert_type='error')
-                return
-            self.root.after(200, self._check_challenge_print_status)
+                self.show_temporarily_down_screen()
+        else:
+            self.close_printing_modal()
+            if self._show_custom_confirm("Printer Error", f"Printing Failed: {result}\n\nRetry?", yes_text="Retry", no_text="Cancel"):
+                self.challenge_vote()
 
     def restart_current_election_after_challenge(self):
         """Load a fresh ballot and restart the same election after a successful challenge."""
@@ -2024,12 +2005,7 @@ class VotingApp:
             command=self.show_polling_officer_action_menu
         ).pack(pady=10)
 
-        self.stop_scanning = False
-        self.officer_scan_queue = queue.Queue()
-        self.officer_scan_thread = threading.Thread(target=self.officer_scan_loop)
-        self.officer_scan_thread.daemon = True
-        self.officer_scan_thread.start()
-        self.check_officer_scan_queue()
+        self._start_officer_scan()
 
     def _on_polling_officer_button_clicked(self):
         """Called when the Polling Officer button is pressed on the voter RFID screen.
@@ -2040,7 +2016,7 @@ class VotingApp:
         voters return to normal waiting without leaving the unit in a broken state.
         """
         # Pause voter scan loop
-        self.stop_scanning = True
+        self._stop_rfid_scan()
 
         # ── Officer scan overlay ──────────────────────────────────────────────
         overlay = tk.Toplevel(self.root)
@@ -2092,12 +2068,7 @@ class VotingApp:
             overlay.grab_release()
             overlay.destroy()
             # Resume normal voter scanning
-            self.stop_scanning = False
-            self.scan_queue = queue.Queue()
-            self.scan_thread = threading.Thread(target=self.rfid_scan_loop)
-            self.scan_thread.daemon = True
-            self.scan_thread.start()
-            self.check_scan_queue()
+            self._start_voter_scan()
 
         tk.Button(
             overlay,
@@ -2114,48 +2085,25 @@ class VotingApp:
             command=_cancel,
         ).pack(pady=(16, 0))
 
-        # ── Background thread: plain-mode officer card scan ───────────────────
+        # ── RFID worker: plain-mode officer card scan ─────────────────────────
         officer_q = queue.Queue()
-
-        def _officer_scan_worker():
-            # Reconnect if needed
-            if not getattr(self.rfid_service, 'connected', False):
-                try:
-                    self.rfid_service.connect()
-                except Exception:
-                    pass
-            # Poll until we get a result or a cancel signal
-            deadline = time.time() + 30  # 30-second scan window
-            while time.time() < deadline:
-                if cancelled[0]:
-                    return
-                result = self.rfid_service.read_card(mode='plain')
-                if result:
-                    officer_q.put(result)
-                    return
-                time.sleep(0.4)
-            # Timeout
-            officer_q.put(None)
-
-        scan_thread = threading.Thread(target=_officer_scan_worker, daemon=True)
-        scan_thread.start()
+        deadline = time.time() + 30  # 30-second scan window
+        self._start_rfid_scan('plain', officer_q)
 
         # ── Poll queue from the Tkinter main loop ────────────────────────────
         def _check_officer_q():
             if cancelled[0]:
                 return
             try:
+                if time.time() >= deadline:
+                    self._stop_rfid_scan()
+                    officer_q.put(None)
                 res = officer_q.get_nowait()
                 overlay.grab_release()
                 overlay.destroy()
                 if res is None:
                     # Timeout — update status and resume voter scan
-                    self.stop_scanning = False
-                    self.scan_queue = queue.Queue()
-                    self.scan_thread = threading.Thread(target=self.rfid_scan_loop)
-                    self.scan_thread.daemon = True
-                    self.scan_thread.start()
-                    self.check_scan_queue()
+                    self._start_voter_scan()
                     self._show_custom_messagebox(
                         "Timeout",
                         "No officer card detected within 30 seconds.\nReturning to voter screen.",
@@ -2179,24 +2127,6 @@ class VotingApp:
 
         self.root.after(400, _check_officer_q)
 
-    def officer_scan_loop(self):
-        while not self.stop_scanning:
-            # Reconnect automatically if RFID wasn't initialized yet.
-            if not getattr(self.rfid_service, 'connected', False):
-                try:
-                    self.rfid_service.connect()
-                except Exception:
-                    pass
-                time.sleep(0.5)
-                continue
-
-            # Admin/officer cards carry a plain-text phrase — use explicit plain mode.
-            result = self.rfid_service.read_card(mode='plain')
-            if result:
-                self.officer_scan_queue.put(result)
-                break
-            time.sleep(0.5)
-
     def check_officer_scan_queue(self):
         if self.stop_scanning:
             return
@@ -2206,11 +2136,8 @@ class VotingApp:
             if result:
                 uid, token_payload = result
                 if uid == "ERROR":
-                    # Restart the background thread, then show a message box
-                    self.stop_scanning = False
-                    import threading
-                    threading.Thread(target=self.officer_scan_loop, daemon=True).start()
-                    self.root.after(500, self.check_officer_scan_queue)
+                    # Restart the officer scan, then show a message box
+                    self._start_officer_scan()
                     
                     try:
                         self._show_custom_messagebox("Card Error", "Card Read Failed! Please try again.", alert_type="error")
@@ -2336,7 +2263,7 @@ class VotingApp:
         )
 
     def _run_end_election_without_prompt(self):
-        self.stop_scanning = True
+        self._stop_rfid_scan()
         self.show_printing_modal(text="Ending election and exporting logs...")
         threading.Thread(target=self._end_election_worker, daemon=True).start()
 
@@ -2392,41 +2319,26 @@ class VotingApp:
         token_upper = token_text.upper()
         if token_text and len(token_text) < len(self.polling_officer_phrase) and phrase_upper.startswith(token_upper):
             self._show_custom_messagebox("Incomplete Card Data", "Polling officer card data appears incomplete.\nPlease scan again or rewrite the card payload.", alert_type='error')
-            self.stop_scanning = False
-            self.officer_scan_queue = queue.Queue()
-            self.officer_scan_thread = threading.Thread(target=self.officer_scan_loop)
-            self.officer_scan_thread.daemon = True
-            self.officer_scan_thread.start()
-            self.check_officer_scan_queue()
+            self._start_officer_scan()
             return
 
         if not self._is_polling_officer_token(token_payload):
             self._show_custom_messagebox("Authorization Failed", "This card is not authorized.\nUse the configured phrase card for polling-officer access.", alert_type='error')
-            self.stop_scanning = False
-            self.officer_scan_queue = queue.Queue()
-            self.officer_scan_thread = threading.Thread(target=self.officer_scan_loop)
-            self.officer_scan_thread.daemon = True
-            self.officer_scan_thread.start()
-            self.check_officer_scan_queue()
+            self._start_officer_scan()
             return
 
-        self.stop_scanning = True
+        self._stop_rfid_scan()
         command, args = self._extract_polling_officer_command(token_payload)
         if command:
             ran = self._execute_officer_command(command, args)
             if not ran:
-                self.stop_scanning = False
-                self.officer_scan_queue = queue.Queue()
-                self.officer_scan_thread = threading.Thread(target=self.officer_scan_loop)
-                self.officer_scan_thread.daemon = True
-                self.officer_scan_thread.start()
-                self.check_officer_scan_queue()
+                self._start_officer_scan()
             return
 
         self.show_polling_officer_action_menu()
 
     def show_polling_officer_action_menu(self):
-        self.stop_scanning = True
+        self._stop_rfid_scan()
         self.show_admin_menu()
 
     def _on_key_press(self, event):
@@ -2622,12 +2534,12 @@ class VotingApp:
 
             if not hasattr(self, 'printer_service') or not self.printer_service:
                 from printer_service import PrinterService
-                self.printer_service = PrinterService(self.data_handler)
+                self.printer_service = PrinterService(self.data_handler, state_dir=self._printer_state_dir())
+                self.print_spooler.printer_service = self.printer_service
 
-            if not self.printer_service.is_printer_connected():
-                raise Exception("Printer not connected")
-
-            self.printer_service.print_provisioning_ticket(bmd_id, public_key_pem, machine_id)
+            self.print_spooler.submit(
+                "provision", bmd_id=bmd_id, public_key_pem=public_key_pem, machine_id=machine_id
+            ).future.result()
             self.root.after(0, self._admin_reprint_device_slip_done)
         except Exception as e:
             self.root.after(0, lambda err=str(e): self._admin_reprint_device_slip_failed(err))
@@ -2742,16 +2654,55 @@ class VotingApp:
             bmd_id = "UNKNOWN"
             provisioned_at = ""
 
-        if hasattr(self, 'printer_service') and self.printer_service and self.printer_service.is_printer_connected():
-            printer_status = "Connected"
+        connected = self._probe_printer(wait=2.0)
+        if connected:
+            last_status = self.printer_service.last_status
+            printer_status = f"Connected ({last_status['state']})" if last_status else "Connected"
+        elif connected is None:
+            printer_status = "Busy printing"
         else:
             printer_status = "Not connected"
 
+        try:
+            from key_service import get_key_service
+            key_status = get_key_service().metrics_text()
+        except Exception as e:
+            key_status = f"Error: {e}"
+
+        try:
+            card_status = self.rfid_service.read_latency.text().replace("\n", "\n" + " " * 16)
+        except Exception as e:
+            card_status = f"Error: {e}"
+
+        try:
+            stage_status = self.rfid_service.read_stages.text().replace("\n", "\n" + " " * 16)
+            log_dir = getattr(self, 'log_dir', None)
+            if log_dir and os.path.isdir(log_dir):
+                from rfid_service import STAGE_LOG_FILENAME
+                saved = self.rfid_service.read_stages.dump(os.path.join(log_dir, STAGE_LOG_FILENAME))
+                if saved is None:
+                    stage_status += f"\n{' ' * 16}(dump still in progress: {STAGE_LOG_FILENAME})"
+                else:
+                    stage_status += f"\n{' ' * 16}({saved} saved to {STAGE_LOG_FILENAME})"
+        except Exception as e:
+            stage_status = f"Error: {e}"
+
+        shadow = getattr(self, 'shadow_exporter', None)
+        shadow_status = shadow.status_text() if shadow is not None else "off (full export at close)"
+
         msg = (
             f"BMD ID        : {bmd_id}"
             + (f"  (provisioned {provisioned_at})" if provisioned_at else "") + "\n"
             + f"HW Binding    : {hw_status}\n"
+            + f"Key Unlock    : {key_status}\n"
+            + f"Shadow Export : {shadow_status}\n"
+            + f"Device Health : {get_device_health().status_text()}\n"
+            + f"Card Detect   : {getattr(self.rfid_service, 'detect_mode', 'N/A')} "
+            + f"(worker: {self.rfid_worker.status_text()})\n"
+            + f"Card Reads    : {card_status}\n"
+            + f"Card Stages   : {stage_status}\n"
             + f"Printer       : {printer_status}\n"
+            + f"Print Spool   : {self.print_spooler.status_text()}\n"
             + f"Print Mode    : {'ON' if self.print_enabled else 'OFF'}\n"
             + f"Election Time : {self._current_schedule_text()}\n"
             + f"Log Dir       : {getattr(self, 'log_dir', 'N/A')}\n"
@@ -3542,6 +3493,7 @@ class VotingApp:
             "WARNING: This will permanently delete:\n\n"
             "  - private.pem (signing key)\n"
             "  - public.pem (public key)\n"
+            "  - card_x25519.pem / card_x25519_pub.pem (voter card key)\n"
             "  - bmd_config.json\n"
             "  - .provisioned flag\n\n"
             "The device will restart into the first provisioning menu.\n"
@@ -3564,6 +3516,8 @@ class VotingApp:
         to_delete = [
             os.path.join(project_dir, "private.pem"),
             os.path.join(project_dir, "public.pem"),
+            os.path.join(project_dir, "card_x25519.pem"),
+            os.path.join(project_dir, "card_x25519_pub.pem"),
             os.path.join(project_dir, "bmd_config.json"),
         ]
 
@@ -3583,6 +3537,94 @@ class VotingApp:
         self.root.destroy()
         os.execv(sys.executable, [sys.executable] + sys.argv)
 
+    def _on_print_event(self, event, job, payload):
+        # Runs on the spooler thread; _pump_print_events hands it to the GUI thread.
+        self._print_events.put((event, job, payload))
+
+    def _pump_print_events(self):
+        # Reschedule first: handlers may open modal dialogs that run a nested loop.
+        self.root.after(100, self._pump_print_events)
+        while True:
+            try:
+                event, job, payload = self._print_events.get_nowait()
+            except queue.Empty:
+                return
+            if event == "retrying":
+                print(f"[print] Retrying {job.kind} job after: {payload}")
+            elif event in ("done", "failed"):
+                handler = self._print_handlers.pop(job.job_id, None)
+                if handler:
+                    try:
+                        handler(payload)
+                    except Exception as e:
+                        print(f"[print] Result handler for {job.kind} failed: {e}")
+
+    def _submit_print(self, kind, on_result=None, **args):
+        """Queue a print job; on_result(result or exception) runs on the GUI thread."""
+        try:
+            job = self.print_spooler.submit(kind, **args)
+        except Exception as e:
+            if on_result:
+                on_result(e)
+            return None
+        if on_result:
+            self._print_handlers[job.job_id] = on_result
+        return job
+
+    def _probe_printer(self, wait):
+        """Ask the spooler thread whether the printer is there: True, False, or None if it is busy past wait seconds."""
+        try:
+            return self.print_spooler.submit("probe").future.result(timeout=wait)
+        except (PrintSpoolerBusy, TimeoutError):
+            return None
+        except Exception as e:
+            print(f"[print] Printer probe failed: {e}")
+            return False
+
+    def _printer_state_dir(self):
+        log_dir = getattr(self, 'log_dir', None)
+        return log_dir if log_dir and os.path.isdir(log_dir) else None
+
+    def _offer_recovered_print_jobs(self):
+        """Jobs spooled before a crash: tickets are reprinted or discarded, lost slips are reported."""
+        jobs = list(self.print_spooler.recovered)
+        if not jobs:
+            return
+        lost = [job for job in jobs if not job.reprintable]
+        tickets = [job for job in jobs if job.reprintable]
+        if lost:
+            details = "\n".join(
+                f"- {job.kind.upper()} slip, election {job.election_id or 'unknown'}, "
+                f"{datetime.datetime.fromtimestamp(job.created).strftime('%d-%m-%y %H:%M:%S')}"
+                for job in lost
+            )
+            self._show_custom_messagebox(
+                "Interrupted Print Jobs",
+                f"{len(lost)} slip(s) may not have printed before the last restart:\n\n{details}\n\n"
+                "Check the VVPAT box and record this in the polling log.",
+                alert_type="error"
+            )
+            for job in lost:
+                self.print_spooler.discard(job)
+        if not tickets:
+            return
+        kinds = ", ".join(job.kind for job in tickets)
+        if self._show_custom_confirm(
+            "Interrupted Print Jobs",
+            f"{len(tickets)} ticket(s) did not finish before the last restart ({kinds}).\n\n"
+            "Reprint them now?",
+            yes_text="Reprint",
+            no_text="Discard"
+        ):
+            for job in tickets:
+                try:
+                    self.print_spooler.resubmit(job)
+                except Exception as e:
+                    print(f"[print] Could not requeue {job}: {e}")
+        else:
+            for job in tickets:
+                self.print_spooler.discard(job)
+
     def show_printing_modal(self, text="Printing VVPAT..."):
         self.printing_overlay = tk.Toplevel(self.root)
         self.printing_overlay.title("Processing")
@@ -3610,77 +3652,63 @@ class VotingApp:
             self.printing_overlay.destroy()
             self.printing_overlay = None
 
-    def check_print_status(self):
-        try:
-            result = self.print_queue.get_nowait()
-            
-            if isinstance(result, dict) and result.get('stage') == 'vvpat_complete':
-                self.close_printing_modal()
-                self._show_vvpat_confirmation_modal(
-                    "",
-                    self._start_receipt_stage_for_vote,
-                )
-                return
+    def _on_vote_print_result(self, result):
+        if isinstance(result, dict) and result.get('stage') == 'vvpat_complete':
             self.close_printing_modal()
-            if result is True:
-                # Save vote
-                try:
-                    # Defer saving if merging
-                    if not self.merge_receipts:
-                        vote_data = {'selections': self.selections}
-                        self.data_handler.save_vote(
-                            vote_data, 
-                            self.voting_mode,
-                            getattr(self, 'current_voter_id', 'UNKNOWN'),
-                            getattr(self, 'current_booth', 1),
-                            getattr(self, 'current_token_id', 'UNKNOWN')
-                        )
-                    
-                    # Mark ballot as used for this election (ALWAYS MARK USED TO PREVENT REUSE)
-                    # Wait, if print fails at the end, we might have an issue. 
-                    # But for now, we must mark it used so it's not given again during the session?
-                    # No, the buffer holds it. 
-                    # Actually, if we mark it used now, and the final print fails, we can't rollback easily.
-                    # But preventing reuse is critical.
-                    # Let's Mark USed now. The risk is a wasted ballot on print fail. Acceptable.
-                    self.ballot_manager.mark_as_used(self.data_handler.ballot_file_id, self.current_election_id)
-                    self.data_handler.store_used_ballot_snapshot(
-                        election_id=self.current_election_id,
-                        ballot_file_id=self.data_handler.ballot_file_id,
-                        status="USED"
+            self._show_vvpat_confirmation_modal(
+                "",
+                self._start_receipt_stage_for_vote,
+            )
+            return
+        self.close_printing_modal()
+        if result is True:
+            # Save vote
+            try:
+                # Defer saving if merging
+                if not self.merge_receipts:
+                    vote_data = {'selections': self.selections}
+                    self.data_handler.save_vote(
+                        vote_data, 
+                        self.voting_mode,
+                        getattr(self, 'current_voter_id', 'UNKNOWN'),
+                        getattr(self, 'current_booth', 1),
+                        getattr(self, 'current_token_id', 'UNKNOWN')
                     )
-                    
-                    if not self.merge_receipts:
-                        self._show_custom_messagebox("Vote Cast", "Your vote has been verified and recorded successfully!")
+                
+                # Mark ballot as used for this election (ALWAYS MARK USED TO PREVENT REUSE)
+                # Wait, if print fails at the end, we might have an issue. 
+                # But for now, we must mark it used so it's not given again during the session?
+                # No, the buffer holds it. 
+                # Actually, if we mark it used now, and the final print fails, we can't rollback easily.
+                # But preventing reuse is critical.
+                # Let's Mark USed now. The risk is a wasted ballot on print fail. Acceptable.
+                self.ballot_manager.mark_as_used(self.data_handler.ballot_file_id, self.current_election_id)
+                self.data_handler.store_used_ballot_snapshot(
+                    election_id=self.current_election_id,
+                    ballot_file_id=self.data_handler.ballot_file_id,
+                    status="USED"
+                )
+                
+                if not self.merge_receipts:
+                    self._show_custom_messagebox("Vote Cast", "Your vote has been verified and recorded successfully!")
 
-                    self.pending_print_job = None
-                    self._cancel_pending_print_polling()
-                    self._cast_vote_in_progress = False
-                    
-                    # Proceed to Next Election in Queue (or Finish)
-                    self.start_next_election()
-                    
-                except Exception as e:
-                    self._cast_vote_in_progress = False
-                    self._show_custom_messagebox("System Error", f"Vote recorded but processing failed: {e}", alert_type="error")
-            else:
+                self.pending_print_job = None
                 self._cast_vote_in_progress = False
-                print(f"Async print error: {result}")
-                if self._show_custom_confirm("Printer Error", f"Printing Failed: {result}\n\nRetry?", yes_text="Retry", no_text="Cancel"):
-                    self.cast_vote()
-            return
-        except queue.Empty:
-            pass
-
-        elapsed = (datetime.datetime.now() - self.print_start_time).total_seconds()
-        if elapsed > 20:
+                
+                # Proceed to Next Election in Queue (or Finish)
+                self.start_next_election()
+                
+            except Exception as e:
+                self._cast_vote_in_progress = False
+                self._show_custom_messagebox("System Error", f"Vote recorded but processing failed: {e}", alert_type="error")
+        else:
             self._cast_vote_in_progress = False
-            self.close_printing_modal()
-            if self._show_custom_confirm("Printer Timeout", "Printer is taking too long.\n\nRetry?", yes_text="Retry", no_text="Cancel"):
+            print(f"Async print error: {result}")
+            if self._show_custom_confirm("Printer Error", f"Printing Failed: {result}\n\nRetry?", yes_text="Retry", no_text="Cancel"):
                 self.cast_vote()
-            return
-
-        self.print_status_after_id = self.root.after(500, self.check_print_status)
 
     def exit_app(self, event=None):
+        self.rfid_worker.stop()
+        self.print_spooler.stop()
+        get_device_health().stop()
         self.root.quit()
@@ -38,6 +38,8 @@ import hashlib
 import os
 import base64
 import subprocess
+import threading
+import time
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -182,22 +184,20 @@ def _read_or_create_fallback_seed() -> str:
 
 
 # ──────────────────────────────────────────────────────────────────────────────
-# Public API
+# Per-process identity cache
 # ──────────────────────────────────────────────────────────────────────────────
 
-def get_machine_id() -> str:
-    """
-    Return the best available hardware-bound identity string for this device.
+# Identity sources are read once per process.  vcgencmd / dmidecode spawns cost
+# hundreds of milliseconds on a Pi and the answer cannot change while running.
+_IDENTITY_CACHE: dict | None = None
+_IDENTITY_LOCK = threading.Lock()
 
-    Priority order (highest = most clone-resistant):
-      1. RPi OTP fuse dump via vcgencmd   ← silicon-level, cannot be cloned
-      2. RPi /proc/cpuinfo CPU serial     ← silicon-level (Pi 3/4)
-      3. DMI product UUID via dmidecode   ← firmware SRAM (x86)
-      4. Filesystem fallback seed         ← ⚠️  NOT clone-resistant (dev only)
 
-    The returned string is used exclusively as input to get_hardware_passphrase()
-    and is never stored or transmitted.
-    """
+def _source_of(machine_id: str) -> str:
+    return machine_id.split("_", 1)[0] if "_" in machine_id else "UNKNOWN"
+
+
+def _read_machine_id() -> str:
     if platform.system() == "Linux":
         # --- Tier 1: RPi OTP (best) ---
         otp = _read_rpi_otp()
@@ -227,6 +227,76 @@ def get_machine_id() -> str:
     return _read_or_create_fallback_seed()
 
 
+def _load_identity(refresh: bool = False) -> dict:
+    global _IDENTITY_CACHE
+    with _IDENTITY_LOCK:
+        if _IDENTITY_CACHE is not None and not refresh:
+            return _IDENTITY_CACHE
+
+        start = time.perf_counter()
+        machine_id = _read_machine_id()
+        elapsed = time.perf_counter() - start
+
+        raw_identity = f"EVM_SECURE_V3_{machine_id}"
+        digest = hashlib.sha256(raw_identity.encode("utf-8")).digest()
+
+        _IDENTITY_CACHE = {
+            "machine_id": machine_id,
+            "source": _source_of(machine_id),
+            "read_seconds": elapsed,
+            "passphrase": base64.urlsafe_b64encode(digest)[:32],
+        }
+        return _IDENTITY_CACHE
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────────────────────────────────────
+
+def refresh_hardware_identity() -> dict:
+    """
+    Discard the cached identity and re-read the hardware sources.
+
+    Only needed when the identity sources may have changed under a running
+    process (e.g. a secure element was attached).  Returns get_identity_info().
+    """
+    _load_identity(refresh=True)
+    return get_identity_info()
+
+
+def get_identity_info() -> dict:
+    """
+    Return which identity source is in use and how long reading it took.
+
+    Keys: source ("OTP", "CPUSERIAL", "DMI" or "FALLBACK"), read_seconds.
+    The machine ID itself is deliberately not included.
+    """
+    identity = _load_identity()
+    return {
+        "source": identity["source"],
+        "read_seconds": identity["read_seconds"],
+    }
+
+
+def get_machine_id() -> str:
+    """
+    Return the best available hardware-bound identity string for this device.
+
+    Priority order (highest = most clone-resistant):
+      1. RPi OTP fuse dump via vcgencmd   ← silicon-level, cannot be cloned
+      2. RPi /proc/cpuinfo CPU serial     ← silicon-level (Pi 3/4)
+      3. DMI product UUID via dmidecode   ← firmware SRAM (x86)
+      4. Filesystem fallback seed         ← ⚠️  NOT clone-resistant (dev only)
+
+    The sources are read once per process and cached in memory; call
+    refresh_hardware_identity() to force a re-read.
+
+    The returned string is used exclusively as input to get_hardware_passphrase()
+    and is never stored or transmitted.
+    """
+    return _load_identity()["machine_id"]
+
+
 def get_hardware_passphrase() -> bytes:
     """
     Derive a deterministic 32-byte passphrase from the physical device's
@@ -240,22 +310,20 @@ def get_hardware_passphrase() -> bytes:
     this version are NOT compatible with keys generated by the old V2 code
     (which used /etc/machine-id).  Re-run generate_rpi_keys.py after updating.
     """
-    machine_id = get_machine_id()
-    raw_identity = f"EVM_SECURE_V3_{machine_id}"
-    digest = hashlib.sha256(raw_identity.encode("utf-8")).digest()
-    passphrase = base64.urlsafe_b64encode(digest)[:32]
-    return passphrase
+    return _load_identity()["passphrase"]
 
 
 def get_mac_address():
-    """Legacy wrapper — do not use for new code."""
+    """Legacy wrapper — do not use for new code.  Served from the identity cache."""
     return get_machine_id()
 
 
 if __name__ == "__main__":
     mid = get_machine_id()
     pp = get_hardware_passphrase().decode("utf-8")
+    info = get_identity_info()
     print(f"Machine ID source : {mid[:60]}{'...' if len(mid) > 60 else ''}")
+    print(f"Identity read in  : {info['read_seconds'] * 1000:.0f} ms ({info['source']})")
     print(f"Derived passphrase: {pp}")
     if mid.startswith("OTP_"):
         print("✅  Bound to RPi OTP silicon fuses — SD clone-resistant.")
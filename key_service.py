@@ -0,0 +1,121 @@
+"""
+key_service.py  ─  Process-wide holder for the hardware-bound private key.
+
+private.pem is encrypted with a passphrase derived from the device silicon
+(see hardware_crypto.py).  Unlocking it means re-deriving that passphrase and
+running the PEM KDF, which is slow on a Raspberry Pi.  Historically the RFID
+reader, the USB ballot importer, the export service and the RSA ballot
+fallback each unlocked their own copy.
+
+KeyService unlocks each key file once per process and hands every caller the
+same key object.  Unlock cost is recorded so it can be shown on the System
+Status screen and in the application log.
+
+Usage:
+    from key_service import get_key_service
+    private_key = get_key_service().get_private_key("private.pem")
+"""
+
+import os
+import threading
+import time
+
+try:
+    from cryptography.hazmat.primitives import serialization
+    import hardware_crypto
+except ImportError:
+    pass
+
+
+class KeyService:
+    def __init__(self):
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "unlock_count": 0,
+            "unlock_failures": 0,
+            "cache_hits": 0,
+            "last_unlock_seconds": None,
+            "total_unlock_seconds": 0.0,
+        }
+
+    def _resolve_path(self, key_path):
+        return os.path.realpath(os.path.abspath(key_path))
+
+    def get_private_key(self, key_path="private.pem"):
+        """Return the unlocked private key for key_path, unlocking it on first use.
+
+        Raises FileNotFoundError if the key file is missing and re-raises the
+        underlying error if the hardware passphrase does not unlock it.
+        """
+        resolved = self._resolve_path(key_path)
+
+        with self._lock:
+            cached = self._keys.get(resolved)
+            if cached is not None:
+                self._metrics["cache_hits"] += 1
+                return cached
+
+            if not os.path.exists(resolved):
+                raise FileNotFoundError(f"Private key not found at {resolved}")
+
+            start = time.perf_counter()
+            try:
+                passphrase = hardware_crypto.get_hardware_passphrase()
+                with open(resolved, "rb") as kf:
+                    private_key = serialization.load_pem_private_key(
+                        kf.read(),
+                        password=passphrase if isinstance(passphrase, bytes) else passphrase.encode("utf-8")
+                    )
+            except Exception:
+                self._metrics["unlock_failures"] += 1
+                raise
+
+            elapsed = time.perf_counter() - start
+            self._keys[resolved] = private_key
+            self._metrics["unlock_count"] += 1
+            self._metrics["last_unlock_seconds"] = elapsed
+            self._metrics["total_unlock_seconds"] += elapsed
+            print(f"[keys] Unlocked {os.path.basename(resolved)} in {elapsed * 1000:.0f} ms")
+            return private_key
+
+    def is_unlocked(self, key_path="private.pem"):
+        with self._lock:
+            return self._resolve_path(key_path) in self._keys
+
+    def invalidate(self, key_path=None):
+        """Drop cached keys (all of them, or just key_path), e.g. after re-provisioning."""
+        with self._lock:
+            if key_path is None:
+                self._keys.clear()
+            else:
+                self._keys.pop(self._resolve_path(key_path), None)
+
+    def metrics(self):
+        """Return a snapshot of unlock counters and timings."""
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot["keys_loaded"] = len(self._keys)
+        return snapshot
+
+    def metrics_text(self):
+        m = self.metrics()
+        if m["last_unlock_seconds"] is None:
+            return f"not unlocked (failures: {m['unlock_failures']})"
+        return (
+            f"{m['unlock_count']} unlock(s), last {m['last_unlock_seconds'] * 1000:.0f} ms, "
+            f"{m['cache_hits']} cache hit(s)"
+        )
+
+
+_KEY_SERVICE = None
+_KEY_SERVICE_LOCK = threading.Lock()
+
+
+def get_key_service():
+    """Return the process-wide KeyService instance."""
+    global _KEY_SERVICE
+    with _KEY_SERVICE_LOCK:
+        if _KEY_SERVICE is None:
+            _KEY_SERVICE = KeyService()
+        return _KEY_SERVICE
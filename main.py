@@ -10,6 +10,7 @@ import shutil
 import time
 
 from rfid_service import RFIDService
+from rfid_daemon import DAEMON_MODE, RFIDClient
 from rtc_ds3231 import sync_system_time_from_rtc
 
 PROVISIONED_FILENAME = ".provisioned"
@@ -205,6 +206,18 @@ def main():
     log_dir_early, _ = _find_log_dir(wait_seconds=8)
     _setup_logging(log_dir_early)
 
+    # Read the hardware identity once up front; every later passphrase / MAC
+    # lookup is served from the in-process cache.
+    try:
+        import hardware_crypto
+        identity = hardware_crypto.get_identity_info()
+        print(
+            f"[main] Hardware identity source: {identity['source']} "
+            f"(read in {identity['read_seconds'] * 1000:.0f} ms)"
+        )
+    except Exception as exc:
+        print(f"[main] Hardware identity unavailable: {exc}")
+
     root = tk.Tk()
 
     log_dir, log_err = _find_log_dir(wait_seconds=2)
@@ -233,7 +246,13 @@ def main():
 
     # Core Services
     bm           = BallotManager(db_path=db_path)
-    rfid_service = RFIDService()
+    if DAEMON_MODE in ("spawn", "connect"):
+        # Reader and card decryption run in rfid_daemon.py; the client stands in
+        # for both RFIDService and RFIDWorker inside the GUI process.
+        rfid_service = RFIDClient(spawn=(DAEMON_MODE == "spawn"))
+        print(f"[main] RFID via daemon ({DAEMON_MODE})")
+    else:
+        rfid_service = RFIDService()
 
     # DataHandler and PrinterService are initialised AFTER USB ballot import.
     VotingApp(root, None, None, bm, rfid_service, db_path, votes_log, tokens_log, log_dir)
@@ -0,0 +1,435 @@
+"""
+print_spooler.py  ─  Single thread that owns the receipt printer.
+
+The GUI used to start a new thread per print (cast vote, batch VVPAT,
+challenge receipt, tickets), each reporting through its own queue.Queue
+polled every 500 ms, and a retry after a timeout could open the printer
+while the previous attempt was still writing to it.  PrintSpooler runs one
+thread instead and takes typed jobs:
+
+    vvpat      print_vote(mode, selections, context)   one VVPAT slip
+    batch      print_session_receipts(receipts)        consolidated VVPAT strip
+    challenge  print_challenge_receipt(...)
+    startup    print_startup_ticket(genesis_hash, log_dir)
+    end        print_end_election_ticket(final_hash, export_path)
+    provision  print_provisioning_ticket(bmd_id, public_key_pem, machine_id)
+    cut        feed_and_cut()
+    probe      is_printer_connected()                  True/False; prints nothing
+
+Every pending job is recorded in spool_dir (one JSON file, fsynced) before
+it is queued and removed once it has printed or failed for good, so a crash
+never silently loses a slip.  Ticket jobs (REPRINTABLE_KINDS) keep their
+arguments and can be printed again.  For VVPAT and challenge jobs only the
+job id, kind, election id and time are written: their arguments hold the
+voter's choice next to the ballot id, which must not leave the encrypted
+vote store.  Jobs left over from a crash are not printed again
+automatically; they are listed in .recovered for the Presiding Officer to
+reprint (tickets) or acknowledge as a lost slip.  Discarded spool files are
+deleted.
+
+A failed attempt reconnects the printer and retries, up to max_attempts.
+Printer conditions (paper out, cover open) fail at once instead: retrying
+cannot help until someone attends to the printer.  VVPAT jobs (vvpat,
+batch) are only retried while nothing has reached the printer; after a
+partial slip the failure goes straight to the officer, who decides on a
+reprint.  A watchdog fails any job that runs longer than its JOB_TIMEOUTS
+entry (an escpos USB write never times out on its own); until the stuck
+attempt returns, submit() refuses new jobs with PrintSpoolerBusy.
+
+Events are published to every subscriber as callback(event, job, payload)
+on the spooler thread; event is one of queued, started, retrying (payload:
+the error), done (payload: the print result) or failed (payload: the error).
+
+Usage:
+    spooler = PrintSpooler(printer_service, spool_dir=os.path.join(log_dir, "print_spool"))
+    spooler.subscribe(lambda event, job, payload: events.put((event, job, payload)))
+    spooler.start()
+    job = spooler.submit("challenge", ballot_id=..., sel_str=..., voter_qr_data=...)
+    job.future.result()
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from printer_status import PrinterStatusError
+
+JOB_KINDS = ("vvpat", "batch", "challenge", "startup", "end", "provision", "cut", "probe")
+
+# Not persisted: nothing is lost if a crash drops them.
+TRANSIENT_KINDS = ("cut", "probe")
+
+# Persisted with their arguments; all other kinds only as a lost-slip record.
+REPRINTABLE_KINDS = ("startup", "end", "provision")
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 1.0
+
+# Never re-sent automatically once any byte reached the printer: a second
+# slip for the same vote would land in the VVPAT box.
+NO_REPRINT_KINDS = ("vvpat", "batch")
+
+# Seconds a job may run (retries included) before it fails as PrintTimeout.
+JOB_TIMEOUTS = {
+    "vvpat": 20,
+    "batch": 60,
+    "challenge": 30,
+    "startup": 60,
+    "end": 60,
+    "provision": 60,
+    "cut": 30,
+    "probe": 30,
+}
+
+# Jobs queued or printing before submit() refuses new ones.
+MAX_PENDING = 8
+
+
+class PrintSpoolerBusy(Exception):
+    pass
+
+
+class PrintTimeout(Exception):
+    pass
+
+
+class PrintJob:
+    def __init__(self, kind, args, job_id=None, created=None, election_id=None):
+        self.kind = kind
+        self.args = args   # None for a recovered job that cannot be reprinted
+        self.election_id = election_id
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.created = created or time.time()
+        self.attempts = 0
+        self.returned = False   # the spooler thread is done with it
+        self.future = Future()
+
+    @property
+    def reprintable(self):
+        return self.kind in REPRINTABLE_KINDS and self.args is not None
+
+    def to_json(self):
+        data = {"job_id": self.job_id, "kind": self.kind, "created": self.created, "election_id": self.election_id}
+        if self.kind in REPRINTABLE_KINDS:
+            data["args"] = self.args
+        return data
+
+    @classmethod
+    def from_json(cls, data):
+        kind = data["kind"]
+        # Older spool files carried VVPAT arguments too; never load those.
+        args = data.get("args") if kind in REPRINTABLE_KINDS else None
+        return cls(kind, args, job_id=data["job_id"], created=data.get("created"), election_id=data.get("election_id"))
+
+    def __repr__(self):
+        return f"PrintJob({self.kind}, {self.job_id})"
+
+
+class PrintSpooler:
+    def __init__(self, printer_service, spool_dir=None, max_attempts=MAX_ATTEMPTS,
+                 retry_delay=RETRY_DELAY, max_pending=MAX_PENDING, job_timeouts=None):
+        # Reassigned by the GUI when it creates a new PrinterService.
+        self.printer_service = printer_service
+        self.spool_dir = spool_dir
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_pending = max_pending
+        self.job_timeouts = dict(JOB_TIMEOUTS if job_timeouts is None else job_timeouts)
+
+        self._jobs = queue.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._finish_lock = threading.RLock()
+        self._stalled = None   # job whose attempt outlived its watchdog
+
+        self.recovered = self._load_spooled_jobs()
+        self.stats = {"done": 0, "failed": 0, "retries": 0}
+
+    # ------------------------------------------------------------------
+    # Public API (any thread)
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="print-spooler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        self._jobs.put(None)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def subscribe(self, callback):
+        """callback(event, job, payload) is called on the spooler thread for every job event."""
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def submit(self, kind, **args):
+        """Queue a print job; raises PrintSpoolerBusy when max_pending jobs are already waiting."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown print job kind {kind!r}")
+        if kind == "vvpat" and args.get("context") is None:
+            # Capture the ballot now: by the time the job runs (or is recovered
+            # after a restart) the live ballot may have moved on.
+            args["context"] = self.printer_service._build_vote_print_context(args["mode"], args["selections"])
+        data_handler = getattr(self.printer_service, "data_handler", None)
+        election_id = getattr(data_handler, "election_id", None) or None
+        return self._enqueue(PrintJob(kind, args, election_id=election_id))
+
+    def resubmit(self, job):
+        """Queue a recovered ticket job again."""
+        if not job.reprintable:
+            raise ValueError(f"{job} was not spooled with its arguments and cannot be reprinted")
+        if job in self.recovered:
+            self.recovered.remove(job)
+        return self._enqueue(job)
+
+    def discard(self, job):
+        """Drop a recovered job and delete its spool file."""
+        if job in self.recovered:
+            self.recovered.remove(job)
+        self._forget(job)
+
+    def pending_count(self):
+        with self._pending_lock:
+            return len(self._pending)
+
+    def status_text(self):
+        state = "running" if self._thread and self._thread.is_alive() else "stopped"
+        if self._stalled is not None:
+            state = f"stalled on {self._stalled.kind}"
+        return (
+            f"{state}, {self.pending_count()} pending, {self.stats['done']} done, "
+            f"{self.stats['failed']} failed, {self.stats['retries']} retried, "
+            f"{len(self.recovered)} recovered"
+        )
+
+    # ------------------------------------------------------------------
+    # Spool files
+    # ------------------------------------------------------------------
+
+    def _job_path(self, job):
+        if not self.spool_dir:
+            return None
+        return os.path.join(self.spool_dir, f"{job.job_id}.json")
+
+    def _persist(self, job):
+        path = self._job_path(job)
+        if not path or job.kind in TRANSIENT_KINDS:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job.to_json(), f, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _forget(self, job):
+        with self._pending_lock:
+            self._pending.pop(job.job_id, None)
+        path = self._job_path(job)
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[print] Could not remove spool file {path}: {e}")
+
+    def _purge_discarded(self):
+        # Earlier versions archived discarded jobs, VVPAT choices included.
+        discarded_dir = os.path.join(self.spool_dir, "discarded")
+        if not os.path.isdir(discarded_dir):
+            return
+        for name in os.listdir(discarded_dir):
+            try:
+                os.remove(os.path.join(discarded_dir, name))
+            except OSError as e:
+                print(f"[print] Could not remove {name} from {discarded_dir}: {e}")
+        try:
+            os.rmdir(discarded_dir)
+        except OSError:
+            pass
+
+    def _load_spooled_jobs(self):
+        if not self.spool_dir or not os.path.isdir(self.spool_dir):
+            return []
+        self._purge_discarded()
+        jobs = []
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    jobs.append(PrintJob.from_json(json.load(f)))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[print] Skipping unreadable spool file {path}: {e}")
+        jobs.sort(key=lambda job: job.created)
+        if jobs:
+            print(f"[print] {len(jobs)} print job(s) interrupted by a restart: {jobs}")
+        return jobs
+
+    # ------------------------------------------------------------------
+    # Spooler thread
+    # ------------------------------------------------------------------
+
+    def _enqueue(self, job):
+        if self._stalled is not None:
+            raise PrintSpoolerBusy("Printer is not responding; the previous print has not finished")
+        with self._pending_lock:
+            if len(self._pending) >= self.max_pending:
+                raise PrintSpoolerBusy(f"{len(self._pending)} print jobs already waiting")
+            self._pending[job.job_id] = job
+        try:
+            self._persist(job)
+        except OSError as e:
+            # Still print; the job just will not survive a crash.
+            print(f"[print] Could not spool {job}: {e}")
+        self._jobs.put(job)
+        self._publish("queued", job)
+        return job
+
+    def _publish(self, event, job, payload=None):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event, job, payload)
+            except Exception as e:
+                print(f"[print] Subscriber failed: {e}")
+
+    def _dispatch(self, job):
+        ps = self.printer_service
+        if ps is None:
+            raise Exception("Printer service not initialised")
+        a = job.args
+        if job.kind == "vvpat":
+            # JSON turns the rank keys into strings; print_vote sorts and looks them up as ints.
+            selections = {int(rank): cid for rank, cid in a["selections"].items()}
+            return ps.print_vote(a["mode"], selections, is_final=True, stage="vvpat", context=a["context"])
+        if job.kind == "batch":
+            return ps.print_session_receipts(a["receipts"], stage="vvpat")
+        if job.kind == "challenge":
+            return ps.print_challenge_receipt(a["ballot_id"], a["sel_str"], a["voter_qr_data"])
+        if job.kind == "startup":
+            return ps.print_startup_ticket(a["genesis_hash"], a["log_dir"])
+        if job.kind == "end":
+            return ps.print_end_election_ticket(a["final_hash"], a["export_path"])
+        if job.kind == "provision":
+            return ps.print_provisioning_ticket(a["bmd_id"], a["public_key_pem"], a.get("machine_id", "UNKNOWN"))
+        if job.kind == "probe":
+            # Connecting opens the device, so only the spooler thread may do it.
+            return ps.is_printer_connected()
+        return ps.feed_and_cut()
+
+    def _finish(self, job, result=None, error=None):
+        """Resolve job exactly once; False if the watchdog already failed it."""
+        with self._finish_lock:
+            if job.future.done():
+                return False
+            self._forget(job)
+            if error is None:
+                self.stats["done"] += 1
+                job.future.set_result(result)
+            else:
+                self.stats["failed"] += 1
+                job.future.set_exception(error)
+        if error is None:
+            self._publish("done", job, result)
+        else:
+            self._publish("failed", job, error)
+        return True
+
+    def _job_timed_out(self, job, timeout):
+        with self._finish_lock:
+            if job.returned:
+                return
+            self._stalled = job
+            failed = self._finish(job, error=PrintTimeout(f"Printer is taking too long ({timeout:.0f} s)"))
+        if failed:
+            print(f"[print] {job} timed out after {timeout:.0f} s")
+
+    def _bytes_sent(self):
+        return getattr(self.printer_service, "bytes_sent", 0)
+
+    def _attempt(self, job):
+        """Run job until it prints or fails for good; returns (result, error)."""
+        error = None
+        while job.attempts < self.max_attempts and not job.future.done():
+            job.attempts += 1
+            sent_before = self._bytes_sent()
+            try:
+                return self._dispatch(job), None
+            except PrinterStatusError as e:
+                return None, e
+            except Exception as e:
+                error = e
+                if job.kind in NO_REPRINT_KINDS and self._bytes_sent() != sent_before:
+                    # Part of the slip may be in the box; the officer decides.
+                    return None, e
+                if job.attempts >= self.max_attempts:
+                    break
+                self.stats["retries"] += 1
+                print(f"[print] {job} attempt {job.attempts} failed: {e}; reconnecting")
+                self._publish("retrying", job, e)
+                time.sleep(self.retry_delay)
+                try:
+                    self.printer_service.connect_printer()
+                except Exception as reconnect_error:
+                    print(f"[print] Reconnect failed: {reconnect_error}")
+        return None, error
+
+    def _run_job(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            self._forget(job)
+            return
+        self._publish("started", job)
+
+        watchdog = None
+        timeout = self.job_timeouts.get(job.kind)
+        if timeout:
+            watchdog = threading.Timer(timeout, self._job_timed_out, args=(job, timeout))
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            result, error = self._attempt(job)
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            with self._finish_lock:
+                job.returned = True
+                self._stalled = None
+
+        if not self._finish(job, result, error):
+            outcome = "printed" if error is None else f"failed ({error})"
+            print(f"[print] {job} {outcome} after its watchdog had already failed it")
+
+    def _run(self):
+        while self._running:
+            job = self._jobs.get()
+            if job is None:
+                continue
+            try:
+                self._run_job(job)
+            except Exception as e:
+                print(f"[print] {job} crashed the spooler loop: {e}")
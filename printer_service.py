@@ -1,30 +1,101 @@
 import os
-import uuid
 import datetime
+import functools
 import time
-import shutil
-import subprocess
 import json
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
 
+from device_health import get_device_health
+from printer_status import FAILED_STATES, UNKNOWN, PrinterStatusError, StatusReader
+from ticket_templates import FieldEncoder, build_ticket_templates
+
 try:
     from escpos.printer import Usb, File, Win32Raw
+    from escpos.constants import QR_ECLEVEL_M
+    from escpos.capabilities import get_profile
 except ImportError:
     print("Warning: python-escpos not installed. Printing will fail silently or log errors.")
     Usb = None
     File = None
     Win32Raw = None
+    QR_ECLEVEL_M = 1
+    get_profile = None
+
+# Rendered QR codes kept in memory; ballot IDs and ticket hashes repeat on
+# challenges and reprints.
+QR_CACHE_SIZE = 32
+
+# QR codes are printed either by the printer itself (GS ( k, a few dozen
+# bytes per code) or as raster images (several KB each).  "auto" goes native
+# only when EVOTING_PRINTER_PROFILE names a profile (other than "default",
+# which claims every feature) that lists qrCode; otherwise raster.
+QR_MODES = ("auto", "native", "raster")
+
+# Target QR edge in dots, quiet zone included.
+VVPAT_QR_SIZE = 140
+VOTER_QR_SIZE = 250
+
+# Blank modules required around a QR symbol so scanners can find its edges.
+QR_QUIET_ZONE = 4
+
+
+@functools.lru_cache(maxsize=QR_CACHE_SIZE)
+def _render_qr(data, size):
+    """1-bit QR image of data scaled to size x size dots (shared; callers paste, never modify)."""
+    # Mode "1" images always resize with NEAREST, so modules stay sharp.
+    return qrcode.make(data).convert("1").resize((size, size))
+
+
+@functools.lru_cache(maxsize=QR_CACHE_SIZE)
+def _native_qr_module_size(data, size):
+    """Largest GS ( k module size (1-16 dots) that keeps the code for data, quiet zone included, within size dots."""
+    # Byte mode, like most printer firmware, so the estimate never undershoots the version.
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=QR_QUIET_ZONE)
+    qr.add_data(data, optimize=0)
+    qr.make(fit=True)
+    return max(1, min(16, size // qr.modules_count))
+
 
 class PrinterService:
-    def __init__(self, data_handler):
+    def __init__(self, data_handler, state_dir=None):
         self.data_handler = data_handler
         self.printer = None
         self._force_pyusb = False
         self.paper_width_chars = self._read_int_env("EVOTING_PAPER_WIDTH_CHARS", 32)
         self.paper_width_dots = self._read_int_env("EVOTING_PAPER_WIDTH_DOTS", 384)
         self.reverse_print = self._read_bool_env("EVOTING_PRINT_REVERSE", True)
+        # Last printer that connected, tried first on the next connect; kept
+        # with the log/state data (state_dir, usually the LOGS partition).
+        if not state_dir:
+            state_home = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+            state_dir = os.path.join(state_home, "evoting")
+        self.printer_address_file = os.environ.get(
+            "EVOTING_PRINTER_ADDRESS_FILE",
+            os.path.join(state_dir, "printer_address.json"),
+        )
+        # Fixed wait before the cut for printers that do not report status.
+        self.print_settle_seconds = self._read_int_env("EVOTING_PRINT_SETTLE_SECONDS", 5)
+        self.print_drain_timeout = self._read_int_env("EVOTING_PRINT_DRAIN_TIMEOUT", 15)
+        self.last_status = None
+        self._status_supported = None
+        # Bytes handed to the printer so far; the spooler never re-sends a
+        # VVPAT once any of its bytes went out.
+        self.bytes_sent = 0
+        self.qr_mode = os.environ.get("EVOTING_PRINTER_QR_MODE", "auto").strip().lower()
+        if self.qr_mode not in QR_MODES:
+            print(f"Unknown EVOTING_PRINTER_QR_MODE {self.qr_mode!r}; using auto.")
+            self.qr_mode = "auto"
+        self._profile_native_qr = self._configured_profile_supports_qr()
+        # Startup/end/challenge/provisioning slips, pre-encoded per printer profile.
+        self._ticket_templates = None
+        self._field_encoder = None
+        self._templates_profile = None
         self.connect_printer()
+        try:
+            self._get_ticket_templates()
+        except Exception as e:
+            print(f"Ticket templates not built: {e}")
 
     def _read_int_env(self, name, default_value):
         raw_value = os.environ.get(name)
@@ -47,52 +118,6 @@ class PrinterService:
     def _center_line(self, text):
         return text.center(self.paper_width_chars)
 
-    def _run_command_text(self, command):
-        try:
-            result = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                check=False,
-            )
-            output = (result.stdout or result.stderr or "").strip()
-            return output
-        except Exception:
-            return "UNKNOWN"
-
-    def _yes_no_unknown(self, value):
-        text = str(value or "").strip().lower()
-        if not text:
-            return "UNKNOWN"
-        if text in ("active", "enabled", "yes", "on", "up"):
-            return "ON"
-        if text in ("inactive", "disabled", "no", "off", "down", "failed"):
-            return "OFF"
-        return text.upper()
-
-    def _get_wifi_status(self):
-        if shutil.which("nmcli"):
-            output = self._run_command_text(["nmcli", "-t", "-f", "WIFI", "general"])
-            if output:
-                return self._yes_no_unknown(output)
-        return self._yes_no_unknown(self._run_command_text(["bash", "-lc", "ip link show wlan0 2>/dev/null | grep -q 'state UP' && echo ON || echo OFF"]))
-
-    def _get_ssh_status(self):
-        if shutil.which("systemctl"):
-            for service_name in ("ssh", "sshd"):
-                output = self._run_command_text(["systemctl", "is-active", service_name])
-                if output and output != "unknown":
-                    return self._yes_no_unknown(output)
-        return "UNKNOWN"
-
-    def _get_bluetooth_status(self):
-        if shutil.which("systemctl"):
-            output = self._run_command_text(["systemctl", "is-active", "bluetooth"])
-            if output and output != "unknown":
-                return self._yes_no_unknown(output)
-        return "UNKNOWN"
-
     def _count_votes_cast(self, log_dir):
         votes_file = os.path.join(log_dir or "", "votes.json")
         if not os.path.exists(votes_file):
@@ -150,14 +175,9 @@ class PrinterService:
         p.text("\n")
         p.text(bottom_bar + "\n")
 
-        temp_img = self._generate_vvpat_qr(context["qr_choice_data"], context["short_b_id"])
-
         p.text("\n")
-        p.set(align='left')
-        p.image(temp_img)
+        self._print_vvpat_qr(p, context["qr_choice_data"], context["short_b_id"])
         p.text("\n")
-        if os.path.exists(temp_img):
-            os.remove(temp_img)
 
         p.set(align='left', bold=True)
         p.text(f"Choice : {context['vvpat_sel_str']}\n")
@@ -186,15 +206,226 @@ class PrinterService:
             # Some printer backends may not expose raw ESC/POS commands.
             pass
 
+    def _get_ticket_templates(self):
+        """Ticket templates and field encoder for the connected printer's profile."""
+        profile = getattr(self.printer, "profile", None)
+        if self._ticket_templates is None or profile is not self._templates_profile:
+            started = time.perf_counter()
+            self._ticket_templates = build_ticket_templates(self._bar("="), self._center_line, profile)
+            self._field_encoder = FieldEncoder(profile)
+            self._templates_profile = profile
+            print(f"Ticket templates encoded in {(time.perf_counter() - started) * 1000:.0f} ms.")
+        return self._ticket_templates, self._field_encoder
+
+    def _send_ticket(self, p, data):
+        # The whole slip in one write.  The template selected its own code
+        # page, so make the live encoder select again on its next text().
+        p._raw(data)
+        magic = getattr(p, "magic", None)
+        if magic is not None:
+            magic.encoding = None
+
+    def _configured_profile_supports_qr(self):
+        # The printers found by the USB scan are opened with the "default"
+        # profile, which lists every feature, so only an explicitly named
+        # profile says anything about this printer's firmware.
+        profile_name = os.environ.get("EVOTING_PRINTER_PROFILE", "").strip()
+        if not profile_name or profile_name == "default" or get_profile is None:
+            return False
+        try:
+            return bool(get_profile(profile_name).supports("qrCode"))
+        except Exception as e:
+            print(f"Unknown EVOTING_PRINTER_PROFILE {profile_name!r} ({e}); printing QR codes as images.")
+            return False
+
+    def _use_native_qr(self):
+        if self.qr_mode != "auto":
+            return self.qr_mode == "native"
+        return self._profile_native_qr
+
+    def _print_native_qr(self, p, data, size):
+        p.set(align='center')
+        p.qr(data, ec=QR_ECLEVEL_M, size=_native_qr_module_size(data, size), native=True)
+        p.set(align='left')
+
+    def _print_vvpat_qr(self, p, choice_data, ballot_id):
+        if not self._use_native_qr():
+            p.set(align='left')
+            p.image(self._generate_vvpat_qr(choice_data, ballot_id))
+            return
+        # GS ( k prints one code per line, so the pair is stacked instead of
+        # side by side; the choice code reads first on the torn-off slip.
+        codes = [ballot_id, choice_data] if self.reverse_print else [choice_data, ballot_id]
+        for i, data in enumerate(codes):
+            if i:
+                # GS ( k prints no quiet zone; feed one between the symbols
+                # (ESC J n: feed n dots) so scanners can tell them apart.
+                gap = QR_QUIET_ZONE * max(_native_qr_module_size(d, VVPAT_QR_SIZE) for d in codes)
+                p._raw(b"\x1bJ" + bytes([min(gap, 255)]))
+            self._print_native_qr(p, data, VVPAT_QR_SIZE)
+
+    def _print_voter_qr(self, p, hash_val):
+        if self._use_native_qr():
+            self._print_native_qr(p, hash_val, VOTER_QR_SIZE)
+        else:
+            p.set(align='left')
+            p.image(self._generate_voter_qr(hash_val))
+
+    def _print_provision_qr(self, p, payload_text):
+        if self._use_native_qr():
+            self._print_native_qr(p, payload_text, min(self.paper_width_dots - 40, 360))
+        else:
+            p.set(align='left')
+            p.image(self._generate_provision_qr(payload_text))
+
+    def _check_printer_ready(self, status):
+        """Fail a slip up front on paper out / cover open, before anything is sent."""
+        if self._status_supported is False:
+            return
+        snapshot = status.snapshot()
+        if snapshot["state"] == UNKNOWN:
+            print("Printer does not report status; using a fixed wait before cutting.")
+            self._status_supported = False
+            return
+        self._status_supported = True
+        self.last_status = snapshot
+        if snapshot["state"] in FAILED_STATES:
+            raise PrinterStatusError(snapshot)
+
+    def _wait_until_printed(self, status, settle_seconds=None):
+        """Block until the slip sent so far has printed, so the cut follows it directly."""
+        if not self._status_supported:
+            time.sleep(self.print_settle_seconds if settle_seconds is None else settle_seconds)
+            return
+        started = time.perf_counter()
+        result = status.wait_until_printed(self.print_drain_timeout)
+        self.last_status = result
+        if result["state"] in FAILED_STATES:
+            raise PrinterStatusError(result)
+        if not result["printed"]:
+            # Real-time status works but GS r goes unanswered; stop waiting on it.
+            print("Printer did not confirm the slip; using a fixed wait from now on.")
+            self._status_supported = False
+        else:
+            print(f"Slip printed in {time.perf_counter() - started:.2f}s")
+
     def is_printer_connected(self):
         if self.printer is None:
             self.connect_printer()
         return self.printer is not None
 
+    def _printer_config(self):
+        # The settings a remembered address was found with; any change means rescan.
+        return {
+            name: os.environ.get(name)
+            for name in (
+                "EVOTING_PRINTER_DEVICE",
+                "EVOTING_PRINTER_PROFILE",
+                "EVOTING_PRINTER_NAME",
+                "EVOTING_PRINTER_USB_LP",
+            )
+        }
+
+    def _load_printer_address(self):
+        try:
+            with open(self.printer_address_file, "r", encoding="utf-8") as f:
+                address = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(address, dict) or not address.get("backend"):
+            return None
+        if address.get("config") != self._printer_config():
+            print("Printer settings changed since the printer was remembered; ignoring the remembered printer.")
+            return None
+        return address
+
+    def _save_printer_address(self, address):
+        address = dict(address, config=self._printer_config())
+        if address == self._load_printer_address():
+            return
+        try:
+            os.makedirs(os.path.dirname(self.printer_address_file) or ".", exist_ok=True)
+            tmp_path = self.printer_address_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(address, f)
+            os.replace(tmp_path, self.printer_address_file)
+        except OSError as e:
+            print(f"Could not remember printer address: {e}")
+
+    def _describe_printer_address(self, address):
+        backend = address.get("backend")
+        if backend == "usb":
+            text = f"USB {address['vid']:#06x}:{address['pid']:#06x}"
+            return text + (f" out_ep={address['out_ep']:#04x}" if address.get("out_ep") else "")
+        if backend == "win32raw":
+            return f"Win32Raw ({address.get('name')})"
+        return f"{address.get('device')} ({address.get('profile', 'default')} profile)"
+
+    def _open_printer_address(self, address):
+        """Printer for a remembered address; raises if that device is not there any more."""
+        backend = address.get("backend")
+        if backend == "file":
+            if not File or not os.path.exists(address["device"]):
+                raise Exception(f"{address['device']} not present")
+            return File(address["device"], profile=address.get("profile", "default"))
+        if backend == "win32raw":
+            if not Win32Raw:
+                raise Exception("Win32Raw not available")
+            return Win32Raw(address["name"])
+        if backend == "usb":
+            import usb.core
+            if not Usb or usb.core.find(idVendor=address["vid"], idProduct=address["pid"]) is None:
+                raise Exception("USB device not present")
+            kwargs = {"out_ep": address["out_ep"]} if address.get("out_ep") else {}
+            return Usb(address["vid"], address["pid"], profile=address.get("profile", "default"), **kwargs)
+        raise Exception(f"unknown printer backend {backend!r}")
+
+    def _count_writes(self):
+        # escpos sends everything through _raw(); count before the write, so
+        # a write that fails partway still counts as sent.
+        printer = self.printer
+        raw = printer._raw
+
+        def counted_raw(msg):
+            self.bytes_sent += len(msg)
+            return raw(msg)
+
+        printer._raw = counted_raw
+
     def connect_printer(self):
         if self.printer is not None:
             return
+        self._status_supported = None   # re-detect on the new connection
+        started = time.perf_counter()
 
+        # Last working device first: reconnecting after a print error then
+        # skips the USB detach pass and the backend-by-backend scan.
+        remembered = self._load_printer_address()
+        if remembered and not (self._force_pyusb and remembered.get("backend") == "file"):
+            try:
+                self.printer = self._open_printer_address(remembered)
+                self._count_writes()
+                print(
+                    f"Printer reconnected at remembered {self._describe_printer_address(remembered)} "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms."
+                )
+                return
+            except Exception as e:
+                self.printer = None
+                print(f"Remembered printer {self._describe_printer_address(remembered)} unavailable ({e}); scanning.")
+
+        address = self._scan_for_printer()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if self.printer is None:
+            print(f"Printer scan found nothing ({elapsed_ms:.0f} ms).")
+            return
+        self._count_writes()
+        print(f"Printer found by full scan in {elapsed_ms:.0f} ms.")
+        if address:
+            self._save_printer_address(address)
+
+    def _scan_for_printer(self):
+        """Try every backend in turn; sets self.printer and returns its address dict, or None."""
         # Allow deployment-specific printer selection without code edits.
         configured_printer_name = os.environ.get("EVOTING_PRINTER_NAME", "POS50")
         configured_usb_lp = os.environ.get("EVOTING_PRINTER_USB_LP", "0")
@@ -213,7 +444,7 @@ class PrinterService:
                     f"Printer connected successfully at {configured_device_path} "
                     f"with {configured_profile} profile."
                 )
-                return
+                return {"backend": "file", "device": configured_device_path, "profile": configured_profile}
             except Exception as e:
                 print(f"Configured printer device failed on {configured_device_path}: {e}")
             
@@ -253,7 +484,7 @@ class PrinterService:
                 try:
                     self.printer = Win32Raw(name)
                     print(f"Printer connected via Win32Raw ({name}) successfully.")
-                    return
+                    return {"backend": "win32raw", "name": name}
                 except Exception:
                     pass
 
@@ -263,7 +494,7 @@ class PrinterService:
             try:
                 self.printer = Usb(0x0483, 0x5743, profile="default")
                 print("Printer connected via USB (0x0483:0x5743) successfully.")
-                return
+                return {"backend": "usb", "vid": 0x0483, "pid": 0x5743, "profile": "default"}
             except Exception as e:
                 pass
                 
@@ -271,7 +502,7 @@ class PrinterService:
             try:
                 self.printer = Usb(0x0483, 0x5743, out_ep=0x01, profile="default")
                 print("Printer connected via USB (0x0483:0x5743 with out_ep=0x01) successfully.")
-                return
+                return {"backend": "usb", "vid": 0x0483, "pid": 0x5743, "out_ep": 0x01, "profile": "default"}
             except Exception as e:
                 pass
                 
@@ -279,7 +510,7 @@ class PrinterService:
             try:
                 self.printer = Usb(0x0483, 0x5743, out_ep=0x03, profile="default")
                 print("Printer connected via USB (0x0483:0x5743 with out_ep=0x03) successfully.")
-                return
+                return {"backend": "usb", "vid": 0x0483, "pid": 0x5743, "out_ep": 0x03, "profile": "default"}
             except Exception as e:
                 pass
 
@@ -287,7 +518,7 @@ class PrinterService:
             try:
                 self.printer = Usb(0x0416, 0x5011, profile="default")
                 print("Printer connected via USB (0x0416:0x5011) successfully.")
-                return
+                return {"backend": "usb", "vid": 0x0416, "pid": 0x5011, "profile": "default"}
             except Exception as e:
                 pass
             
@@ -295,7 +526,7 @@ class PrinterService:
             try:
                 self.printer = Usb(0x04b8, 0x0202, profile="default")
                 print("Printer connected via USB (0x04b8:0x0202) successfully.")
-                return
+                return {"backend": "usb", "vid": 0x04b8, "pid": 0x0202, "profile": "default"}
             except Exception as e:
                 pass
 
@@ -313,7 +544,7 @@ class PrinterService:
                     try:
                         self.printer = Usb(vid, pid, profile="default")
                         print(f"Printer auto-connected via generic USB ({hex(vid)}:{hex(pid)}) successfully.")
-                        return
+                        return {"backend": "usb", "vid": vid, "pid": pid, "profile": "default"}
                     except Exception as e:
                         print(f"Failed generic USB connect for {hex(vid)}:{hex(pid)} - {e}")
             except Exception:
@@ -321,7 +552,6 @@ class PrinterService:
                 
         # Fallback to File class (/dev/usb/lpX or /dev/lpX)
         if File:
-            connected = False
             device_candidates = []
             if configured_device_path:
                 device_candidates.append(configured_device_path)
@@ -353,25 +583,26 @@ class PrinterService:
                             f"Printer connected successfully at {device_path} "
                             f"with {configured_profile} profile."
                         )
-                        connected = True
-                        break
+                        return {"backend": "file", "device": device_path, "profile": configured_profile}
                     except Exception as e:
                         print(f"Printer connection failed on {device_path}: {e}")
-            
-            if not connected:
-                 print(
-                     "Printer device file not found or could not connect. "
-                     "Checked EVOTING_PRINTER_DEVICE, /dev/usb/lp0-/dev/usb/lp5, and /dev/lp0-/dev/lp5."
-                 )
-                 self.printer = None
+
+            print(
+                "Printer device file not found or could not connect. "
+                "Checked EVOTING_PRINTER_DEVICE, /dev/usb/lp0-/dev/usb/lp5, and /dev/lp0-/dev/lp5."
+            )
+            self.printer = None
         else:
              print("escpos library not available.")
+        return None
 
-    def print_vote(self, mode, selections, is_final=True, stage="both"):
+    def print_vote(self, mode, selections, is_final=True, stage="both", context=None):
         """
         Synchronous print function. 
         Returns True if successful, raises Exception if failed.
         Should be called from a background thread.
+        context: a _build_vote_print_context() result captured earlier (the
+        print spooler keeps it with the job); built from the live ballot if None.
         """
         # Re-check connection if needed
         if not self.printer:
@@ -381,16 +612,19 @@ class PrinterService:
             # Fallback/Error if still no printer
             raise Exception("Printer not connected")
 
-        context = self._build_vote_print_context(mode, selections)
+        if context is None:
+            context = self._build_vote_print_context(mode, selections)
 
         p = self.printer
 
+        status = StatusReader(p)
         try:
             self._set_reverse_print_mode(True)
 
             if stage in ("both", "vvpat", "receipt"):
+                self._check_printer_ready(status)
                 self._print_vote_vvpat_section(p, context)
-                time.sleep(5)
+                self._wait_until_printed(status)
                 p.text("\n" * 8)
                 p.cut(mode='FULL')
                 p.text("\n\n\n\n\n\n") # Extra feed after cut helps slip clear the printer
@@ -398,6 +632,9 @@ class PrinterService:
 
             return True
 
+        except PrinterStatusError:
+            # The connection is fine; the operator has to fix the printer.
+            raise
         except Exception as e:
             try:
                 if self.printer:
@@ -410,21 +647,30 @@ class PrinterService:
             self.printer = None
             raise e
         finally:
+            status.close()
             self._set_reverse_print_mode(False)
 
 
+    def feed_and_cut(self):
+        """Feed past the blade and cut, clearing any partial slip left on the roll."""
+        if not self.is_printer_connected():
+            raise Exception("Printer not connected")
+        self.printer.text("\n\n\n\n\n\n\n\n\n\n") # Feed past blade
+        self.printer.cut()
+        self.printer.text("\n\n\n\n\n\n") # Extra feed after cut
+        return True
+
     def _generate_vvpat_qr(self, choice_data, ballot_id):
+        """Choice and ballot-ID QR codes side by side, as an in-memory 1-bit image for p.image()."""
         try:
-            qr_c = qrcode.make(choice_data)
-            qr_b = qrcode.make(ballot_id)
-            qr_size = 140
-            qr_c = qr_c.resize((qr_size, qr_size))
-            qr_b = qr_b.resize((qr_size, qr_size))
+            qr_size = VVPAT_QR_SIZE
+            qr_c = _render_qr(choice_data, qr_size)
+            qr_b = _render_qr(ballot_id, qr_size)
             
             total_width = self.paper_width_dots
             height = qr_size
             
-            img = Image.new('RGB', (total_width, height), 'white')
+            img = Image.new('1', (total_width, height), 1)
             
             x_c = 30
             x_b = 214
@@ -433,32 +679,26 @@ class PrinterService:
             img.paste(qr_b, (x_b, 0))
             if self.reverse_print:
                 img = img.rotate(180)
-            
-            temp_filename = f"temp_qr_vvpat_{uuid.uuid4().hex}.png"
-            img.save(temp_filename)
-            return temp_filename
+            return img
         except Exception as e:
             print(f"QR Gen Error: {e}")
             raise e
 
     def _generate_voter_qr(self, hash_val):
+        """Centred 250-dot QR code as an in-memory 1-bit image for p.image()."""
         try:
-            qr_h = qrcode.make(hash_val)
-            qr_size = 250 
-            qr_h = qr_h.resize((qr_size, qr_size))
+            qr_size = VOTER_QR_SIZE
+            qr_h = _render_qr(hash_val, qr_size)
             
             total_width = self.paper_width_dots
             height = qr_size + 10
             
-            img_v = Image.new('RGB', (total_width, height), 'white')
+            img_v = Image.new('1', (total_width, height), 1)
             x_pos = (total_width - qr_size) // 2
             img_v.paste(qr_h, (x_pos, 5))
             if self.reverse_print:
                 img_v = img_v.rotate(180)
-            
-            temp_filename = f"temp_qr_voter_{uuid.uuid4().hex}.png"
-            img_v.save(temp_filename)
-            return temp_filename
+            return img_v
         except Exception as e:
             print(f"Voter QR Error: {e}")
             raise e
@@ -466,8 +706,8 @@ class PrinterService:
     def _generate_provision_qr(self, payload_text):
         """Generate a printer-friendly QR image for provisioning payloads.
 
-        This mirrors the VVPAT image path: render QR -> convert to RGB canvas
-        sized to printer width -> print with p.image(...).
+        This mirrors the VVPAT image path: render QR -> 1-bit canvas sized
+        to printer width -> print with p.image(...), all in memory.
         """
         try:
             qr = qrcode.QRCode(
@@ -479,22 +719,19 @@ class PrinterService:
             qr.add_data(payload_text)
             qr.make(fit=True)
 
-            qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
+            qr_img = qr.make_image(fill_color="black", back_color="white").convert("1")
 
             max_qr_size = min(self.paper_width_dots - 40, 360)
             qr_img.thumbnail((max_qr_size, max_qr_size), Image.Resampling.NEAREST)
 
             canvas_h = qr_img.height + 10
-            canvas = Image.new("RGB", (self.paper_width_dots, canvas_h), "white")
+            canvas = Image.new("1", (self.paper_width_dots, canvas_h), 1)
             x_pos = (self.paper_width_dots - qr_img.width) // 2
             canvas.paste(qr_img, (x_pos, 5))
 
             if self.reverse_print:
                 canvas = canvas.rotate(180)
-
-            temp_filename = f"temp_qr_provision_{uuid.uuid4().hex}.png"
-            canvas.save(temp_filename)
-            return temp_filename
+            return canvas
         except Exception as e:
             print(f"Provision QR Error: {e}")
             raise e
@@ -504,9 +741,9 @@ class PrinterService:
         if not self.is_printer_connected():
             raise Exception("Printer not connected")
 
+        status = StatusReader(self.printer)
         try:
             p = self.printer
-            TOP_BAR = self._bar("=")
             timestamp = datetime.datetime.now().strftime("%d-%m-%Y %H:%M:%S")
 
             if machine_id and "OTP_" in str(machine_id):
@@ -527,42 +764,20 @@ class PrinterService:
                 separators=(",", ":")
             )
 
-            self._set_reverse_print_mode(True)
-
-            p.text("SEND TO ELECTION ADMIN\n")
-            p.text(TOP_BAR + "\n")
-            p.text("BMD PROVISIONING RECEIPT\n")
-            p.text(TOP_BAR + "\n")
-
-            p.set(align='left', bold=False)
-            p.text(f"Date/Time  : {timestamp}\n")
-            p.text(f"BMD ID     : {bmd_id}\n")
-            p.text(f"HW Binding : {hw_label}\n\n")
-
-            p.set(align='left', bold=True)
-            p.text("QR: BMD ID + FULL PUBLIC KEY\n")
-            p.set(align='left', bold=False)
+            templates, enc = self._get_ticket_templates()
+            slip = templates["provision"].render(
+                enc,
+                timestamp=timestamp,
+                bmd_id=bmd_id,
+                hw_label=hw_label,
+                qr=enc.capture(lambda d: self._print_provision_qr(d, qr_payload)),
+                public_key="".join(f"{line}\n" for line in public_key_pem.strip().splitlines()),
+            )
 
-            temp_qr = self._generate_provision_qr(qr_payload)
-            p.set(align='left')
-            p.image(temp_qr)
-            if os.path.exists(temp_qr):
-                os.remove(temp_qr)
-
-            p.text("\n")
-            p.set(align='left', bold=True)
-            p.text("PUBLIC KEY (PEM):\n")
-            p.set(align='left', bold=False)
-            for line in public_key_pem.strip().splitlines():
-                p.text(f"{line}\n")
-
-            p.text("\n" + TOP_BAR + "\n")
-            p.text("KEEP THIS SLIP FOR SETUP\n")
-            p.text(TOP_BAR + "\n")
-            p.set(align='left', font='a', width=1, height=1, bold=True)
-            p.text("\n\n\n\n\n\n\n\n")            
-            import time
-            time.sleep(3) # Wait for print buffer to clear before cut command
+            self._set_reverse_print_mode(True)
+            self._check_printer_ready(status)
+            self._send_ticket(p, slip)
+            self._wait_until_printed(status, settle_seconds=3)
             p.cut(mode='FULL')
             p.text("\n\n\n\n\n\n") # Extra feed after cut
             return True
@@ -578,6 +793,7 @@ class PrinterService:
             self.printer = None
             raise Exception(f"Failed to print provisioning ticket: {e}")
         finally:
+            status.close()
             self._set_reverse_print_mode(False)
 
     def print_session_receipts(self, receipts_list, stage="both"):
@@ -591,10 +807,12 @@ class PrinterService:
         TOP_BAR = self._bar("=")
         DIVIDER = self._bar("-")
         
+        status = StatusReader(p)
         try:
             self._set_reverse_print_mode(True)
 
             if stage in ("both", "vvpat", "receipt"):
+                self._check_printer_ready(status)
                 p.text("\n")
 
                 for i, r in enumerate(reversed(receipts_list)):
@@ -603,12 +821,7 @@ class PrinterService:
 
                     qr_data = r['qr_choice_data']
                     short_b_id = self.data_handler.get_short_ballot_id(r['ballot_id'])
-                    temp_qr = self._generate_vvpat_qr(qr_data, short_b_id)
-
-                    p.set(align='left')
-                    p.image(temp_qr)
-                    if os.path.exists(temp_qr):
-                        os.remove(temp_qr)
+                    self._print_vvpat_qr(p, qr_data, short_b_id)
 
                     p.set(align='left', bold=False)
                     p.set(align='left', bold=True)
@@ -623,7 +836,7 @@ class PrinterService:
                 p.set(align='left', font='a', width=1, height=1, bold=True)
 
                 p.text("\n\n\n\n\n\n")
-                time.sleep(5)
+                self._wait_until_printed(status)
                 p.cut(mode='FULL')
                 p.text("\n\n\n\n\n\n") # Extra feed after cut
 
@@ -631,6 +844,9 @@ class PrinterService:
 
             return True
             
+        except PrinterStatusError as e:
+            print(f"Batch Print Error: {e}")
+            raise
         except Exception as e:
             print(f"Batch Print Error: {e}")
             try:
@@ -644,6 +860,7 @@ class PrinterService:
             self.printer = None
             raise e
         finally:
+            status.close()
             self._set_reverse_print_mode(False)
 
     def _get_font(self, size):
@@ -660,64 +877,58 @@ class PrinterService:
         return ImageFont.load_default()
 
     def print_startup_ticket(self, genesis_hash, log_dir):
-        """Prints a physical ticket with the generated Genesis block and EVM details."""
+        """Prints a physical ticket with the generated Genesis block and EVM details.
+
+        Returns True on success, raises Exception on printer/connectivity errors.
+        """
         import datetime
-        try:
-            import hardware_crypto
-            mac_addr = hardware_crypto.get_mac_address()
-        except:
-            mac_addr = "UNKNOWN"
-            
+        # The ticket is the officer's record of WiFi/SSH/Bluetooth state, so
+        # probe now (concurrently) rather than print a cached snapshot.
+        health = get_device_health().refresh()
+
+        if not self.is_printer_connected():
+            raise Exception("Printer not connected")
+
         try:
             p = self.printer
-            TOP_BAR = self._bar("=")
-            self._set_reverse_print_mode(True)
-            
-            # Send in reverse order due to 180° rotation
-            p.text("Keep this slip for auditing.\n")
-            p.text("ELECTION READY\n")
-            p.text(TOP_BAR + "\n")
-            p.set(align='left')
-            
+            templates, enc = self._get_ticket_templates()
+
             # Print QR code of genesis hash
+            qr = b""
             try:
                 if genesis_hash:
-                    temp_img = self._generate_voter_qr(genesis_hash)
-                    p.set(align='left')
-                    p.image(temp_img)
-                    if os.path.exists(temp_img):
-                        os.remove(temp_img)
+                    qr = enc.capture(lambda d: self._print_voter_qr(d, genesis_hash))
             except Exception as e:
-                p.text(f"QR Error: {e}\n")
-            
-            # Print the hash in chunks so it fits nicely
-            if genesis_hash:
-                p.text(f"{genesis_hash[32:]}\n")
-                p.text(f"{genesis_hash[:32]}\n")
-
-            p.set(align='left', bold=False)
-            p.text("GENESIS SEED (RECORD THIS):\n")
-            p.set(align='left', bold=True)
-            
-            p.text(f"Log Volume : {log_dir}\n")
-            p.text(f"Device MAC : {mac_addr}\n")
-            p.text(f"Votes Cast : {self._count_votes_cast(log_dir)}\n")
-            p.text(f"Wifi Status : {self._get_wifi_status()}\n")
-            p.text(f"SSH Status : {self._get_ssh_status()}\n")
-            p.text(f"Bluetooth Status : {self._get_bluetooth_status()}\n")
-            p.set(align='left', bold=False)
-            
-            p.text(TOP_BAR + "\n")
-            p.text(self._center_line(datetime.datetime.now().strftime("%d-%m-%y %H:%M:%S")) + "\n")
-            p.text(self._center_line("GENESIS BLOCK CREATED") + "\n")
-            p.text(self._center_line("EVM STARTUP PROTOCOL") + "\n")
-            p.text(TOP_BAR + "\n")
-            p.set(align='left', font='a', width=1, height=1, bold=True)
-            
-            p.cut(mode='FULL')
-            p.text("\n\n\n\n\n\n") # Extra feed after cut
+                qr = enc.text(f"QR Error: {e}\n")
+
+            slip = templates["startup"].render(
+                enc,
+                qr=qr,
+                # The hash in chunks so it fits nicely
+                hash_lines=f"{genesis_hash[32:]}\n{genesis_hash[:32]}\n" if genesis_hash else "",
+                log_dir=log_dir,
+                mac=health['mac'],
+                votes_cast=self._count_votes_cast(log_dir),
+                wifi=health['wifi'],
+                ssh=health['ssh'],
+                bluetooth=health['bluetooth'],
+                timestamp=self._center_line(datetime.datetime.now().strftime("%d-%m-%y %H:%M:%S")),
+            )
+
+            self._set_reverse_print_mode(True)
+            self._send_ticket(p, slip)
+            return True
         except Exception as e:
-            print(f"Failed to print startup ticket: {e}")
+            try:
+                if self.printer:
+                    self.printer.close()
+            except Exception:
+                pass
+            if 'Input/' in str(e) or 'Errno 5' in str(e) or 'Device or resource busy' in str(e):
+                self._force_pyusb = True
+                print('Forcing PyUSB reconnect on next print...\n')
+            self.printer = None
+            raise Exception(f"Failed to print startup ticket: {e}")
         finally:
             self._set_reverse_print_mode(False)
 
@@ -727,11 +938,7 @@ class PrinterService:
         Returns True on success, raises Exception on printer/connectivity errors.
         """
         import datetime
-        try:
-            import hardware_crypto
-            mac_addr = hardware_crypto.get_mac_address()
-        except:
-            mac_addr = "UNKNOWN"
+        mac_addr = get_device_health().refresh()["mac"]
 
         # Ensure we have an active printer handle before attempting to print.
         if not self.is_printer_connected():
@@ -739,48 +946,27 @@ class PrinterService:
             
         try:
             p = self.printer
-            TOP_BAR = self._bar("=")
-            self._set_reverse_print_mode(True)
-            
-            # Send in reverse order due to 180° rotation
-            p.text("Submit this slip with USB.\n")
-            p.text("SAFE TO POWER OFF\n")
-            p.text(TOP_BAR + "\n")
-            p.set(align='left')
-            
+            templates, enc = self._get_ticket_templates()
+
             # Print QR code of final hash
+            qr = b""
             try:
                 if final_hash:
-                    temp_img = self._generate_voter_qr(final_hash)
-                    p.set(align='left')
-                    p.image(temp_img)
-                    if os.path.exists(temp_img):
-                        os.remove(temp_img)
+                    qr = enc.capture(lambda d: self._print_voter_qr(d, final_hash))
             except Exception as e:
-                p.text(f"QR Error: {e}\n")
-            
-            # Print the hash in chunks
-            if final_hash:
-                p.text(f"{final_hash[32:]}\n")
-                p.text(f"{final_hash[:32]}\n")
-
-            p.set(align='left', bold=False)
-            p.text("FINAL SEED (RECORD THIS):\n")
-            p.set(align='left', bold=True)
-            
-            p.text(f"Export Dir : {export_path}\n")
-            p.text(f"Device MAC : {mac_addr}\n")
-            p.set(align='left', bold=False)
-            
-            p.text(TOP_BAR + "\n")
-            p.text(self._center_line(datetime.datetime.now().strftime("%d-%m-%y %H:%M:%S")) + "\n")
-            p.text(self._center_line("FINAL BLOCK SEALED") + "\n")
-            p.text(self._center_line("ELECTION TERMINATED") + "\n")
-            p.text(TOP_BAR + "\n")
-            p.set(align='left', font='a', width=1, height=1, bold=True)
-            
-            p.cut(mode='FULL')
-            p.text("\n\n\n\n\n\n") # Extra feed after cut
+                qr = enc.text(f"QR Error: {e}\n")
+
+            slip = templates["end"].render(
+                enc,
+                qr=qr,
+                hash_lines=f"{final_hash[32:]}\n{final_hash[:32]}\n" if final_hash else "",
+                export_path=export_path,
+                mac=mac_addr,
+                timestamp=self._center_line(datetime.datetime.now().strftime("%d-%m-%y %H:%M:%S")),
+            )
+
+            self._set_reverse_print_mode(True)
+            self._send_ticket(p, slip)
             return True
         except Exception as e:
             try:
@@ -809,41 +995,19 @@ class PrinterService:
         import datetime
         try:
             p = self.printer
-            TOP_BAR = self._bar("=")
             timestamp = datetime.datetime.now().strftime("%d-%m-%y %H:%M:%S")
-            self._set_reverse_print_mode(True)
+            templates, enc = self._get_ticket_templates()
+            slip = templates["challenge"].render(
+                enc,
+                # QR of voter commitments
+                qr=enc.capture(lambda d: self._print_voter_qr(d, voter_qr_data)),
+                sel_str=sel_str,
+                ballot_id=self.data_handler.get_short_ballot_id(ballot_id),
+                timestamp=self._center_line(timestamp),
+            )
 
-            # Send in reverse order due to 180° rotation
-            p.text("vote was NOT counted.\n")
-            p.text("Keep this slip to verify your\n")
-            p.text("This ballot was CHALLENGED.\n")
-            p.text(TOP_BAR + "\n")
-            
-            # QR of voter commitments
-            temp_img = self._generate_voter_qr(voter_qr_data)
-            p.set(align='left')
-            p.image(temp_img)
-            if os.path.exists(temp_img):
-                os.remove(temp_img)
-
-            p.set(align='left', bold=False)
-            p.set(align='left', bold=True)
-            p.text(f"Choice    : {sel_str}\n")
-            p.set(align='left', bold=False)
-            short_b_id = self.data_handler.get_short_ballot_id(ballot_id)
-            p.set(align='left')
-            p.text(f"Ballot ID : {short_b_id}\n")
-
-            p.text(TOP_BAR + "\n")
-            p.text(self._center_line(timestamp) + "\n")
-            p.set(align='left', bold=False)
-            p.text(self._center_line("  (NOT A CAST VOTE)  ") + "\n")
-            p.text(self._center_line("** CHALLENGE RECEIPT **") + "\n")
-            p.text(TOP_BAR + "\n")
-            p.set(align='left', font='a', width=1, height=1, bold=True)
-            
-            p.cut(mode='FULL')
-            p.text("\n\n\n\n\n\n") # Extra feed after cut
+            self._set_reverse_print_mode(True)
+            self._send_ticket(p, slip)
             return True
         except Exception as e:
             try:
@@ -0,0 +1,226 @@
+"""
+printer_status.py  ─  ESC/POS real-time status for the receipt printer.
+
+The print paths used to sleep a fixed 5 s before cutting and could only tell
+a failure from the exception text ('Errno 5', ...).  StatusReader asks the
+printer instead:
+
+    DLE EOT n   real-time status, answered at once even mid-slip
+                (n=1 printer, 2 offline cause, 3 error cause, 4 paper sensor)
+    GS r 1      paper sensor status, answered only once everything sent
+                before it has been processed, i.e. the slip has printed
+
+Replies need a back channel: escpos Usb printers read the IN endpoint, File
+printers (/dev/usb/lpX) read the same device node.  A printer that never
+answers reports state UNKNOWN and callers fall back to a fixed wait.
+
+Usage:
+    with StatusReader(printer) as status:
+        if status.snapshot()["state"] in FAILED_STATES: ...
+        ...send the slip...
+        result = status.wait_until_printed(timeout=10)
+"""
+
+import os
+import select
+import time
+
+DLE_EOT_PRINTER = b"\x10\x04\x01"
+DLE_EOT_OFFLINE = b"\x10\x04\x02"
+DLE_EOT_ERROR = b"\x10\x04\x03"
+DLE_EOT_PAPER = b"\x10\x04\x04"
+GS_R_PAPER = b"\x1d\x72\x01"
+
+READY = "ready"
+PAPER_NEAR_END = "paper_near_end"
+PAPER_OUT = "paper_out"
+COVER_OPEN = "cover_open"
+CUTTER_ERROR = "cutter_error"
+PRINTER_ERROR = "error"
+OFFLINE = "offline"
+UNKNOWN = "unknown"
+
+# States that stop a slip; PAPER_NEAR_END still prints.
+FAILED_STATES = (PAPER_OUT, COVER_OPEN, CUTTER_ERROR, PRINTER_ERROR, OFFLINE)
+
+STATE_MESSAGES = {
+    PAPER_OUT: "Printer is out of paper",
+    COVER_OPEN: "Printer cover is open",
+    CUTTER_ERROR: "Printer cutter error",
+    PRINTER_ERROR: "Printer error",
+    OFFLINE: "Printer is offline",
+}
+
+# Seconds to wait for one DLE EOT reply.
+STATUS_TIMEOUT = 0.5
+
+
+class PrinterStatusError(Exception):
+    """A slip failed on a printer condition; .state is one of FAILED_STATES, .status the full snapshot."""
+
+    def __init__(self, status):
+        self.status = dict(status)
+        self.state = self.status.get("state", UNKNOWN)
+        super().__init__(STATE_MESSAGES.get(self.state, f"Printer status: {self.state}"))
+
+
+def _is_realtime_reply(byte):
+    # DLE EOT replies have bits 1 and 4 set, bits 0 and 7 clear.
+    return byte & 0x93 == 0x12
+
+
+def _is_gs_r_reply(byte):
+    # GS r 1 replies use bits 0-3 only.
+    return byte & 0xF0 == 0
+
+
+def parse_status(printer_byte, offline_byte, error_byte, paper_byte):
+    """Decode the four DLE EOT replies into {"state", "online", "paper", "cover_open"}."""
+    online = not printer_byte & 0x08
+    cover_open = bool(offline_byte & 0x04)
+    if paper_byte & 0x60:
+        paper = "out"
+    elif paper_byte & 0x0C:
+        paper = "near_end"
+    else:
+        paper = "ok"
+
+    if cover_open:
+        state = COVER_OPEN
+    elif paper == "out" or offline_byte & 0x20:
+        state = PAPER_OUT
+    elif error_byte & 0x08:
+        state = CUTTER_ERROR
+    elif offline_byte & 0x40 or error_byte & 0x60:
+        state = PRINTER_ERROR
+    elif not online:
+        state = OFFLINE
+    elif paper == "near_end":
+        state = PAPER_NEAR_END
+    else:
+        state = READY
+    return {"state": state, "online": online, "paper": paper, "cover_open": cover_open}
+
+
+class StatusReader:
+    """Status queries over one escpos printer's back channel, for the duration of a slip."""
+
+    def __init__(self, printer):
+        self.printer = printer
+        self.printed = False
+        self._fd = None
+        devfile = getattr(printer, "devfile", None)
+        if devfile:
+            try:
+                self._fd = os.open(devfile, os.O_RDONLY | os.O_NONBLOCK)
+            except OSError:
+                pass
+        self.available = self._fd is not None or hasattr(printer, "_read")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def read(self, timeout):
+        """Bytes from the printer, or b"" when nothing arrives within timeout seconds."""
+        if not self.available:
+            return b""
+        timeout = max(0.0, timeout)
+        if self._fd is not None:
+            try:
+                ready, _, _ = select.select([self._fd], [], [], timeout)
+                return os.read(self._fd, 16) if ready else b""
+            except OSError:
+                return b""
+
+        device = getattr(self.printer, "device", None)
+        in_ep = getattr(self.printer, "in_ep", None)
+        try:
+            if in_ep is not None and hasattr(device, "read"):
+                # escpos Usb._read() uses the pyusb default timeout; pass ours.
+                return bytes(device.read(in_ep, 16, max(1, int(timeout * 1000))))
+            return bytes(self.printer._read() or b"")
+        except NotImplementedError:
+            self.available = False
+            return b""
+        except Exception:
+            # usb.core.USBTimeoutError and friends: nothing to read.
+            return b""
+
+    def _replies(self, timeout):
+        data = self.read(timeout)
+        if not data:
+            time.sleep(min(0.01, timeout))
+        realtime = []
+        for byte in data:
+            if _is_realtime_reply(byte):
+                realtime.append(byte)
+            elif _is_gs_r_reply(byte):
+                self.printed = True
+        return realtime
+
+    def query(self, command, timeout=STATUS_TIMEOUT):
+        """Send one DLE EOT command; returns its reply byte or None."""
+        if not self.available:
+            return None
+        self.printer._raw(command)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            realtime = self._replies(remaining)
+            if realtime:
+                return realtime[-1]
+
+    def snapshot(self, timeout=STATUS_TIMEOUT):
+        """Real-time printer status; state is UNKNOWN when the printer does not answer."""
+        printer_byte = self.query(DLE_EOT_PRINTER, timeout)
+        if printer_byte is None:
+            return {"state": UNKNOWN, "online": None, "paper": None, "cover_open": None}
+        offline_byte = self.query(DLE_EOT_OFFLINE, timeout) or 0x12
+        error_byte = self.query(DLE_EOT_ERROR, timeout) or 0x12
+        paper_byte = self.query(DLE_EOT_PAPER, timeout) or 0x12
+        return parse_status(printer_byte, offline_byte, error_byte, paper_byte)
+
+    def wait_until_printed(self, timeout, check_interval=0.5):
+        """Wait for the data sent so far to print.
+
+        Queues GS r 1 behind the slip and waits for its reply, checking the
+        real-time status every check_interval so a paper-out or open cover
+        ends the wait early.  Returns the final snapshot plus "printed":
+        False if the reply never came (timeout, printer fault, or firmware
+        without GS r).
+        """
+        # Drop replies left over from earlier queries.
+        while self._replies(0):
+            pass
+        self.printed = False
+        self.printer._raw(GS_R_PAPER)
+
+        deadline = time.monotonic() + timeout
+        status = None
+        while not self.printed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._replies(min(check_interval, remaining))
+            if self.printed:
+                break
+            status = self.snapshot()
+            if status["state"] in FAILED_STATES:
+                break
+
+        if self.printed or status is None:
+            status = self.snapshot()
+        return dict(status, printed=self.printed)
@@ -0,0 +1,358 @@
+"""
+rfid_backends.py  ─  Reader backends for RFIDService.
+
+RFIDService only uses a small part of adafruit_pn532.  Any object that
+implements these calls can stand in for the reader:
+
+    SAM_configuration()
+    read_passive_target(timeout)                 -> UID bytes or None
+    listen_for_passive_target(timeout)           -> True once InListPassiveTarget is ACKed
+    get_passive_target(timeout)                  -> UID answering the armed search, or None
+    wait_ready(timeout, interval)                -> True when a response frame is waiting
+    abort_command()                              -> cancel a pending command (host ACK frame)
+    mifare_classic_authenticate_block(uid, block_no, key_number, key) -> bool
+    mifare_classic_read_block(block_no)          -> 16 bytes or None
+    mifare_classic_write_block(block_no, data)   -> bool
+
+EVOTING_RFID_BACKEND selects the backend RFIDService.connect() opens:
+
+    pn532   PN532 over I2C (default; Dev Mode when the libraries are missing)
+    sim     SimulatedPN532 below
+
+SimulatedPN532 replays card images (JSON, see save_card_images) and charges
+each command the time a PN532 on a 100 kHz I2C bus takes: frame bytes on
+the wire plus the RF exchange with the card.  It can inject auth failures
+(the card halts, as MIFARE Classic does), halts in the middle of a read and
+transient read errors, so the whole scan path can be exercised and timed
+without hardware.  rfid_loadtest.py drives it with scripted taps.
+
+Sim settings (environment, used when EVOTING_RFID_BACKEND=sim):
+    EVOTING_RFID_SIM_IMAGES      card image JSON file (default: no cards)
+    EVOTING_RFID_SIM_TAP_SECONDS present the cards in turn every N seconds (0: never)
+    EVOTING_RFID_SIM_AUTH_FAIL   probability an auth fails and halts the card
+    EVOTING_RFID_SIM_HALT        probability a block read halts the card
+    EVOTING_RFID_SIM_READ_ERROR  probability a block read fails transiently
+    EVOTING_RFID_SIM_LATENCY     latency scale (1.0 = modelled hardware, 0 = no delays)
+    EVOTING_RFID_SIM_SEED        fault PRNG seed
+"""
+
+import json
+import os
+import random
+import threading
+import time
+
+RFID_BACKEND = os.environ.get("EVOTING_RFID_BACKEND", "pn532").strip().lower()
+BACKENDS = ("pn532", "sim")
+
+BLOCK_SIZE = 16
+
+# I2C at 100 kHz: 8 data bits + ACK per byte.
+I2C_BYTE_SECONDS = 9 / 100_000.0
+# PN532 frame around the command data: preamble, start code, LEN, LCS, TFI, DCS, postamble.
+FRAME_OVERHEAD_BYTES = 8
+ACK_READ_BYTES = 7          # status byte + 6-byte ACK frame
+STATUS_READ_BYTES = 1
+ACK_FRAME_BYTES = 6         # host ACK that aborts a pending command
+
+# Card-side time per command (PN532 <-> card RF exchange), seconds.
+RF_SECONDS = {
+    "sam": 0.002,
+    "detect": 0.006,     # REQA / anticollision / select of a card in the field
+    "auth": 0.004,       # three-pass MIFARE Classic authentication
+    "read": 0.0015,
+    "write": 0.006,
+}
+# Command / response payload sizes (TFI + command code + parameters).
+FRAME_BYTES = {
+    "sam": (5, 2),
+    "detect": (4, 13),
+    "auth": (15, 3),
+    "read": (5, 3 + BLOCK_SIZE),
+    "write": (5 + BLOCK_SIZE, 3),
+}
+
+SIM_HALT_RECOVERY = 0.40    # a halted card answers detection again after this long
+
+
+def _block_to_sector(block_no):
+    # MIFARE Classic 4K: sectors 0-31 have 4 blocks, sectors 32-39 have 16 blocks.
+    if block_no < 128:
+        return block_no // 4
+    return 32 + ((block_no - 128) // 16)
+
+
+def _is_trailer_block(block_no):
+    if block_no < 128:
+        return block_no % 4 == 3
+    return (block_no - 128) % 16 == 15
+
+
+class CardImage:
+    """One MIFARE Classic card: UID plus the contents of the blocks that were recorded."""
+
+    def __init__(self, uid, blocks=None, label=""):
+        self.uid = bytes(uid)
+        self.blocks = {int(block_no): bytes(data) for block_no, data in (blocks or {}).items()}
+        self.label = label or self.uid.hex()
+
+    @classmethod
+    def from_chunks(cls, uid, chunks, start_block=4, label=""):
+        """Lay encode_card_payload() / encode_legacy_payload() chunks out like write_card_payload."""
+        blocks = {}
+        block_no = start_block
+        for chunk in chunks:
+            while _is_trailer_block(block_no):
+                block_no += 1
+            blocks[block_no] = bytes(chunk)
+            block_no += 1
+        return cls(uid, blocks, label)
+
+    def read_block(self, block_no):
+        return self.blocks.get(block_no, b"\x00" * BLOCK_SIZE)
+
+    def to_json(self):
+        return {
+            "label": self.label,
+            "uid": self.uid.hex(),
+            "blocks": {str(block_no): data.hex() for block_no, data in sorted(self.blocks.items())},
+        }
+
+    @classmethod
+    def from_json(cls, obj):
+        return cls(
+            bytes.fromhex(obj["uid"]),
+            {int(block_no): bytes.fromhex(data) for block_no, data in obj.get("blocks", {}).items()},
+            obj.get("label", ""),
+        )
+
+
+def load_card_images(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [CardImage.from_json(obj) for obj in data.get("cards", [])]
+
+
+def save_card_images(path, images):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"cards": [image.to_json() for image in images]}, f, indent=2)
+        f.write("\n")
+
+
+class SimulatedPN532:
+    """
+    In-memory PN532 with one card slot (the RF field).  tap()/remove() move
+    cards in and out of the field; every command sleeps for its modelled
+    I2C + RF time (scaled by latency_scale) and counts into stats.
+    """
+
+    def __init__(self, images=None, latency_scale=1.0, auth_fail_rate=0.0, halt_rate=0.0,
+                 read_error_rate=0.0, seed=None, halt_recovery=SIM_HALT_RECOVERY):
+        self.images = list(images or [])
+        self.latency_scale = max(0.0, float(latency_scale))
+        self.auth_fail_rate = auth_fail_rate
+        self.halt_rate = halt_rate
+        self.read_error_rate = read_error_rate
+        self.halt_recovery = halt_recovery
+        self._rng = random.Random(seed)
+
+        self._field = threading.Condition()
+        self._card = None
+        self._halted_until = 0.0
+        self._selected = False
+        self._auth_sector = None
+        self._listening = False
+        self._tapper = None
+
+        self.stats = {
+            "frames": 0, "status_polls": 0, "detects": 0, "auths": 0, "reads": 0, "writes": 0,
+            "auth_failures": 0, "halts": 0, "read_errors": 0, "aborts": 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        path = os.environ.get("EVOTING_RFID_SIM_IMAGES", "").strip()
+        images = load_card_images(path) if path else []
+        seed = os.environ.get("EVOTING_RFID_SIM_SEED", "").strip()
+        sim = cls(
+            images,
+            latency_scale=float(os.environ.get("EVOTING_RFID_SIM_LATENCY", "1.0")),
+            auth_fail_rate=float(os.environ.get("EVOTING_RFID_SIM_AUTH_FAIL", "0")),
+            halt_rate=float(os.environ.get("EVOTING_RFID_SIM_HALT", "0")),
+            read_error_rate=float(os.environ.get("EVOTING_RFID_SIM_READ_ERROR", "0")),
+            seed=int(seed) if seed else None,
+        )
+        tap_seconds = float(os.environ.get("EVOTING_RFID_SIM_TAP_SECONDS", "0"))
+        if tap_seconds > 0 and images:
+            sim.start_auto_tap(tap_seconds)
+        return sim
+
+    # ------------------------------------------------------------------
+    # Scripting (load test / dev)
+    # ------------------------------------------------------------------
+
+    def tap(self, image):
+        """Put a card in the field (replacing any card already there)."""
+        with self._field:
+            self._card = image
+            self._halted_until = 0.0
+            self._selected = False
+            self._auth_sector = None
+            self._field.notify_all()
+
+    def remove(self):
+        with self._field:
+            self._card = None
+            self._selected = False
+            self._auth_sector = None
+            self._field.notify_all()
+
+    def start_auto_tap(self, interval, dwell=1.5):
+        """Present each image in turn for dwell seconds, one every interval seconds."""
+        def run():
+            index = 0
+            while True:
+                self.tap(self.images[index % len(self.images)])
+                time.sleep(min(dwell, interval))
+                self.remove()
+                time.sleep(max(0.0, interval - dwell))
+                index += 1
+
+        self._tapper = threading.Thread(target=run, name="rfid-sim-tapper", daemon=True)
+        self._tapper.start()
+
+    # ------------------------------------------------------------------
+    # Timing / faults
+    # ------------------------------------------------------------------
+
+    def _sleep(self, seconds):
+        if seconds > 0 and self.latency_scale > 0:
+            time.sleep(seconds * self.latency_scale * self._rng.uniform(0.9, 1.1))
+
+    def _command(self, kind):
+        """Charge one command: write frame, ACK read, RF exchange, response read."""
+        sent, received = FRAME_BYTES[kind]
+        wire_bytes = (sent + FRAME_OVERHEAD_BYTES) + ACK_READ_BYTES + (received + FRAME_OVERHEAD_BYTES + 1)
+        self.stats["frames"] += 1
+        self._sleep(wire_bytes * I2C_BYTE_SECONDS + RF_SECONDS[kind])
+
+    def _roll(self, rate):
+        return rate > 0 and self._rng.random() < rate
+
+    def _halt(self):
+        self._selected = False
+        self._auth_sector = None
+        self._halted_until = time.monotonic() + self.halt_recovery
+        self.stats["halts"] += 1
+
+    def _card_detectable(self):
+        return self._card is not None and time.monotonic() >= self._halted_until
+
+    def _wait_for_card(self, timeout):
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._field:
+            while not self._card_detectable():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wake = remaining
+                if self._card is not None:
+                    wake = min(wake, self._halted_until - time.monotonic())
+                self._field.wait(max(0.001, wake))
+            return True
+
+    def _select(self):
+        self.stats["detects"] += 1
+        self._command("detect")
+        self._selected = True
+        self._auth_sector = None
+        return self._card.uid
+
+    # ------------------------------------------------------------------
+    # Backend interface
+    # ------------------------------------------------------------------
+
+    def SAM_configuration(self):
+        self._command("sam")
+
+    def read_passive_target(self, card_baud=None, timeout=1):
+        self._listening = False
+        if not self._wait_for_card(timeout):
+            self.stats["frames"] += 1
+            return None
+        return self._select()
+
+    def listen_for_passive_target(self, card_baud=None, timeout=1):
+        self.stats["frames"] += 1
+        self._sleep((FRAME_BYTES["detect"][0] + FRAME_OVERHEAD_BYTES + ACK_READ_BYTES) * I2C_BYTE_SECONDS)
+        self._listening = True
+        return True
+
+    def wait_ready(self, timeout=1, interval=0.001):
+        deadline = time.monotonic() + timeout
+        while True:
+            self.stats["status_polls"] += 1
+            self._sleep(STATUS_READ_BYTES * I2C_BYTE_SECONDS)
+            if not self._listening or self._card_detectable():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._field:
+                self._field.wait(min(interval, remaining))
+
+    def get_passive_target(self, timeout=1):
+        if not self._listening or not self._wait_for_card(timeout):
+            return None
+        self._listening = False
+        return self._select()
+
+    def abort_command(self):
+        self.stats["aborts"] += 1
+        self.stats["frames"] += 1
+        self._sleep(ACK_FRAME_BYTES * I2C_BYTE_SECONDS)
+        self._listening = False
+
+    def mifare_classic_authenticate_block(self, uid, block_number, key_number, key):
+        self.stats["auths"] += 1
+        self._command("auth")
+        card = self._card
+        if not self._selected or card is None or card.uid != bytes(uid) or self._roll(self.auth_fail_rate):
+            self.stats["auth_failures"] += 1
+            self._halt()
+            return False
+        self._auth_sector = _block_to_sector(block_number)
+        return True
+
+    def mifare_classic_read_block(self, block_number):
+        self.stats["reads"] += 1
+        self._command("read")
+        card = self._card
+        if card is None or self._auth_sector != _block_to_sector(block_number):
+            return None
+        if self._roll(self.halt_rate):
+            self._halt()
+            return None
+        if self._roll(self.read_error_rate):
+            self.stats["read_errors"] += 1
+            return None
+        return card.read_block(block_number)
+
+    def mifare_classic_write_block(self, block_number, data):
+        self.stats["writes"] += 1
+        self._command("write")
+        card = self._card
+        if card is None or self._auth_sector != _block_to_sector(block_number) or len(data) != BLOCK_SIZE:
+            return False
+        card.blocks[block_number] = bytes(data)
+        return True
+
+
+def create_backend(name=None):
+    """Backend instance for RFIDService.connect(); None means open the PN532 over I2C."""
+    name = (name or RFID_BACKEND)
+    if name == "sim":
+        return SimulatedPN532.from_env()
+    if name != "pn532":
+        print(f"Unknown EVOTING_RFID_BACKEND={name!r}; using pn532.")
+    return None
@@ -0,0 +1,546 @@
+"""
+rfid_daemon.py  ─  RFID reader in its own process.
+
+PN532 I2C traffic and voter-card decryption used to run on a thread inside
+the Tkinter process, competing with the GUI for the GIL; a hung I2C call
+could stall the whole app.  The daemon owns RFIDService + RFIDWorker in a
+separate process and serves one client (the GUI) over a Unix socket
+(multiprocessing.connection, authenticated with a random key written next
+to the socket, mode 0600).  Socket and key live in a private runtime
+directory (EVOTING_RUNTIME_DIR, else $XDG_RUNTIME_DIR/evoting, else
+/run/evoting) that must be owned by this user (or root) with mode 0700;
+both sides refuse to use it otherwise, since anyone who can read the key
+can send pickles to the process holding private.pem.
+
+Protocol (pickled dicts):
+    client → daemon   {"op": "set_mode" | "load_key" | "clear_token_cache" | "status" | "dump_stages"
+                             | "ping" | "write" | "shutdown", "id": n, ...}
+    daemon → client   {"reply": n, "ok": bool, "value" | "error": ...}
+                      {"event": "result", "mode": m, "result": (uid_hex, token)}
+
+RFIDClient is the GUI side.  It exposes the RFIDWorker API (set_mode,
+subscribe, write_card, status_text) plus the RFIDService bits the GUI reads
+(load_key, clear_token_cache, read_latency.text(), read_stages.text()/dump(),
+detect_mode), and reconnects with backoff if the daemon goes away.  With
+spawn=True it starts the daemon itself and restarts it if it dies.
+
+Usage:
+    python rfid_daemon.py [--socket PATH]          # standalone (e.g. its own systemd unit)
+    EVOTING_RFID_DAEMON=spawn python main.py       # GUI starts and supervises the daemon
+    EVOTING_RFID_DAEMON=connect python main.py     # GUI connects to a running daemon
+"""
+
+import argparse
+import itertools
+import os
+import secrets
+import signal
+import stat
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+
+
+def _default_runtime_dir():
+    if os.environ.get("EVOTING_RUNTIME_DIR"):
+        return os.environ["EVOTING_RUNTIME_DIR"]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "evoting")
+    return "/run/evoting"
+
+
+DEFAULT_SOCKET_PATH = os.environ.get("EVOTING_RFID_SOCKET") or os.path.join(_default_runtime_dir(), "rfid.sock")
+DAEMON_MODE = os.environ.get("EVOTING_RFID_DAEMON", "").strip().lower()   # "", "spawn" or "connect"
+
+RPC_TIMEOUT = 5.0
+STATUS_TIMEOUT = 1.0
+# System Status runs on the Tk thread: it shares one status request and waits
+# at most STATUS_WAIT for it, showing the previous reply if the daemon is slow.
+STATUS_WAIT = 0.25
+STATUS_MAX_AGE = 2.0
+RECONNECT_BACKOFF_MAX = 10.0
+
+
+class UnsafeRuntimeDir(PermissionError):
+    pass
+
+
+def authkey_path(socket_path):
+    return socket_path + ".key"
+
+
+def ensure_private_dir(path, create=False):
+    """Raise UnsafeRuntimeDir unless path is a real directory owned by us (or root) with mode 0700."""
+    if create:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise UnsafeRuntimeDir(f"{path} is not a directory")
+    if st.st_uid not in (os.geteuid(), 0):
+        raise UnsafeRuntimeDir(f"{path} is owned by uid {st.st_uid}")
+    if st.st_mode & 0o077:
+        raise UnsafeRuntimeDir(f"{path} has mode {stat.S_IMODE(st.st_mode):o}; expected 700")
+
+
+def _write_authkey(path):
+    key = secrets.token_bytes(32)
+    # Never reuse an existing file: its owner and mode would survive O_TRUNC.
+    _remove_quietly(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def _read_authkey(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Daemon
+# ---------------------------------------------------------------------------
+
+class RFIDDaemon:
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, key_path="private.pem"):
+        from rfid_service import RFIDService
+        from rfid_worker import RFIDWorker
+
+        self.socket_path = socket_path
+        self.service = RFIDService(key_path=key_path)
+        self.worker = RFIDWorker(self.service)
+        self.worker.subscribe(self._on_result)
+
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._stopping = False
+        self._started_at = time.time()
+
+    def _send(self, message):
+        with self._send_lock:
+            if self._conn is None:
+                return False
+            try:
+                self._conn.send(message)
+                return True
+            except (OSError, EOFError, ValueError):
+                return False
+
+    def _on_result(self, mode, result):
+        self._send({"event": "result", "mode": mode, "result": result})
+
+    def status(self):
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self._started_at, 1),
+            "reader_connected": bool(self.service.connected),
+            "detect_mode": self.service.detect_mode,
+            "key_loaded": self.service.private_key is not None,
+            "worker": self.worker.status_text(),
+            "latency": self.service.read_latency.snapshot(),
+            "latency_text": self.service.read_latency.text(),
+            "stages_text": self.service.read_stages.text(),
+        }
+
+    def _reply(self, req_id, fn):
+        try:
+            message = {"reply": req_id, "ok": True, "value": fn()}
+        except Exception as e:
+            message = {"reply": req_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        if req_id is not None:
+            self._send(message)
+
+    def _handle(self, request):
+        op = request.get("op")
+        req_id = request.get("id")
+
+        if op == "set_mode":
+            self._reply(req_id, lambda: self.worker.set_mode(request.get("mode")))
+        elif op == "load_key":
+            self._reply(req_id, self.service.load_key)
+        elif op == "status":
+            self._reply(req_id, self.status)
+        elif op == "clear_token_cache":
+            self._reply(req_id, self.service.clear_token_cache)
+        elif op == "dump_stages":
+            self._reply(req_id, lambda: self.service.read_stages.dump(request["path"]))
+        elif op == "ping":
+            self._reply(req_id, lambda: "pong")
+        elif op == "write":
+            # A write waits for a card; keep serving status/mode requests meanwhile.
+            args = request["args"]
+            future = self.worker.write_card(*args)
+            threading.Thread(
+                target=self._reply, args=(req_id, lambda: future.result(timeout=args[2] + 10)), daemon=True
+            ).start()
+        elif op == "shutdown":
+            self._stopping = True
+            self._reply(req_id, lambda: True)
+        else:
+            def unknown_op():
+                raise ValueError(f"Unknown op {op!r}")
+            self._reply(req_id, unknown_op)
+
+    def _serve(self, conn):
+        while not self._stopping:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break
+            if isinstance(request, dict):
+                self._handle(request)
+
+    def serve_forever(self):
+        ensure_private_dir(os.path.dirname(os.path.abspath(self.socket_path)), create=True)
+        _remove_quietly(self.socket_path)
+        authkey = _write_authkey(authkey_path(self.socket_path))
+        listener = Listener(self.socket_path, family="AF_UNIX", authkey=authkey)
+        os.chmod(self.socket_path, 0o600)
+        self.worker.start()
+        print(f"[rfid-daemon] pid {os.getpid()} listening on {self.socket_path}")
+
+        try:
+            while not self._stopping:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    print("[rfid-daemon] Rejected client with a bad auth key")
+                    continue
+                print("[rfid-daemon] Client connected")
+                with self._send_lock:
+                    self._conn = conn
+                self._serve(conn)
+                # Client gone: stop scanning until the next client sets a mode.
+                self.worker.set_mode(None)
+                with self._send_lock:
+                    self._conn = None
+                conn.close()
+                print("[rfid-daemon] Client disconnected")
+        finally:
+            self.worker.stop()
+            listener.close()
+            _remove_quietly(self.socket_path)
+            _remove_quietly(authkey_path(self.socket_path))
+
+
+# ---------------------------------------------------------------------------
+# Client (GUI process)
+# ---------------------------------------------------------------------------
+
+class _RemoteLatency:
+    """Stands in for RFIDService.read_latency on the GUI side."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def text(self):
+        try:
+            return self._client.display_status()["latency_text"]
+        except Exception as e:
+            return f"daemon unreachable ({e})"
+
+
+class _RemoteStages:
+    """Stands in for RFIDService.read_stages on the GUI side."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def text(self):
+        try:
+            return self._client.display_status()["stages_text"]
+        except Exception as e:
+            return f"daemon unreachable ({e})"
+
+    def dump(self, path):
+        """Entries written, or None if the daemon is still writing them."""
+        future = self._client._request("dump_stages", path=path)
+        try:
+            return future.result(timeout=STATUS_WAIT)
+        except TimeoutError:
+            return None   # the daemon finishes the dump on its own
+
+
+class RFIDClient:
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, spawn=True, key_path="private.pem"):
+        self.socket_path = socket_path
+        self.spawn = spawn
+        self.key_path = key_path
+        self.read_latency = _RemoteLatency(self)
+        self.read_stages = _RemoteStages(self)
+
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._mode = None
+        self._running = False
+        self._thread = None
+        self._process = None
+        self._status_cache = {}
+        self._status_at = None
+        self._status_future = None
+        self._status_lock = threading.Lock()
+        self._preload_key = False
+
+        self.stats = {"reconnects": 0, "daemon_starts": 0}
+
+    # ------------------------------------------------------------------
+    # RFIDService-compatible bits
+    # ------------------------------------------------------------------
+
+    @property
+    def connected(self):
+        return bool(self._status_cache.get("reader_connected"))
+
+    @property
+    def detect_mode(self):
+        return f"{self._status_cache.get('detect_mode', '?')} (daemon)"
+
+    def load_key(self):
+        """Ask the daemon to unlock the card key now rather than on the first tap (non-blocking)."""
+        self._preload_key = True
+        self._request("load_key")   # repeated on every (re)connect
+        return True
+
+    def clear_token_cache(self):
+        self._send({"op": "clear_token_cache"})
+
+    # ------------------------------------------------------------------
+    # RFIDWorker-compatible API
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="rfid-client", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        if self._process is not None:
+            try:
+                self._call("shutdown", timeout=timeout)
+            except Exception:
+                pass
+        self._drop_connection(None)
+        if self._process is not None:
+            try:
+                self._process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self._process.terminate()
+            self._process = None
+
+    def subscribe(self, callback):
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def set_mode(self, mode):
+        # Remembered so a reconnect (or restarted daemon) resumes the same scan.
+        self._mode = mode
+        self._send({"op": "set_mode", "mode": mode})
+
+    @property
+    def mode(self):
+        return self._mode
+
+    def write_card(self, payload, card_format, wait_seconds=20, legacy_layout=False):
+        return self._request("write", args=(payload, card_format, wait_seconds, legacy_layout))
+
+    def status(self, timeout=RPC_TIMEOUT):
+        status = self._call("status", timeout=timeout)
+        self._store_status(status)
+        return status
+
+    def _store_status(self, status):
+        with self._status_lock:
+            self._status_cache = status
+            self._status_at = time.monotonic()
+
+    def _on_status_reply(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self._store_status(future.result())
+
+    def display_status(self):
+        """Status for the GUI thread: blocks at most STATUS_WAIT; falls back to the last reply."""
+        with self._status_lock:
+            if self._status_at is not None and time.monotonic() - self._status_at < STATUS_MAX_AGE:
+                return self._status_cache
+            future = self._status_future
+            if future is None or future.done():
+                future = self._status_future = self._request("status")
+                future.add_done_callback(self._on_status_reply)
+        try:
+            return future.result(timeout=STATUS_WAIT)
+        except Exception as e:
+            with self._status_lock:
+                if self._status_cache:
+                    return self._status_cache
+            if isinstance(e, TimeoutError):
+                raise TimeoutError(f"no status reply within {STATUS_WAIT}s") from None
+            raise
+
+    def status_text(self):
+        try:
+            s = self.display_status()
+        except Exception as e:
+            return f"daemon unreachable ({e})"
+        reader = "connected" if s["reader_connected"] else "disconnected"
+        return f"daemon pid {s['pid']} up {s['uptime_seconds']:.0f}s, reader {reader}, {s['worker']}"
+
+    def restart(self):
+        """Restart the reader process (spawned daemons only); the client reconnects on its own."""
+        try:
+            self._call("shutdown", timeout=STATUS_TIMEOUT)
+        except Exception:
+            if self._process is not None:
+                self._process.terminate()
+
+    # ------------------------------------------------------------------
+    # Connection handling
+    # ------------------------------------------------------------------
+
+    def _send(self, message):
+        with self._send_lock:
+            if self._conn is None:
+                return False
+            try:
+                self._conn.send(message)
+                return True
+            except (OSError, EOFError, ValueError):
+                return False
+
+    def _request(self, op, **fields):
+        future = Future()
+        req_id = next(self._ids)
+        with self._pending_lock:
+            self._pending[req_id] = future
+        if not self._send(dict(fields, op=op, id=req_id)):
+            with self._pending_lock:
+                self._pending.pop(req_id, None)
+            future.set_exception(ConnectionError("RFID daemon not connected"))
+        return future
+
+    def _call(self, op, timeout=RPC_TIMEOUT, **fields):
+        return self._request(op, **fields).result(timeout=timeout)
+
+    def _spawn_daemon(self):
+        if self._process is not None and self._process.poll() is None:
+            return
+        if self._process is not None:
+            print(f"[rfid] Daemon exited with code {self._process.returncode}; restarting")
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rfid_daemon.py")
+        self._process = subprocess.Popen(
+            [sys.executable, script, "--socket", self.socket_path, "--key", self.key_path]
+        )
+        self.stats["daemon_starts"] += 1
+
+    def _connect(self):
+        # Do not hand a key from, or connect through, a directory someone else controls.
+        ensure_private_dir(os.path.dirname(os.path.abspath(self.socket_path)))
+        conn = Client(self.socket_path, family="AF_UNIX", authkey=_read_authkey(authkey_path(self.socket_path)))
+        with self._send_lock:
+            self._conn = conn
+        self.stats["reconnects"] += 1
+        if self._preload_key:
+            self._request("load_key")
+        if self._mode is not None:
+            self._send({"op": "set_mode", "mode": self._mode})
+
+    def _drop_connection(self, reason):
+        with self._send_lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(reason or "RFID client stopped"))
+        if reason and conn is not None:
+            print(f"[rfid] {reason}; reconnecting")
+
+    def _dispatch(self, message):
+        if message.get("event") == "result":
+            with self._subscribers_lock:
+                subscribers = list(self._subscribers)
+            for callback in subscribers:
+                try:
+                    callback(message["mode"], message["result"])
+                except Exception as e:
+                    print(f"[rfid] Subscriber failed: {e}")
+        elif "reply" in message:
+            with self._pending_lock:
+                future = self._pending.pop(message["reply"], None)
+            if future is None or future.done():
+                return
+            if message.get("ok"):
+                future.set_result(message.get("value"))
+            else:
+                future.set_exception(RuntimeError(message.get("error", "RFID daemon error")))
+
+    def _run(self):
+        failures = 0
+        while self._running:
+            if self._conn is None:
+                if self.spawn:
+                    self._spawn_daemon()
+                try:
+                    self._connect()
+                    failures = 0
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if isinstance(e, UnsafeRuntimeDir) and failures == 0:
+                        print(f"[rfid] Refusing to connect: {e}")
+                    failures += 1
+                    time.sleep(min(RECONNECT_BACKOFF_MAX, 0.25 * (2 ** min(failures, 6))))
+                    continue
+
+            try:
+                message = self._conn.recv()
+            except (EOFError, OSError, AttributeError):
+                if self._running:
+                    self._drop_connection("RFID daemon connection lost")
+                continue
+            if isinstance(message, dict):
+                self._dispatch(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the RFID reader as a separate process")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH,
+                        help=f"Unix socket path (default: EVOTING_RFID_SOCKET or {DEFAULT_SOCKET_PATH})")
+    parser.add_argument("--key", default="private.pem", help="Voter card private key (default: private.pem)")
+    args = parser.parse_args()
+
+    # systemd / the supervising client stop us with SIGTERM; exit through the cleanup path.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    RFIDDaemon(args.socket, key_path=args.key).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
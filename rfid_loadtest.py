@@ -0,0 +1,296 @@
+"""Tap-to-session load test for the RFID scan path, no reader needed.
+
+Drives RFIDService + RFIDWorker on the simulated PN532 (rfid_backends.py)
+with scripted taps and times each one:
+
+  tap_to_card     card enters the field -> worker publishes the decrypted token
+  session         token parse + DataHandler.is_token_used (what on_card_scanned
+                  does before the ballot screen)
+  tap_to_session  the two together
+
+Every tap is a fresh voter card holding its own token, encrypted with
+throwaway keys in --format.  After each session the token is logged like a
+cast vote, so tokens.log grows over the run as it does on election day.
+--images replays recorded cards instead (decrypted with this BMD's keys);
+record them on a Pi with a reader using --record.
+
+Faults: --auth-fail / --halt / --read-error are per-command probabilities
+(see SimulatedPN532).  --latency-scale 0 removes the modelled I2C and RF
+time to measure the software path alone.
+
+Usage:
+  python rfid_loadtest.py --taps 1000
+  python rfid_loadtest.py --taps 200 --format rsa-legacy --auth-fail 0.02 --out loadtest.json
+  python rfid_loadtest.py --images cards.json --taps 100
+  python rfid_loadtest.py --record cards.json --label officer   # on the Pi, real reader
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import queue
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from bench_crypto import _percentile, collect_platform_info
+from card_format import (
+    FORMAT_PLAIN_TEXT,
+    CardPayloadAssembler,
+    encode_card_payload,
+    encode_legacy_payload,
+)
+from data_handler import DataHandler
+from rfid_backends import CardImage, SimulatedPN532, load_card_images, save_card_images
+from rfid_service import RFIDService
+from rfid_worker import RFIDWorker
+from write_voter_card import FORMATS, encode_token
+
+
+def build_voter_cards(count, fmt, rsa_public_key, x25519_public_key):
+    public_key = x25519_public_key if fmt == "x25519" else rsa_public_key
+    cards = []
+    for i in range(count):
+        token = {"token_id": f"LOADTEST_{i:05d}", "voter_id": f"VOTER_{i:05d}", "eid_vector": "E1;E2", "booth": 1}
+        token_bytes = json.dumps(token, separators=(",", ":")).encode("utf-8")
+        card_format, payload, legacy_layout = encode_token(token_bytes, fmt, public_key)
+        chunks = encode_legacy_payload(payload) if legacy_layout else encode_card_payload(payload, card_format)
+        uid = (0x4C540000 + i).to_bytes(4, "big")
+        cards.append(CardImage.from_chunks(uid, chunks, label=token["token_id"]))
+    return cards
+
+
+def start_session(data_handler, token_payload):
+    """The token checks on_card_scanned runs before the ballot screen; returns (status, token_id)."""
+    try:
+        data = json.loads(token_payload)
+    except ValueError:
+        return "not_a_token", None
+    if isinstance(data, dict):
+        token_id, eid_vector = data.get("token_id"), data.get("eid_vector")
+    elif isinstance(data, list) and data:
+        token_id, eid_vector = data[0], data[2] if len(data) > 2 else None
+    else:
+        return "not_a_token", None
+    token_id = str(token_id)
+    if data_handler.is_token_used(token_id):
+        return "token_used", token_id
+    if not eid_vector:
+        return "no_elections", token_id
+    return "ok", token_id
+
+
+def _latency_summary(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "min_ms": round(samples[0] * 1000, 3),
+        "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+        "p90_ms": round(_percentile(samples, 90) * 1000, 3),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def run_load(args, cards, svc, sim, work_dir):
+    data_handler = DataHandler(
+        None,
+        log_file=os.path.join(work_dir, "votes.json"),
+        token_log_file=os.path.join(work_dir, "tokens.log"),
+    )
+    results = queue.Queue()
+    worker = RFIDWorker(svc)
+    worker.subscribe(lambda mode, result: results.put((time.perf_counter(), result)))
+    worker.start()
+
+    tap_to_card, session, tap_to_session = [], [], []
+    outcomes = {"ok": 0, "missed": 0, "read_errors": 0}
+    try:
+        for i in range(args.taps):
+            card = cards[i % len(cards)]
+            worker.set_mode("encrypted")
+            tapped_at = time.perf_counter()
+            sim.tap(card)
+
+            deadline = tapped_at + args.dwell
+            token = None
+            while token is None:
+                try:
+                    published_at, result = results.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if result[0] == "error":
+                    outcomes["read_errors"] += 1
+                    continue
+                token = result[1]
+
+            if token is None:
+                outcomes["missed"] += 1
+                worker.set_mode(None)
+            else:
+                session_start = time.perf_counter()
+                status, token_id = start_session(data_handler, token)
+                session_end = time.perf_counter()
+                outcomes[status] = outcomes.get(status, 0) + 1
+                tap_to_card.append(published_at - tapped_at)
+                session.append(session_end - session_start)
+                tap_to_session.append(session_end - tapped_at)
+                if status == "ok":
+                    data_handler.log_token(token)   # the vote is cast; the token is spent
+
+            sim.remove()
+            if args.gap > 0:
+                time.sleep(args.gap)
+    finally:
+        worker.stop()
+
+    return {
+        "outcomes": outcomes,
+        "latency": {
+            "tap_to_card": _latency_summary(tap_to_card),
+            "session": _latency_summary(session),
+            "tap_to_session": _latency_summary(tap_to_session),
+        },
+        "reader": dict(sim.stats),
+        "worker": dict(worker.stats),
+        "read_latency": svc.read_latency.snapshot(),
+        "stages": svc.read_stages.summary(),
+    }
+
+
+def record_card_image(svc, label, wait_seconds=30):
+    """Read the raw blocks of the card on a real reader (payload blocks only) into a CardImage."""
+    deadline = time.time() + wait_seconds
+    uid = None
+    while uid is None and time.time() < deadline:
+        uid = svc._normalize_uid(svc.pn532.read_passive_target(timeout=0.5))
+    if uid is None:
+        raise SystemExit("No RFID card detected.")
+
+    blocks = {}
+    assembler = CardPayloadAssembler()
+    for _, sector_blocks in svc._sector_plan:
+        if not svc._auth_block(uid, sector_blocks[0]):
+            raise SystemExit(f"Auth failed for block {sector_blocks[0]}; lift the card and try again.")
+        for block_no in sector_blocks:
+            data = svc._read_block_in_sector(uid, block_no)
+            if data is None:
+                raise SystemExit(f"Read failed for block {block_no}; lift the card and try again.")
+            blocks[block_no] = data
+            if assembler.feed(data):
+                return CardImage(uid, blocks, label)
+    return CardImage(uid, blocks, label)
+
+
+def record(args):
+    svc = RFIDService()
+    if not svc.connect():
+        raise SystemExit("RFID reader not connected.")
+    images = load_card_images(args.record) if os.path.exists(args.record) else []
+    print("Place the card to record on the reader...")
+    image = record_card_image(svc, args.label or "")
+    images.append(image)
+    save_card_images(args.record, images)
+    print(f"Recorded {image.label} (UID={image.uid.hex()}, {len(image.blocks)} blocks) to {args.record}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated tap-to-session load test for the RFID scan path")
+    parser.add_argument("--taps", type=int, default=1000, help="Number of card taps (default: 1000)")
+    parser.add_argument("--format", choices=FORMATS + ("plain",), default="x25519",
+                        help="Generated voter card format (default: x25519)")
+    parser.add_argument("--images", help="Replay recorded card images instead of generated cards")
+    parser.add_argument("--detect", choices=("listen", "poll"), default="listen",
+                        help="Card detection mode (default: listen)")
+    parser.add_argument("--auth-fail", type=float, default=0.0, help="Auth failure (halt) probability")
+    parser.add_argument("--halt", type=float, default=0.0, help="Halt-during-read probability")
+    parser.add_argument("--read-error", type=float, default=0.0, help="Transient read error probability")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Scale on the modelled I2C/RF time (0: software path only)")
+    parser.add_argument("--dwell", type=float, default=5.0,
+                        help="Seconds a card stays on the reader before it counts as missed (default: 5)")
+    parser.add_argument("--gap", type=float, default=0.05, help="Seconds between taps (default: 0.05)")
+    parser.add_argument("--seed", type=int, default=1234, help="Fault PRNG seed (default: 1234)")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Keep RFIDService console output")
+    parser.add_argument("--record", metavar="PATH",
+                        help="Record the card on the real reader and append it to PATH, then exit")
+    parser.add_argument("--label", help="Label for --record")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args)
+        return
+    if args.taps < 1:
+        raise SystemExit("--taps must be at least 1")
+
+    sim = SimulatedPN532(
+        latency_scale=args.latency_scale, auth_fail_rate=args.auth_fail, halt_rate=args.halt,
+        read_error_rate=args.read_error, seed=args.seed,
+    )
+    svc = RFIDService(backend=sim)
+    svc.detect_mode = args.detect
+
+    if args.images:
+        cards = load_card_images(args.images)
+        if not cards:
+            raise SystemExit(f"No card images in {args.images}")
+    elif args.format == "plain":
+        cards = [
+            CardImage.from_chunks((0x4C540000 + i).to_bytes(4, "big"),
+                                  encode_card_payload(f"PLAIN_{i:05d}".encode("utf-8"), FORMAT_PLAIN_TEXT))
+            for i in range(args.taps)
+        ]
+    else:
+        rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        x25519_key = X25519PrivateKey.generate()
+        svc.private_key = rsa_key
+        svc.card_private_key = x25519_key
+        cards = build_voter_cards(args.taps, args.format, rsa_key.public_key(), x25519_key.public_key())
+
+    console = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as work_dir, console:
+        if not svc.connect():
+            raise SystemExit("Simulated reader did not start.")
+        results = run_load(args, cards, svc, sim, work_dir)
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "platform": collect_platform_info(),
+        "config": {
+            "taps": args.taps,
+            "format": "images" if args.images else args.format,
+            "detect": args.detect,
+            "batched_reads": svc.batched_reads,
+            "auth_fail": args.auth_fail,
+            "halt": args.halt,
+            "read_error": args.read_error,
+            "latency_scale": args.latency_scale,
+            "seed": args.seed,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Load test report written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,28 @@
+import base64
+import contextlib
+import hashlib
+import json
 import time
 import sys
 import os
 import threading
+from collections import Counter, deque
+
+from card_format import (
+    FORMAT_PLAIN_TEXT,
+    FORMAT_RSA_OAEP_RAW,
+    FORMAT_X25519_AESGCM,
+    CardPayloadAssembler,
+    encode_card_payload,
+    encode_legacy_payload,
+)
+from rfid_backends import create_backend
 
 try:
     from cryptography.hazmat.primitives.asymmetric import padding
     from cryptography.hazmat.primitives import hashes
-    from cryptography.hazmat.primitives import serialization
-    import hardware_crypto
+    from key_service import get_key_service
+    from card_crypto import decrypt_card_token_x25519
 except ImportError:
     pass
 
@@ -20,19 +35,310 @@ try:
     HARDWARE_AVAILABLE = True
 except (ImportError, NotImplementedError, AttributeError):
     HARDWARE_AVAILABLE = False
+    MIFARE_CMD_AUTH_B = 0x61   # adafruit_pn532 value; the simulated backend needs it too
+
+try:
+    import RPi.GPIO as GPIO
+    GPIO_AVAILABLE = True
+except (ImportError, RuntimeError):
+    GPIO_AVAILABLE = False
+
+# Stock PN532_I2C sleeps 10 ms between ready polls and every command waits
+# twice (ACK + response), so each MIFARE auth/read costs >= ~20 ms even though
+# the PN532 answers in a few ms.  Poll faster (EVOTING_PN532_POLL_MS=10 is stock).
+PN532_POLL_INTERVAL = max(0.0, float(os.environ.get("EVOTING_PN532_POLL_MS", "1"))) / 1000.0
+BATCHED_READS = os.environ.get("EVOTING_RFID_BATCHED_READS", "1").strip().lower() not in ("0", "false", "no")
+
+# Card detection used by wait_for_card():
+#   irq    - InListPassiveTarget is armed once and the scan thread sleeps on the
+#            PN532 IRQ line (BCM pin EVOTING_PN532_IRQ_PIN) until a card answers.
+#   listen - same command, but the I2C status byte is polled every
+#            EVOTING_PN532_IDLE_POLL_MS (no IRQ wiring needed).
+#   poll   - the original read_passive_target loop.
+#   auto   - irq when the pin is configured and RPi.GPIO is present, else listen.
+DETECT_MODE = os.environ.get("EVOTING_RFID_DETECT", "auto").strip().lower()
+PN532_IRQ_PIN = os.environ.get("EVOTING_PN532_IRQ_PIN", "").strip()
+PN532_IDLE_POLL_INTERVAL = max(1.0, float(os.environ.get("EVOTING_PN532_IDLE_POLL_MS", "25"))) / 1000.0
+RECONNECT_BACKOFF_MAX = 10.0   # seconds between reconnect attempts once the reader keeps failing
+
+# Host ACK frame; sent while a command is pending it aborts that command.
+PN532_ACK_FRAME = b"\x00\x00\xff\x00\xff\x00"
+
+# Card reads kept in RFIDService.read_stages, and the file System Status dumps them to.
+STAGE_LOG_SIZE = max(1, int(os.environ.get("EVOTING_RFID_STAGE_LOG", "200")))
+STAGE_LOG_FILENAME = "rfid_stage_timings.jsonl"
+
+# Decoded voter tokens kept for re-taps of the same card (see DecodedTokenCache).
+TOKEN_CACHE_TTL = max(0.0, float(os.environ.get("EVOTING_RFID_TOKEN_CACHE_SECONDS", "30")))
+TOKEN_CACHE_SIZE = 8
+
+if HARDWARE_AVAILABLE:
+    class _FastPollPN532_I2C(PN532_I2C):
+        def _wait_ready(self, timeout=1, interval=None):
+            interval = PN532_POLL_INTERVAL if interval is None else interval
+            status = bytearray(1)
+            timestamp = time.monotonic()
+            while (time.monotonic() - timestamp) < timeout:
+                try:
+                    with self._i2c:
+                        self._i2c.readinto(status)
+                except OSError:
+                    continue
+                if status == b"\x01":
+                    return True
+                time.sleep(interval)
+            return False
+
+        # rfid_backends interface names for the two private driver calls we use.
+        def wait_ready(self, timeout=1, interval=None):
+            return self._wait_ready(timeout, interval=interval)
+
+        def abort_command(self):
+            self._write_data(PN532_ACK_FRAME)
+
+
+class _IrqLine:
+    """PN532 IRQ pin (active low: a response frame is waiting to be read)."""
+
+    def __init__(self, pin):
+        self.pin = pin
+        self._event = threading.Event()
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        GPIO.add_event_detect(pin, GPIO.FALLING, callback=lambda _channel: self._event.set())
+
+    def asserted(self):
+        return GPIO.input(self.pin) == GPIO.LOW
+
+    def wait(self, timeout):
+        self._event.clear()
+        if self.asserted():
+            return True
+        return self._event.wait(timeout) or self.asserted()
+
+    def close(self):
+        try:
+            GPIO.remove_event_detect(self.pin)
+        except Exception:
+            pass
+
+
+def decrypt_card_ciphertext(private_key, encrypted_bytes):
+    """RSA-OAEP-SHA256 decrypt a card payload made of key-size ciphertext blocks."""
+    key_size = private_key.key_size // 8
+    oaep_padding = padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None
+    )
+    decrypted_parts = []
+    for i in range(0, len(encrypted_bytes), key_size):
+        decrypted_parts.append(private_key.decrypt(encrypted_bytes[i:i + key_size], oaep_padding))
+    return b"".join(decrypted_parts)
+
+
+class ReadLatencyHistogram:
+    """Card-detected to payload-ready latency, bucketed per read path."""
+
+    BUCKETS_MS = (50, 100, 150, 200, 300, 400, 600, 800, 1200, 2000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def record(self, label, seconds):
+        ms = seconds * 1000.0
+        with self._lock:
+            series = self._series.setdefault(label, {
+                "counts": [0] * (len(self.BUCKETS_MS) + 1),
+                "n": 0, "total_ms": 0.0, "min_ms": None, "max_ms": 0.0,
+            })
+            bucket = len(self.BUCKETS_MS)
+            for i, edge in enumerate(self.BUCKETS_MS):
+                if ms <= edge:
+                    bucket = i
+                    break
+            series["counts"][bucket] += 1
+            series["n"] += 1
+            series["total_ms"] += ms
+            series["min_ms"] = ms if series["min_ms"] is None else min(series["min_ms"], ms)
+            series["max_ms"] = max(series["max_ms"], ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                label: dict(series, counts=list(series["counts"]))
+                for label, series in self._series.items()
+            }
+
+    def text(self):
+        snap = self.snapshot()
+        if not snap:
+            return "no card reads yet"
+        lines = []
+        for label in sorted(snap):
+            series = snap[label]
+            mean = series["total_ms"] / series["n"]
+            lines.append(
+                f"{label}: n={series['n']} mean={mean:.0f}ms "
+                f"min={series['min_ms']:.0f}ms max={series['max_ms']:.0f}ms"
+            )
+            edges = [f"<={edge}" for edge in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}"]
+            lines.append("  " + " ".join(
+                f"{edge}:{count}" for edge, count in zip(edges, series["counts"]) if count
+            ))
+        return "\n".join(lines)
+
+
+class ReadStageLog:
+    """
+    Ring buffer of the last STAGE_LOG_SIZE card reads, one entry per tap:
+    milliseconds spent per stage, retry / halt counts and the outcome
+    (ok, error, retry = read again on the next scan, exception).
+
+    Stages: halt_wait (HALT_RECOVERY_DELAY sleeps before the tap), detect
+    (passive target), auth (sector auths incl. retries), read (block
+    reads), base64, decrypt (RSA-OAEP or X25519).
+    """
+
+    STAGES = ("halt_wait", "detect", "auth", "read", "base64", "decrypt")
+    COUNTERS = ("auth_retries", "read_retries", "halts", "cache_hits")
+
+    def __init__(self, size=STAGE_LOG_SIZE):
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=size)
+        self.total_entries = 0
+
+    def new_entry(self, mode, uid_hex):
+        entry = {"at": time.time(), "mode": mode, "uid": uid_hex, "outcome": None}
+        entry["stages"] = {stage: 0.0 for stage in self.STAGES}
+        entry.update((counter, 0) for counter in self.COUNTERS)
+        return entry
+
+    def commit(self, entry):
+        entry["stages"] = {stage: round(ms, 3) for stage, ms in entry["stages"].items()}
+        with self._lock:
+            self._entries.append(entry)
+            self.total_entries += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(entry, stages=dict(entry["stages"])) for entry in self._entries]
+
+    def summary(self):
+        entries = self.snapshot()
+        stages = {}
+        for stage in self.STAGES:
+            values = sorted(entry["stages"][stage] for entry in entries)
+            if values:
+                stages[stage] = {
+                    "mean_ms": round(sum(values) / len(values), 3),
+                    "p90_ms": values[min(len(values) - 1, int(0.9 * len(values)))],
+                    "max_ms": values[-1],
+                }
+        return {
+            "taps": len(entries),
+            "total_taps": self.total_entries,
+            "outcomes": dict(Counter(entry["outcome"] for entry in entries)),
+            "counts": {counter: sum(entry[counter] for entry in entries) for counter in self.COUNTERS},
+            "stages": stages,
+        }
+
+    def text(self):
+        summary = self.summary()
+        if not summary["taps"]:
+            return "no card reads yet"
+        outcomes = ", ".join(f"{name} {n}" for name, n in sorted(summary["outcomes"].items()))
+        counts = summary["counts"]
+        lines = [
+            f"last {summary['taps']} taps: {outcomes}; halts {counts['halts']}, "
+            f"auth retries {counts['auth_retries']}, read retries {counts['read_retries']}, "
+            f"cache hits {counts['cache_hits']}",
+            "mean/p90 ms: " + " ".join(
+                f"{stage} {stats['mean_ms']:.0f}/{stats['p90_ms']:.0f}"
+                for stage, stats in summary["stages"].items()
+            ),
+        ]
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Write the ring to path as JSON lines (oldest first); returns the number of entries."""
+        entries = self.snapshot()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, path)
+        return len(entries)
+
+
+class DecodedTokenCache:
+    """
+    Decrypted voter tokens of recently read cards, so a re-tap skips the
+    RSA / X25519 work.  Keyed by card UID and the SHA-256 of the raw card
+    payload: a rewritten or different card never hits.  Entries expire
+    after TOKEN_CACHE_TTL seconds (0 disables the cache), at most
+    TOKEN_CACHE_SIZE are kept, and the GUI clears the cache when a voter
+    session ends so decrypted tokens do not outlive the session.
+    """
+
+    def __init__(self, ttl=TOKEN_CACHE_TTL, max_entries=TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}   # (uid, payload digest) -> (expires_at, token)
+
+    def _key(self, uid, payload):
+        return bytes(uid), hashlib.sha256(payload).digest()
+
+    def _purge_expired(self, now):
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+    def get(self, uid, payload):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            entry = self._entries.get(self._key(uid, payload))
+            return entry[1] if entry else None
+
+    def put(self, uid, payload, token):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            while len(self._entries) >= self.max_entries:
+                # Dicts keep insertion order: drop the oldest entry.
+                del self._entries[next(iter(self._entries))]
+            self._entries[self._key(uid, payload)] = (now + self.ttl, token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
 
 class RFIDService:
-    def __init__(self, key_path="private.pem"):
+    def __init__(self, key_path="private.pem", card_key_path="card_x25519.pem", backend=None):
         self.pn532 = None
         self.i2c = None
+        # Non-PN532 reader (rfid_backends); None = EVOTING_RFID_BACKEND decides in connect().
+        self.backend = backend
         self.key_path = key_path
+        self.card_key_path = card_key_path
         self.project_dir = os.path.dirname(os.path.abspath(__file__))
         self.private_key = None
+        self.card_private_key = None
         self.connected = False
         
         self.START_BLOCK = 4
         self.MAX_BLOCK_NO = 255
-        self.VOTER_REQUIRED_BLOCKS = 22  # Voter payload is exactly 22 data blocks
+        self.VOTER_REQUIRED_BLOCKS = 22  # Legacy base64 RSA voter payload is exactly 22 data blocks
         self.KEY_DEFAULT = b'\xFF' * 6
 
         # RF cooldown tracking: after a card halts (auth failure), we must wait
@@ -43,6 +349,45 @@ class RFIDService:
         self.HALT_RECOVERY_DELAY = 0.40   # seconds
         self.lock = threading.Lock()
 
+        # Data blocks in card order, grouped per sector (trailers excluded), so
+        # a read authenticates once per sector and never computes layout inline.
+        self.batched_reads = BATCHED_READS
+        self._sector_plan = self._build_sector_plan()
+        self.read_latency = ReadLatencyHistogram()
+        self.read_stages = ReadStageLog()
+        self.token_cache = DecodedTokenCache()
+        self._stage_entry = None        # entry of the tap being read, if any
+        self._pending_halt_wait = 0.0   # halt cooldown slept before the next detected tap
+
+        self.detect_mode = self._resolve_detect_mode()
+        self._irq = None
+        self._listen_armed = False
+        self._last_poll_at = 0.0
+        self._connect_failures = 0
+        self._next_connect_at = 0.0
+
+    def _resolve_detect_mode(self):
+        mode = DETECT_MODE
+        if mode not in ("auto", "irq", "listen", "poll"):
+            print(f"Unknown EVOTING_RFID_DETECT={mode!r}; using auto.")
+            mode = "auto"
+        if mode in ("auto", "irq"):
+            if PN532_IRQ_PIN and GPIO_AVAILABLE:
+                return "irq"
+            if mode == "irq":
+                print("IRQ detection needs EVOTING_PN532_IRQ_PIN and RPi.GPIO; using listen mode.")
+            return "listen"
+        return mode
+
+    def _build_sector_plan(self):
+        plan = []
+        for block_no in self._iter_data_blocks():
+            sector_no = self._block_to_sector(block_no)
+            if not plan or plan[-1][0] != sector_no:
+                plan.append((sector_no, []))
+            plan[-1][1].append(block_no)
+        return plan
+
     def _block_to_sector(self, block_no):
         # MIFARE Classic 4K: sectors 0-31 have 4 blocks, sectors 32-39 have 16 blocks.
         if block_no < 128:
@@ -64,18 +409,31 @@ class RFIDService:
             return False
             
         try:
-            passphrase = hardware_crypto.get_hardware_passphrase()
-            with open(key_path, "rb") as kf:
-                self.private_key = serialization.load_pem_private_key(
-                    kf.read(),
-                    password=passphrase
-                )
+            self.private_key = get_key_service().get_private_key(key_path)
             self.key_path = key_path
             return True
         except Exception as e:
             print(f"Error loading private key: {e}")
             return False
 
+    def load_card_key(self):
+        """Unlock the X25519 key for compact voter cards (card_crypto.py)."""
+        key_path = self.card_key_path
+        if not os.path.isabs(key_path):
+            key_path = os.path.join(self.project_dir, key_path)
+
+        if not os.path.exists(key_path):
+            print(f"Card key file {key_path} not found.")
+            return False
+
+        try:
+            self.card_private_key = get_key_service().get_private_key(key_path)
+            self.card_key_path = key_path
+            return True
+        except Exception as e:
+            print(f"Error loading card key: {e}")
+            return False
+
     def _close_bus(self):
         try:
             if self.i2c and hasattr(self.i2c, "deinit"):
@@ -85,16 +443,22 @@ class RFIDService:
         self.i2c = None
         self.pn532 = None
         self.connected = False
+        self._listen_armed = False
 
     def connect(self):
-        """Attempts to connect to the PN532 reader."""
+        """Attempts to connect to the PN532 reader (or the configured rfid_backends backend)."""
+        if self.connected and self.pn532 is not None:
+            return True
+
+        if self.backend is None:
+            self.backend = create_backend()
+        if self.backend is not None:
+            return self._connect_backend()
+
         if not HARDWARE_AVAILABLE:
             print("RFID Hardware libraries not available (Dev Mode).")
             return False
 
-        if self.connected and self.pn532 is not None:
-            return True
-
         last_error = None
         for attempt in range(1, 4):
             try:
@@ -102,11 +466,12 @@ class RFIDService:
                 # On RPi this uses board.SCL/SDA. On Windows this might fail.
                 self.i2c = busio.I2C(board.SCL, board.SDA)
                 time.sleep(0.15)
-                self.pn532 = PN532_I2C(self.i2c, debug=False)
+                self.pn532 = _FastPollPN532_I2C(self.i2c, debug=False)
                 time.sleep(0.15)
                 self.pn532.SAM_configuration()
                 self.connected = True
-                print("RFID Reader Connected Successfully.")
+                self._setup_irq()
+                print(f"RFID Reader Connected Successfully (detect: {self.detect_mode}).")
                 return True
             except Exception as e:
                 last_error = e
@@ -116,11 +481,135 @@ class RFIDService:
         print(f"RFID Connection Failed after retries: {last_error}")
         return False
 
+    def _connect_backend(self):
+        try:
+            self.backend.SAM_configuration()
+        except Exception as e:
+            print(f"RFID backend {type(self.backend).__name__} failed: {e}")
+            return False
+        if self.detect_mode == "irq":
+            self.detect_mode = "listen"   # no IRQ line off the PN532
+        self.pn532 = self.backend
+        self.connected = True
+        print(f"RFID Reader Connected: {type(self.backend).__name__} (detect: {self.detect_mode}).")
+        return True
+
+    def _setup_irq(self):
+        if self.detect_mode != "irq" or self._irq is not None:
+            return
+        try:
+            self._irq = _IrqLine(int(PN532_IRQ_PIN))
+        except Exception as e:
+            print(f"PN532 IRQ pin {PN532_IRQ_PIN} unavailable ({e}); using listen mode.")
+            self.detect_mode = "listen"
+
+    def _reconnect_with_backoff(self, timeout):
+        """connect(), but back off exponentially (up to RECONNECT_BACKOFF_MAX) while it keeps failing."""
+        wait = self._next_connect_at - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            return False
+        if self.connect():
+            self._connect_failures = 0
+            return True
+        self._connect_failures += 1
+        delay = min(RECONNECT_BACKOFF_MAX, 0.5 * (2 ** (self._connect_failures - 1)))
+        self._next_connect_at = time.monotonic() + delay
+        return False
+
+    def _arm_listen(self):
+        """Send InListPassiveTarget without waiting for its answer; the PN532 searches on its own."""
+        if not self._listen_armed:
+            self._listen_armed = bool(self.pn532.listen_for_passive_target(timeout=0.5))
+        return self._listen_armed
+
+    def _disarm_listen(self):
+        if self._listen_armed and self.pn532 is not None:
+            try:
+                self.pn532.abort_command()
+            except Exception:
+                pass
+        self._listen_armed = False
+
+    def wait_for_card(self, timeout=1.0, poll_interval=0.15):
+        """
+        Block until a card is (probably) in the field or timeout expires.
+        Returns True when the caller should call read_card() now.
+
+        In irq/listen mode InListPassiveTarget stays armed across calls and
+        read_card() collects its answer, so an idle reader costs no I2C
+        traffic (irq) or one status byte per EVOTING_PN532_IDLE_POLL_MS
+        (listen).  In poll mode this only spaces read_card() calls
+        poll_interval apart, like the old scan loops.  While the reader is
+        disconnected it reconnects with backoff and returns False.
+        """
+        if not self.connected or self.pn532 is None:
+            self._reconnect_with_backoff(timeout)
+            return False
+
+        if self.detect_mode == "poll":
+            wait = self._last_poll_at + poll_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(min(wait, timeout))
+            return True
+
+        deadline = time.monotonic() + timeout
+        # Arming while a halted card is still recovering would re-select it.
+        halt_wait = self._last_halt_time + self.HALT_RECOVERY_DELAY - time.monotonic()
+        if halt_wait > 0:
+            halt_wait = min(halt_wait, timeout)
+            time.sleep(halt_wait)
+            self._pending_halt_wait += halt_wait
+
+        try:
+            with self.lock:
+                armed = self.pn532 is not None and self._arm_listen()
+            if not armed:
+                time.sleep(max(0.0, min(0.2, deadline - time.monotonic())))
+                return False
+
+            if self.detect_mode == "irq":
+                return self._irq.wait(max(0.0, deadline - time.monotonic()))
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                with self.lock:
+                    if not self._listen_armed:
+                        return True   # another caller collected the answer
+                    if self.pn532.wait_ready(min(0.25, remaining), interval=PN532_IDLE_POLL_INTERVAL):
+                        return True
+        except Exception as e:
+            print(f"Card detection error: {e}")
+            self._listen_armed = False
+            return False
+
     def is_trailer_block(self, block_no):
         sector_no = self._block_to_sector(block_no)
         sector_first_block, blocks_per_sector = self._sector_layout(sector_no)
         return block_no == (sector_first_block + blocks_per_sector - 1)
 
+    @contextlib.contextmanager
+    def _timed(self, stage):
+        """Add the time spent in the block to the current tap's read_stages entry."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._stage_entry is not None:
+                self._stage_entry["stages"][stage] += (time.perf_counter() - start) * 1000.0
+
+    def _count(self, counter):
+        if self._stage_entry is not None:
+            self._stage_entry[counter] += 1
+
+    def _note_halt(self):
+        # MIFARE Classic halts on auth failure.  Record the halt time so the
+        # next read_card() call waits for the RF cooldown.
+        self._last_halt_time = time.monotonic()
+        self._count("halts")
+
     def _auth_block(self, uid, block_no):
         """Authenticate a single block, retrying only on I2C exceptions.
 
@@ -128,16 +617,18 @@ class RFIDService:
         False return is pointless and confuses the PN532 state machine.
         We only retry when the library raises an exception (transient I2C glitch).
         """
-        for attempt in range(3):
-            try:
-                ok = self.pn532.mifare_classic_authenticate_block(
-                    uid, block_no, MIFARE_CMD_AUTH_B, self.KEY_DEFAULT
-                )
-                return ok  # True → success; False → card halted, stop immediately
-            except Exception:
-                if attempt < 2:
-                    time.sleep(0.05 * (attempt + 1))
-        return False
+        with self._timed("auth"):
+            for attempt in range(3):
+                try:
+                    ok = self.pn532.mifare_classic_authenticate_block(
+                        uid, block_no, MIFARE_CMD_AUTH_B, self.KEY_DEFAULT
+                    )
+                    return ok  # True → success; False → card halted, stop immediately
+                except Exception:
+                    if attempt < 2:
+                        self._count("auth_retries")
+                        time.sleep(0.05 * (attempt + 1))
+            return False
 
     def _iter_data_blocks(self):
         block_no = self.START_BLOCK
@@ -172,12 +663,23 @@ class RFIDService:
                 return None
         return None
 
-    def write_plaintext_card_payload(self, payload_text, wait_seconds=20):
-        """Write plain text payload to card data blocks (null-terminated)."""
+    def clear_token_cache(self):
+        """Drop cached decrypted tokens (called when a voter session ends)."""
+        self.token_cache.clear()
+
+    def write_card_payload(self, payload, card_format=FORMAT_PLAIN_TEXT, wait_seconds=20, legacy_layout=False):
+        """
+        Write payload bytes to card data blocks.  Uses the v2 layout (header
+        block with format, length and CRC32, then the payload); legacy_layout
+        writes the old null-terminated layout for BMDs that cannot read v2.
+        """
         if not self.connected:
             if not self.connect():
                 raise RuntimeError("RFID reader not connected")
 
+        with self.lock:
+            self._disarm_listen()
+
         deadline = time.time() + max(1, int(wait_seconds))
         uid = None
         while time.time() < deadline:
@@ -189,13 +691,10 @@ class RFIDService:
         if uid is None:
             raise RuntimeError("No RFID card detected for writing")
 
-        payload_bytes = (payload_text or "").encode("utf-8") + b"\x00"
-        chunks = []
-        for i in range(0, len(payload_bytes), 16):
-            chunk = payload_bytes[i:i + 16]
-            if len(chunk) < 16:
-                chunk = chunk + (b"\x00" * (16 - len(chunk)))
-            chunks.append(chunk)
+        if legacy_layout:
+            chunks = encode_legacy_payload(payload)
+        else:
+            chunks = encode_card_payload(payload, card_format)
 
         data_blocks = list(self._iter_data_blocks())
         if len(chunks) > len(data_blocks):
@@ -215,24 +714,85 @@ class RFIDService:
 
         return uid.hex()
 
+    def write_plaintext_card_payload(self, payload_text, wait_seconds=20, legacy_layout=False):
+        """Write a plain text payload to card data blocks (v2 layout unless legacy_layout)."""
+        return self.write_card_payload(
+            (payload_text or "").encode("utf-8"), FORMAT_PLAIN_TEXT,
+            wait_seconds=wait_seconds, legacy_layout=legacy_layout
+        )
+
     # ─────────────────────────────────────────────────────────────
     # Internal block-reading helpers
     # ─────────────────────────────────────────────────────────────
 
-    def _read_plain_payload(self, uid, max_data_blocks=10):
+    def _read_block_in_sector(self, uid, block_no):
+        """Read one block of an already-authenticated sector.
+
+        A failed READ is retried once after re-authenticating the sector,
+        instead of skipping the block (a skipped block corrupts the payload
+        and only shows up later as an RSA failure).
         """
-        Read a plain-text (admin/officer) card.
-        Reads blocks until a null terminator is found, up to `max_data_blocks`.
-        Uses _auth_block (3 retries, exponential backoff) per sector.
-        No minimum sector requirement. No decryption.
-        Returns (uid_hex, raw_text) or None.
+        for attempt in range(2):
+            with self._timed("read"):
+                try:
+                    data = self._normalize_block_data(self.pn532.mifare_classic_read_block(block_no))
+                except Exception:
+                    data = None
+            if data is not None and len(data) == 16:
+                return data
+            if attempt == 0:
+                self._count("read_retries")
+                if not self._auth_block(uid, block_no):
+                    return None
+        return None
+
+    def _collect_payload_batched(self, uid, max_data_blocks=None):
+        """
+        Read payload blocks sector by sector from the precomputed sector plan:
+        one auth per sector, then every data block of that sector back to
+        back, until the assembler has the whole payload (v2 header length or
+        legacy null terminator).  MIFARE Classic READ returns 16 bytes per
+        PN532 frame, so blocks cannot be merged into one frame.
+        Returns a CardPayloadAssembler, or None if the card halted / a block
+        was unreadable.
+        """
+        assembler = CardPayloadAssembler()
+        for _, blocks in self._sector_plan:
+            if not self._auth_block(uid, blocks[0]):
+                self._note_halt()
+                print(f"Auth failed for block {blocks[0]}. Card halted — will retry on next scan.")
+                return None
+
+            for block_no in blocks:
+                data = self._read_block_in_sector(uid, block_no)
+                if data is None:
+                    self._note_halt()
+                    print(f"Read failed for block {block_no}. Will retry on next scan.")
+                    return None
+                if assembler.feed(data):
+                    return assembler
+                # A v2 header says exactly how many blocks follow; only legacy
+                # cards fall back to the caller's block cap.
+                limit = assembler.blocks_needed or max_data_blocks
+                if limit is not None and assembler.blocks_fed >= limit:
+                    return assembler
+        return assembler
+
+    def _collect_payload_legacy(self, uid, max_data_blocks=None):
+        """
+        Original block-by-block loop (EVOTING_RFID_BATCHED_READS=0): auth on
+        sector change, skip blocks that fail to read, stop once the assembler
+        has the whole payload.  Returns a CardPayloadAssembler, or None if
+        the card halted.
         """
         block_no = self.START_BLOCK
-        raw_bytes = bytearray()
-        blocks_read = 0
+        assembler = CardPayloadAssembler()
         last_authed_sector = -1
 
-        while block_no <= self.MAX_BLOCK_NO and blocks_read < max_data_blocks:
+        while block_no <= self.MAX_BLOCK_NO:
+            limit = assembler.blocks_needed or max_data_blocks
+            if limit is not None and assembler.blocks_fed >= limit:
+                break
             # Skip trailer blocks
             while self.is_trailer_block(block_no):
                 block_no += 1
@@ -242,15 +802,14 @@ class RFIDService:
             current_sector = self._block_to_sector(block_no)
             if current_sector != last_authed_sector:
                 if not self._auth_block(uid, block_no):
-                    # MIFARE Classic halts on auth failure.  Record the halt time so
-                    # the next read_card() call waits for the RF cooldown.
-                    self._last_halt_time = time.monotonic()
+                    self._note_halt()
                     print(f"Auth failed for block {block_no}. Card halted — will retry on next scan.")
                     return None
                 last_authed_sector = current_sector
 
             try:
-                raw_block = self.pn532.mifare_classic_read_block(block_no)
+                with self._timed("read"):
+                    raw_block = self.pn532.mifare_classic_read_block(block_no)
             except Exception:
                 block_no += 1
                 continue
@@ -260,20 +819,72 @@ class RFIDService:
                 block_no += 1
                 continue
 
-            # Stop at null terminator — plain payloads are null-terminated
-            if b'\x00' in data:
-                raw_bytes.extend(data.split(b'\x00')[0])
+            if assembler.feed(data):
                 break
-            else:
-                raw_bytes.extend(data)
-
-            blocks_read += 1
             block_no += 1
 
-        if not raw_bytes:
+        return assembler
+
+    def _collect_payload(self, uid, max_data_blocks=None):
+        """
+        Returns (card_format, payload_bytes) — card_format is None for a
+        legacy null-terminated card — or None if the card halted or a v2
+        payload came back short / failed its CRC (the scan loop retries).
+        """
+        if self.batched_reads:
+            assembler = self._collect_payload_batched(uid, max_data_blocks)
+        else:
+            assembler = self._collect_payload_legacy(uid, max_data_blocks)
+        if assembler is None:
+            return None
+
+        try:
+            return assembler.result()
+        except ValueError as e:
+            print(f"Card payload rejected ({e}); retrying.")
             return None
 
-        raw_text = raw_bytes.decode('utf-8', errors='ignore').strip()
+    def _payload_text(self, card_format, payload):
+        """Text form of a card payload as v1 callers saw it (binary formats shown as base64)."""
+        if card_format in (FORMAT_RSA_OAEP_RAW, FORMAT_X25519_AESGCM):
+            return base64.b64encode(payload).decode("ascii")
+        return payload.decode('utf-8', errors='ignore').strip()
+
+    def _decrypt_compact_payload(self, uid, payload):
+        """
+        Decrypt a FORMAT_X25519_AESGCM voter card: one X25519 exchange and
+        an AES-GCM open instead of RSA-OAEP per 256-byte block.
+        Returns (uid_hex, decrypted_json_str) or ("error", ...); a missing
+        card key is an error, not a failed read to retry.
+        """
+        if not self.card_private_key:
+            if not self.load_card_key():
+                print("Voter card decryption failed: card key not available.")
+                return ("error", "Card key not available")
+
+        try:
+            with self._timed("decrypt"):
+                decrypted = decrypt_card_token_x25519(self.card_private_key, payload).decode("utf-8")
+        except Exception as e:
+            print(f"Voter card decryption failed: {e!r}")
+            return ("error", "Decryption failed")
+
+        print(f"✅ Compact voter card read success: {decrypted}")
+        return (uid.hex(), decrypted)
+
+    def _read_plain_payload(self, uid, max_data_blocks=10):
+        """
+        Read a plain-text (admin/officer) card.
+        Reads blocks until a null terminator is found, up to `max_data_blocks`.
+        Uses _auth_block (3 retries, exponential backoff) per sector.
+        No minimum sector requirement. No decryption.
+        Returns (uid_hex, raw_text) or None.
+        """
+        collected = self._collect_payload(uid, max_data_blocks)
+        if not collected or not collected[1]:
+            return None
+
+        raw_text = self._payload_text(*collected)
         if not raw_text:
             return None
 
@@ -283,66 +894,46 @@ class RFIDService:
     def _read_encrypted_payload(self, uid):
         """
         Read an encrypted voter card.
-        Reads blocks until a null terminator is found, collecting ALL bytes
-        (same stop-on-null approach as the original working code).
+        v2 cards are read to exactly the header length and CRC-checked, so a
+        truncated read is retried before any RSA work.  Legacy cards are read
+        until a null terminator is found (the original stop-on-null approach).
         NO sector-count enforcement — RSA decryption is the security guarantee.
-        Uses _auth_block (3 retries, exponential backoff) per sector.
+        Uses _auth_block (3 retries, exponential backoff) once per sector.
         Returns (uid_hex, decrypted_json_str) or None.
         """
-        block_no = self.START_BLOCK
-        raw_bytes = bytearray()
-        read_blocks = 0
-        last_authed_sector = -1
-
-        while block_no <= self.MAX_BLOCK_NO:
-            # Skip trailer blocks
-            while self.is_trailer_block(block_no):
-                block_no += 1
-            if block_no > self.MAX_BLOCK_NO:
-                break
-
-            current_sector = self._block_to_sector(block_no)
-            if current_sector != last_authed_sector:
-                if not self._auth_block(uid, block_no):
-                    self._last_halt_time = time.monotonic()
-                    print(f"Auth failed for block {block_no}. Card halted — will retry on next scan.")
-                    return None
-                last_authed_sector = current_sector
-
-            try:
-                raw_block = self.pn532.mifare_classic_read_block(block_no)
-            except Exception:
-                block_no += 1
-                continue
-
-            data = self._normalize_block_data(raw_block)
-            if data is None:
-                block_no += 1
-                continue
-
-            read_blocks += 1
-
-            # The base64-encoded ciphertext ends with MIFARE null padding.
-            # Stop on the first null byte — same approach as original working code.
-            if b'\x00' in data:
-                raw_bytes.extend(data.split(b'\x00')[0])
-                break
-            else:
-                raw_bytes.extend(data)
-
-            block_no += 1
+        collected = self._collect_payload(uid)
+        if collected is None:
+            return None
+        card_format, payload = collected
 
         # NOTE: No block-count minimum check here.  RSA-OAEP decryption failure
-        # is the security gate — spurious short reads are rejected at decrypt time.
+        # is the security gate for legacy cards — their short reads are only
+        # rejected at decrypt time.
 
-        if not raw_bytes:
+        if not payload:
             print("Encrypted card read: no data collected.")
             return None
 
-        raw_text = raw_bytes.decode('utf-8', errors='ignore').strip()
+        raw_text = self._payload_text(card_format, payload)
         if not raw_text:
             return None
 
+        if card_format == FORMAT_PLAIN_TEXT:
+            print(f"✅ Plain card on voter loop: {raw_text}")
+            return (uid.hex(), raw_text)
+
+        cached = self.token_cache.get(uid, payload)
+        if cached is not None:
+            self._count("cache_hits")
+            print("✅ Voter card re-tap: token from cache, decryption skipped.")
+            return (uid.hex(), cached)
+
+        if card_format == FORMAT_X25519_AESGCM:
+            res = self._decrypt_compact_payload(uid, payload)
+            if res and res[0] != "error":
+                self.token_cache.put(uid, payload, res[1])
+            return res
+
         # Load private key if not already loaded
         if not self.private_key:
             if not self.load_key():
@@ -350,20 +941,23 @@ class RFIDService:
                 return None
 
         try:
-            import base64
-            compact = "".join(raw_text.split())
-
-            # Quick sanity check: ciphertext must look like base64 and be long enough
-            # for RSA-2048 OAEP output (~344 base64 chars). If it's short/plain text
-            # (e.g. officer phrase card scanned on voter loop), return as plain so
-            # on_card_scanned can route it to the officer menu.
-            base64_chars = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=")
-            if len(compact) < 128 or not all(ch in base64_chars for ch in compact):
-                print(f"✅ Plain card on voter loop (not ciphertext): {raw_text}")
-                return (uid.hex(), raw_text)
+            if card_format == FORMAT_RSA_OAEP_RAW:
+                encrypted_bytes = payload
+            else:
+                compact = "".join(raw_text.split())
+
+                # Quick sanity check: ciphertext must look like base64 and be long enough
+                # for RSA-2048 OAEP output (~344 base64 chars). If it's short/plain text
+                # (e.g. officer phrase card scanned on voter loop), return as plain so
+                # on_card_scanned can route it to the officer menu.
+                base64_chars = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=")
+                if len(compact) < 128 or not all(ch in base64_chars for ch in compact):
+                    print(f"✅ Plain card on voter loop (not ciphertext): {raw_text}")
+                    return (uid.hex(), raw_text)
 
-            compact += "=" * ((4 - len(compact) % 4) % 4)
-            encrypted_bytes = base64.b64decode(compact)
+                compact += "=" * ((4 - len(compact) % 4) % 4)
+                with self._timed("base64"):
+                    encrypted_bytes = base64.b64decode(compact)
 
             key_size = self.private_key.key_size // 8  # 256 for RSA-2048
             if len(encrypted_bytes) == 0 or len(encrypted_bytes) % key_size != 0:
@@ -372,17 +966,8 @@ class RFIDService:
                 print(f"Partial read ({len(encrypted_bytes)} bytes); retrying.")
                 return None
 
-            oaep_padding = padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-            decrypted_parts = []
-            for i in range(0, len(encrypted_bytes), key_size):
-                decrypted_parts.append(
-                    self.private_key.decrypt(encrypted_bytes[i:i + key_size], oaep_padding)
-                )
-            decrypted = b"".join(decrypted_parts).decode("utf-8")
+            with self._timed("decrypt"):
+                decrypted = decrypt_card_ciphertext(self.private_key, encrypted_bytes).decode("utf-8")
         except Exception as e:
             print(f"Voter card decryption failed: {e}")
             # If decryption failed but we have readable text, return it as plain so
@@ -392,8 +977,9 @@ class RFIDService:
                 return (uid.hex(), raw_text)
             return ("error", "Decryption failed")
 
+        self.token_cache.put(uid, payload, decrypted)
+
         try:
-            import json
             token_data = json.loads(decrypted)
             print("\n✅ Voter card read success! Data:")
             print("-----------------------------")
@@ -408,103 +994,56 @@ class RFIDService:
     def _read_auto_payload(self, uid, min_required_sectors, min_required_blocks):
         """
         Legacy auto-detect mode: reads blocks, then decides between plain and
-        encrypted via a base64 heuristic. Kept for backward compatibility only.
+        encrypted from the v2 header format, or via a base64 heuristic for
+        legacy cards. Kept for backward compatibility only.
         """
-        required_blocks = 1 if min_required_blocks is None else int(min_required_blocks)
-        if required_blocks < 1:
-            required_blocks = 1
-
-        block_no = self.START_BLOCK
-        raw_bytes = bytearray()
-        read_sectors = set()
-        read_blocks = 0
-        last_authed_sector = -1
-        payload_complete = False
-
-        while block_no <= self.MAX_BLOCK_NO:
-            while self.is_trailer_block(block_no):
-                block_no += 1
-            if block_no > self.MAX_BLOCK_NO:
-                break
-
-            current_sector = self._block_to_sector(block_no)
-            if current_sector != last_authed_sector:
-                if not self._auth_block(uid, block_no):
-                    self._last_halt_time = time.monotonic()
-                    print(f"Auth failed for block {block_no}. Card halted — will retry on next scan.")
-                    return None
-                last_authed_sector = current_sector
-
-            try:
-                raw_block = self.pn532.mifare_classic_read_block(block_no)
-            except Exception:
-                block_no += 1
-                continue
-
-            data = self._normalize_block_data(raw_block)
-            if data is None:
-                block_no += 1
-                continue
-
-            read_sectors.add(self._block_to_sector(block_no))
-            read_blocks += 1
-
-            if not payload_complete:
-                if b'\x00' in data:
-                    raw_bytes.extend(data.split(b'\x00')[0])
-                    payload_complete = True
-                else:
-                    raw_bytes.extend(data)
-
-            if payload_complete:
-                break
-
-            block_no += 1
-
-        if not raw_bytes:
+        collected = self._collect_payload(uid)
+        if not collected or not collected[1]:
             return None
+        card_format, payload = collected
 
-        raw_text = raw_bytes.decode('utf-8', errors='ignore').strip()
+        raw_text = self._payload_text(card_format, payload)
         if not raw_text:
             return None
 
         # Heuristic: if it looks like base64 ciphertext → try to decrypt
         compact = "".join(raw_text.split())
-        base64_chars = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=")
-        looks_like_base64_ciphertext = (
-            len(compact) >= 128
-            and len(compact) % 4 == 0
-            and all(ch in base64_chars for ch in compact)
-        )
+        if card_format is not None:
+            looks_like_base64_ciphertext = card_format != FORMAT_PLAIN_TEXT
+        else:
+            base64_chars = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=")
+            looks_like_base64_ciphertext = (
+                len(compact) >= 128
+                and len(compact) % 4 == 0
+                and all(ch in base64_chars for ch in compact)
+            )
 
         if not looks_like_base64_ciphertext:
             print(f"✅ Card Read Success! Plain payload: {raw_text}")
             return (uid.hex(), raw_text)
 
+        if card_format == FORMAT_X25519_AESGCM:
+            res = self._decrypt_compact_payload(uid, payload)
+            return res if res and res[0] != "error" else None
+
         if not self.private_key:
             if not self.load_key():
                 return None
 
         try:
-            import base64
-            encrypted_bytes = base64.b64decode(compact)
+            if card_format == FORMAT_RSA_OAEP_RAW:
+                encrypted_bytes = payload
+            else:
+                with self._timed("base64"):
+                    encrypted_bytes = base64.b64decode(compact)
 
             key_size = self.private_key.key_size // 8
             if len(encrypted_bytes) == 0 or len(encrypted_bytes) % key_size != 0:
                 print(f"Partial read ({len(encrypted_bytes)} bytes); retrying.")
                 return None
 
-            oaep_padding = padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-            decrypted_parts = []
-            for i in range(0, len(encrypted_bytes), key_size):
-                decrypted_parts.append(
-                    self.private_key.decrypt(encrypted_bytes[i:i + key_size], oaep_padding)
-                )
-            decrypted = b"".join(decrypted_parts).decode("utf-8")
+            with self._timed("decrypt"):
+                decrypted = decrypt_card_ciphertext(self.private_key, encrypted_bytes).decode("utf-8")
         except Exception as e:
             print(f"Decryption failed: {e}")
             # Fallback: return as plain text
@@ -517,7 +1056,6 @@ class RFIDService:
             return None
 
         try:
-            import json
             token_data = json.loads(decrypted)
             print("\n✅ Card Read Success! Data:")
             print("-----------------------------")
@@ -542,7 +1080,8 @@ class RFIDService:
         mode : str
             'plain'     – Admin/officer card. Plain-text payload, no decryption.
                           Reads until null terminator; no minimum sector requirement.
-            'encrypted' – Voter card. RSA-encrypted payload across 22 data blocks.
+            'encrypted' – Voter card. RSA-encrypted payload (legacy cards: 22 data
+                          blocks of base64; v2 cards: length-prefixed, CRC-checked).
                           Enforces MIN_REQUIRED_SECTORS and VOTER_REQUIRED_BLOCKS,
                           then decrypts with the hardware-bound private key.
             'auto'      – Legacy heuristic: auto-detect by base64 inspection.
@@ -556,7 +1095,10 @@ class RFIDService:
             return None
 
         with self.lock:
-            return self._read_card_locked(mode, min_required_sectors, min_required_blocks)
+            try:
+                return self._read_card_locked(mode, min_required_sectors, min_required_blocks)
+            finally:
+                self._last_poll_at = time.monotonic()
 
     def _read_card_locked(self, mode, min_required_sectors, min_required_blocks):
         # ── RF Halt-Recovery Cooldown ─────────────────────────────────────────
@@ -568,14 +1110,29 @@ class RFIDService:
         if elapsed_since_halt < self.HALT_RECOVERY_DELAY:
             remaining = self.HALT_RECOVERY_DELAY - elapsed_since_halt
             time.sleep(remaining)
+            self._pending_halt_wait += remaining
 
+        entry = None
         try:
-            raw_uid = self.pn532.read_passive_target(timeout=0.5)
+            detect_start = time.perf_counter()
+            if self._listen_armed:
+                # wait_for_card() already sent InListPassiveTarget; collect its answer.
+                raw_uid = self.pn532.get_passive_target(timeout=0.5)
+                if raw_uid is not None:
+                    self._listen_armed = False
+            else:
+                raw_uid = self.pn532.read_passive_target(timeout=0.5)
             uid = self._normalize_uid(raw_uid)
             if uid is None:
                 return None
 
             print(f"Card Detected: {list(uid)}")
+            detected_at = time.perf_counter()
+            entry = self.read_stages.new_entry(mode, uid.hex())
+            entry["stages"]["halt_wait"] = self._pending_halt_wait * 1000.0
+            entry["stages"]["detect"] = (detected_at - detect_start) * 1000.0
+            self._pending_halt_wait = 0.0
+            self._stage_entry = entry
 
             if mode == 'plain':
                 res = self._read_plain_payload(uid, max_data_blocks=12)
@@ -588,16 +1145,28 @@ class RFIDService:
             if res is None:
                 # Return None (not an ERROR tuple) so that scan loops treat this
                 # the same as "no card yet" and simply retry after a short sleep.
+                entry["outcome"] = "retry"
                 return None
+            entry["outcome"] = "error" if res[0] == "error" else "ok"
+            if res[0] != "error":
+                path = "batched" if self.batched_reads else "legacy"
+                self.read_latency.record(f"{mode}/{path}", time.perf_counter() - detected_at)
             return res
 
         except Exception as e:
             print(f"Error reading card: {e}")
+            if entry is not None:
+                entry["outcome"] = "exception"
+            self._disarm_listen()
             # Recover from transient PN532/I2C glitches by forcing reconnect.
             if "NoneType" in str(e) or "unexpected command" in str(e).lower():
                 self.connected = False
                 self.pn532 = None
             return None
+        finally:
+            if entry is not None:
+                self._stage_entry = None
+                self.read_stages.commit(entry)
 
 
 
@@ -0,0 +1,182 @@
+"""
+rfid_worker.py  ─  Single thread that owns the RFID reader.
+
+The GUI used to start a voter scan thread (encrypted mode), an officer scan
+thread (plain mode) and a third thread for the Polling Officer button, each
+with its own reconnect / retry loop, all contending for RFIDService.lock and
+the I2C bus.  RFIDWorker runs one loop instead and takes commands through a
+queue:
+
+    set_mode("encrypted")   scan for a voter card
+    set_mode("plain")       scan for an officer card
+    set_mode(None)          stop scanning (reader idle)
+    write_card(...)         write a card between scans, returns a Future
+
+Scan results are published to every subscriber as callback(mode, result) on
+the worker thread.  A scan is one-shot like the old loops: after a card is
+read the worker goes idle until the next set_mode(); an ("error", ...)
+result is published but scanning continues.
+
+Usage:
+    worker = RFIDWorker(rfid_service)
+    worker.subscribe(lambda mode, result: results.put(result))
+    worker.start()
+    worker.set_mode("encrypted")
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+SCAN_MODES = ("encrypted", "plain")
+
+# Seconds between read_card() calls in poll detection mode (the old loop sleeps).
+POLL_INTERVALS = {"encrypted": 0.15, "plain": 0.5}
+
+# wait_for_card() slice; bounds how long a mode switch or write waits for the loop.
+COMMAND_CHECK_INTERVAL = 0.25
+
+
+class RFIDWorker:
+    def __init__(self, rfid_service, poll_intervals=None):
+        self.rfid_service = rfid_service
+        self.poll_intervals = dict(POLL_INTERVALS, **(poll_intervals or {}))
+
+        self._commands = queue.Queue()
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._mode = None
+        self._thread = None
+        self._running = False
+
+        self.stats = {"reads": 0, "results": 0, "errors": 0, "writes": 0}
+
+    # ------------------------------------------------------------------
+    # Public API (any thread)
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="rfid-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        self._commands.put(("stop",))
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def subscribe(self, callback):
+        """callback(mode, result) is called on the worker thread for every scan result."""
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def set_mode(self, mode):
+        """Scan for 'encrypted' (voter) or 'plain' (officer) cards, or None to idle."""
+        if mode is not None and mode not in SCAN_MODES:
+            raise ValueError(f"Unknown RFID scan mode {mode!r}")
+        self._commands.put(("mode", mode))
+
+    @property
+    def mode(self):
+        return self._mode
+
+    def write_card(self, payload, card_format, wait_seconds=20, legacy_layout=False):
+        """Queue a card write; the Future resolves to the UID hex or raises the write error."""
+        future = Future()
+        self._commands.put(("write", (payload, card_format, wait_seconds, legacy_layout), future))
+        return future
+
+    def status_text(self):
+        return (
+            f"{self._mode or 'idle'}, {self.stats['reads']} read(s), "
+            f"{self.stats['results']} result(s), {self.stats['errors']} error(s)"
+        )
+
+    # ------------------------------------------------------------------
+    # Worker thread
+    # ------------------------------------------------------------------
+
+    def _handle_command(self, command):
+        kind = command[0]
+        if kind == "stop":
+            self._running = False
+        elif kind == "mode":
+            self._mode = command[1]
+        elif kind == "write":
+            payload, card_format, wait_seconds, legacy_layout = command[1]
+            future = command[2]
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                uid_hex = self.rfid_service.write_card_payload(
+                    payload, card_format, wait_seconds=wait_seconds, legacy_layout=legacy_layout
+                )
+                self.stats["writes"] += 1
+                future.set_result(uid_hex)
+            except Exception as e:
+                future.set_exception(e)
+
+    def _drain_commands(self, block):
+        try:
+            command = self._commands.get(block=block)
+        except queue.Empty:
+            return
+        self._handle_command(command)
+        while True:
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            self._handle_command(command)
+
+    def _publish(self, mode, result):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(mode, result)
+            except Exception as e:
+                print(f"[rfid] Subscriber failed: {e}")
+
+    def _run(self):
+        while self._running:
+            # Idle: sleep on the command queue instead of touching the reader.
+            self._drain_commands(block=self._mode is None)
+            mode = self._mode
+            if not self._running or mode is None:
+                continue
+
+            try:
+                if not self.rfid_service.wait_for_card(
+                    timeout=COMMAND_CHECK_INTERVAL, poll_interval=self.poll_intervals[mode]
+                ):
+                    continue
+                if not self._commands.empty():
+                    continue   # mode switch / write queued while waiting; handle it first
+                result = self.rfid_service.read_card(mode=mode)
+            except Exception as e:
+                print(f"[rfid] Scan failed: {e}")
+                time.sleep(0.5)
+                continue
+
+            self.stats["reads"] += 1
+            if not result:
+                continue
+
+            if result[0] == "error":
+                self.stats["errors"] += 1
+            else:
+                self.stats["results"] += 1
+                self._mode = None
+            self._publish(mode, result)
@@ -0,0 +1,358 @@
+"""
+shadow_export.py  ─  Incremental encrypted copy of the vote and token logs.
+
+End-of-election export used to encrypt votes.json and tokens.log in one go
+while the officer waited, so close-of-poll time grew with turnout.
+ShadowExporter keeps an encrypted copy of each log on the LOGS partition as
+it is written:
+
+    <log_dir>/shadow_export/<log name>.<start offset>.open   segment being extended
+    <log_dir>/shadow_export/<log name>.<start offset>.enc    closed segment
+
+Each segment is a chunked_aead stream holding the log bytes from
+<start offset> onwards.  New bytes are appended as non-final records after
+every save_json/log_token; a segment is closed (final record + rename) once
+it passes SEGMENT_MAX_BYTES.  At end of election finalize() only encrypts the
+last delta and closes the open segments; ExportService copies the segment
+files to the USB stick unchanged.
+
+No state file is kept: after a restart the covered offset of every log is
+recovered by scanning the segments, dropping any half-written record.
+
+Usage:
+    shadow = ShadowExporter(log_dir, [votes_log, tokens_log], aes_key)
+    shadow.start()
+    shadow.notify()          # after each log append
+    segments = shadow.finalize()
+"""
+
+import hashlib
+import os
+import re
+import struct
+import threading
+import time
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from chunked_aead import (
+    DEFAULT_CHUNK_SIZE,
+    NONCE_SIZE,
+    TAG_SIZE,
+    build_stream_header,
+    derive_chunk_nonce,
+    read_stream_header,
+    read_stream_record,
+    stream_aad,
+)
+
+SHADOW_DIR_NAME = "shadow_export"
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+SYNC_DEBOUNCE_SECONDS = 0.5
+SYNC_INTERVAL_SECONDS = 30.0
+
+SEGMENT_NAME_RE = re.compile(r"^(?P<name>.+)\.(?P<start>\d{12})\.(?P<state>open|enc)$")
+
+
+def key_id(aes_key):
+    """Short fingerprint used to check the shadow copy matches the export key."""
+    return hashlib.sha256(aes_key).hexdigest()[:16]
+
+
+class _Segment:
+    def __init__(self, path, start, header, nonce_base, next_index=0, plaintext_bytes=0):
+        self.path = path
+        self.start = start
+        self.header = header
+        self.nonce_base = nonce_base
+        self.next_index = next_index
+        self.plaintext_bytes = plaintext_bytes
+
+
+class ShadowExporter:
+    def __init__(self, log_dir, source_paths, aes_key,
+                 chunk_size=DEFAULT_CHUNK_SIZE, segment_bytes=SEGMENT_MAX_BYTES):
+        self.shadow_dir = os.path.join(log_dir, SHADOW_DIR_NAME)
+        self.source_paths = [os.path.abspath(p) for p in source_paths]
+        self.aes_key = aes_key
+        self.key_id = key_id(aes_key)
+        self.chunk_size = chunk_size
+        self.segment_bytes = segment_bytes
+
+        self._aesgcm = AESGCM(aes_key)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._finalized = False
+        self._thread = None
+
+        # Per source path: covered plaintext offset, open segment, closed segment paths.
+        self._offsets = {}
+        self._open = {}
+        self._closed = {}
+        self.last_sync_seconds = None
+
+        os.makedirs(self.shadow_dir, exist_ok=True)
+        for path in self.source_paths:
+            self._recover(path)
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+
+    def _segment_files(self, source_path):
+        name = os.path.basename(source_path)
+        found = []
+        for entry in os.listdir(self.shadow_dir):
+            match = SEGMENT_NAME_RE.match(entry)
+            if match and match.group("name") == name:
+                found.append((int(match.group("start")), match.group("state"), os.path.join(self.shadow_dir, entry)))
+        return sorted(found)
+
+    def _scan_segment(self, path):
+        """Return (header_info, record_count, plaintext_bytes, last_record, good_end_offset)."""
+        with open(path, "rb") as f:
+            info = read_stream_header(f)
+            max_record = info["chunk_size"] + TAG_SIZE
+            count = 0
+            plaintext_bytes = 0
+            last_record = None
+            good_end = f.tell()
+            while True:
+                try:
+                    record = read_stream_record(f, max_record)
+                except ValueError:
+                    break   # half-written record from a power cut
+                if record is None:
+                    break
+                count += 1
+                plaintext_bytes += len(record) - TAG_SIZE
+                last_record = record
+                good_end = f.tell()
+        return info, count, plaintext_bytes, last_record, good_end
+
+    def _is_final_record(self, info, index, record):
+        """True/False for the record's final flag; raises InvalidTag for a foreign key."""
+        nonce = derive_chunk_nonce(info["nonce"], index)
+        try:
+            self._aesgcm.decrypt(nonce, record, stream_aad(info["header"], index, True))
+            return True
+        except InvalidTag:
+            self._aesgcm.decrypt(nonce, record, stream_aad(info["header"], index, False))
+            return False
+
+    def _discard(self, source_path, reason):
+        print(f"[shadow] Discarding shadow copy of {os.path.basename(source_path)}: {reason}")
+        for _, _, path in self._segment_files(source_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._offsets[source_path] = 0
+        self._open.pop(source_path, None)
+        self._closed[source_path] = []
+
+    def _recover(self, source_path):
+        self._offsets[source_path] = 0
+        self._closed[source_path] = []
+        expected_start = 0
+
+        for start, state, path in self._segment_files(source_path):
+            if start != expected_start:
+                self._discard(source_path, f"segment gap at offset {expected_start}")
+                return
+            try:
+                info, count, plaintext_bytes, last_record, good_end = self._scan_segment(path)
+                final = count > 0 and self._is_final_record(info, count - 1, last_record)
+            except InvalidTag:
+                self._discard(source_path, "segments were written with a different AES key")
+                return
+            except ValueError:
+                if state == "open":
+                    os.remove(path)   # header never fully written
+                    continue
+                self._discard(source_path, f"unreadable segment {os.path.basename(path)}")
+                return
+
+            if state == "enc" and not final:
+                self._discard(source_path, f"closed segment {os.path.basename(path)} is truncated")
+                return
+
+            if os.path.getsize(path) != good_end:
+                with open(path, "r+b") as f:
+                    f.truncate(good_end)
+
+            if state == "open" and final:
+                # Crashed between writing the final record and the rename.
+                closed_path = path[:-len(".open")] + ".enc"
+                os.replace(path, closed_path)
+                path, state = closed_path, "enc"
+
+            if state == "enc":
+                self._closed[source_path].append(path)
+            else:
+                self._open[source_path] = _Segment(
+                    path, start, info["header"], info["nonce"], count, plaintext_bytes
+                )
+            expected_start = start + plaintext_bytes
+
+        self._offsets[source_path] = expected_start
+        if expected_start:
+            print(f"[shadow] {os.path.basename(source_path)}: resumed at byte {expected_start}")
+
+    # ------------------------------------------------------------------
+    # Segment writing
+    # ------------------------------------------------------------------
+
+    def _new_segment(self, source_path, start):
+        name = os.path.basename(source_path)
+        path = os.path.join(self.shadow_dir, f"{name}.{start:012d}.open")
+        nonce_base = os.urandom(NONCE_SIZE)
+        header = build_stream_header(nonce_base, self.chunk_size, f"{name}@{start}")
+        with open(path, "wb") as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        segment = _Segment(path, start, header, nonce_base)
+        self._open[source_path] = segment
+        return segment
+
+    def _write_record(self, f, segment, data, final):
+        ciphertext = self._aesgcm.encrypt(
+            derive_chunk_nonce(segment.nonce_base, segment.next_index),
+            data,
+            stream_aad(segment.header, segment.next_index, final)
+        )
+        f.write(struct.pack(">I", len(ciphertext)))
+        f.write(ciphertext)
+        segment.next_index += 1
+        segment.plaintext_bytes += len(data)
+
+    def _close_segment(self, source_path):
+        segment = self._open.pop(source_path, None)
+        if segment is None:
+            return
+        with open(segment.path, "ab") as f:
+            self._write_record(f, segment, b"", final=True)
+            f.flush()
+            os.fsync(f.fileno())
+        closed_path = segment.path[:-len(".open")] + ".enc"
+        os.replace(segment.path, closed_path)
+        self._closed[source_path].append(closed_path)
+
+    def _sync_source(self, source_path):
+        if not os.path.exists(source_path):
+            return 0
+
+        size = os.path.getsize(source_path)
+        offset = self._offsets[source_path]
+        if size < offset:
+            self._discard(source_path, f"log shrank from {offset} to {size} bytes")
+            offset = 0
+        if size == offset:
+            return 0
+
+        written = 0
+        with open(source_path, "rb") as src:
+            src.seek(offset)
+            while offset < size:
+                segment = self._open.get(source_path)
+                if segment is not None and segment.plaintext_bytes >= self.segment_bytes:
+                    self._close_segment(source_path)
+                    segment = None
+                segment = segment or self._new_segment(source_path, offset)
+                room = self.segment_bytes - segment.plaintext_bytes
+                with open(segment.path, "ab") as dst:
+                    while offset < size and room > 0:
+                        data = src.read(min(self.chunk_size, size - offset, room))
+                        if not data:
+                            size = offset
+                            break
+                        self._write_record(dst, segment, data, final=False)
+                        offset += len(data)
+                        written += len(data)
+                        room -= len(data)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self._offsets[source_path] = offset
+                if segment.plaintext_bytes >= self.segment_bytes:
+                    self._close_segment(source_path)
+        return written
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def sync(self):
+        """Encrypt any bytes appended to the logs since the last sync."""
+        with self._lock:
+            if self._finalized:
+                return 0
+            start = time.perf_counter()
+            written = sum(self._sync_source(path) for path in self.source_paths)
+            self.last_sync_seconds = time.perf_counter() - start
+            return written
+
+    def notify(self):
+        """Called after a log append; the background thread picks the delta up."""
+        self._wake.set()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="shadow-export", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(SYNC_INTERVAL_SECONDS)
+            if self._stop:
+                break
+            # Let multi-record writes (block-mode votes) land before syncing.
+            time.sleep(SYNC_DEBOUNCE_SECONDS)
+            self._wake.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"[shadow] Sync failed: {e}")
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self._thread = None
+
+    def finalize(self):
+        """
+        Stop background syncing, encrypt the remaining delta and close every
+        open segment.  Returns {absolute source path: [closed segment paths in order]}.
+        Raises if a segment set does not cover its whole log.
+        """
+        self.stop()
+        with self._lock:
+            if not self._finalized:
+                for path in self.source_paths:
+                    self._sync_source(path)
+                    self._close_segment(path)
+                self._finalized = True
+
+            result = {}
+            for path in self.source_paths:
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if self._offsets[path] != size:
+                    raise RuntimeError(
+                        f"Shadow copy of {os.path.basename(path)} covers {self._offsets[path]} "
+                        f"of {size} bytes"
+                    )
+                result[path] = list(self._closed[path])
+            return result
+
+    def status_text(self):
+        with self._lock:
+            covered = sum(self._offsets.values())
+            segments = sum(len(v) for v in self._closed.values()) + len(self._open)
+        last = "never" if self.last_sync_seconds is None else f"{self.last_sync_seconds * 1000:.0f} ms"
+        return f"{covered} bytes in {segments} segment(s), last sync {last}"
@@ -0,0 +1,256 @@
+"""
+ticket_templates.py  ─  Pre-encoded ESC/POS for the officer tickets.
+
+The startup, end-of-election, challenge and provisioning tickets are mostly
+fixed text: bars, centred headers, labels and style changes.  They used to
+go out as dozens of separate p.set()/p.text() calls, each its own write to
+the printer.  A TicketTemplate encodes the fixed parts once (through an
+escpos Dummy printer with the real printer's profile) into byte runs with
+named slots in between; printing fills the slots and sends the whole slip
+with one write.  The same fields always give the same bytes.
+
+Template text uses str.format placeholders for one-line fields:
+
+    t.format("Device MAC : {mac}\\n")     static "Device MAC : ", slot mac, static "\\n"
+    t.slot("qr")                         a slot filled with pre-rendered bytes
+
+render() encodes str values with a FieldEncoder (same code page handling as
+p.text()) and inserts bytes values (QR codes from FieldEncoder.capture())
+as they are.
+
+Usage:
+    templates = build_ticket_templates(bar, center_line, printer.profile)
+    encoder = FieldEncoder(printer.profile)
+    slip = templates["challenge"].render(encoder, qr=qr_bytes, sel_str=..., ...)
+    printer._raw(slip)
+"""
+
+import string
+
+try:
+    from escpos.printer import Dummy
+except ImportError:
+    Dummy = None
+
+
+def _dummy_printer(profile):
+    if Dummy is None:
+        raise RuntimeError("python-escpos is not installed")
+    if profile is None or isinstance(profile, str):
+        return Dummy(profile=profile)
+    # A live printer's profile object; escpos only looks profiles up by name.
+    printer = Dummy()
+    printer.profile = profile
+    return printer
+
+
+class TicketTemplate:
+    """Static ESC/POS byte runs with named slots in between."""
+
+    def __init__(self, name, parts):
+        self.name = name
+        self.parts = parts   # bytes (static) or str (slot name)
+
+    @property
+    def slots(self):
+        return [part for part in self.parts if isinstance(part, str)]
+
+    def static_size(self):
+        return sum(len(part) for part in self.parts if isinstance(part, bytes))
+
+    def render(self, encoder, **values):
+        missing = [name for name in self.slots if name not in values]
+        if missing:
+            raise KeyError(f"{self.name} ticket is missing {', '.join(missing)}")
+        chunks = []
+        for part in self.parts:
+            if isinstance(part, bytes):
+                chunks.append(part)
+                continue
+            value = values[part]
+            chunks.append(value if isinstance(value, bytes) else encoder.text(str(value)))
+        return b"".join(chunks)
+
+
+class TemplateBuilder:
+    """Records p.text()/p.set()/p.cut() calls into a TicketTemplate."""
+
+    def __init__(self, name, profile=None):
+        self.name = name
+        self._printer = _dummy_printer(profile)
+        self._parts = []
+
+    def _flush(self):
+        output = self._printer.output
+        if output:
+            self._parts.append(output)
+            self._printer.clear()
+
+    def text(self, txt):
+        self._printer.text(txt)
+
+    def set(self, **kwargs):
+        self._printer.set(**kwargs)
+
+    def cut(self, **kwargs):
+        self._printer.cut(**kwargs)
+
+    def slot(self, name):
+        self._flush()
+        self._parts.append(name)
+
+    def format(self, pattern):
+        for literal, field, _, _ in string.Formatter().parse(pattern):
+            if literal:
+                self.text(literal)
+            if field:
+                self.slot(field)
+
+    def build(self):
+        self._flush()
+        return TicketTemplate(self.name, self._parts)
+
+
+class FieldEncoder:
+    """Encodes slot values the way p.text() on the real printer would."""
+
+    def __init__(self, profile=None):
+        self._printer = _dummy_printer(profile)
+        # Templates already select the code page; do not repeat it per field.
+        self._printer.text(" ")
+        self._printer.clear()
+
+    def _take(self):
+        output = self._printer.output
+        self._printer.clear()
+        return output
+
+    def text(self, txt):
+        self._printer.text(txt)
+        return self._take()
+
+    def capture(self, draw):
+        """Bytes that draw(printer) sends, e.g. lambda p: p.image(img)."""
+        try:
+            draw(self._printer)
+            return self._take()
+        finally:
+            self._printer.clear()
+
+
+def _startup_ticket(t, bar, center):
+    # Send in reverse order due to 180° rotation
+    t.text("Keep this slip for auditing.\n")
+    t.text("ELECTION READY\n")
+    t.text(bar + "\n")
+    t.set(align='left')
+    t.slot("qr")
+    t.slot("hash_lines")
+    t.set(align='left', bold=False)
+    t.text("GENESIS SEED (RECORD THIS):\n")
+    t.set(align='left', bold=True)
+    t.format("Log Volume : {log_dir}\n")
+    t.format("Device MAC : {mac}\n")
+    t.format("Votes Cast : {votes_cast}\n")
+    t.format("Wifi Status : {wifi}\n")
+    t.format("SSH Status : {ssh}\n")
+    t.format("Bluetooth Status : {bluetooth}\n")
+    t.set(align='left', bold=False)
+    t.text(bar + "\n")
+    t.format("{timestamp}\n")
+    t.text(center("GENESIS BLOCK CREATED") + "\n")
+    t.text(center("EVM STARTUP PROTOCOL") + "\n")
+    t.text(bar + "\n")
+    t.set(align='left', font='a', width=1, height=1, bold=True)
+    t.cut(mode='FULL')
+    t.text("\n\n\n\n\n\n") # Extra feed after cut
+
+
+def _end_ticket(t, bar, center):
+    t.text("Submit this slip with USB.\n")
+    t.text("SAFE TO POWER OFF\n")
+    t.text(bar + "\n")
+    t.set(align='left')
+    t.slot("qr")
+    t.slot("hash_lines")
+    t.set(align='left', bold=False)
+    t.text("FINAL SEED (RECORD THIS):\n")
+    t.set(align='left', bold=True)
+    t.format("Export Dir : {export_path}\n")
+    t.format("Device MAC : {mac}\n")
+    t.set(align='left', bold=False)
+    t.text(bar + "\n")
+    t.format("{timestamp}\n")
+    t.text(center("FINAL BLOCK SEALED") + "\n")
+    t.text(center("ELECTION TERMINATED") + "\n")
+    t.text(bar + "\n")
+    t.set(align='left', font='a', width=1, height=1, bold=True)
+    t.cut(mode='FULL')
+    t.text("\n\n\n\n\n\n") # Extra feed after cut
+
+
+def _challenge_ticket(t, bar, center):
+    t.text("vote was NOT counted.\n")
+    t.text("Keep this slip to verify your\n")
+    t.text("This ballot was CHALLENGED.\n")
+    t.text(bar + "\n")
+    t.slot("qr")
+    t.set(align='left', bold=False)
+    t.set(align='left', bold=True)
+    t.format("Choice    : {sel_str}\n")
+    t.set(align='left', bold=False)
+    t.set(align='left')
+    t.format("Ballot ID : {ballot_id}\n")
+    t.text(bar + "\n")
+    t.format("{timestamp}\n")
+    t.set(align='left', bold=False)
+    t.text(center("  (NOT A CAST VOTE)  ") + "\n")
+    t.text(center("** CHALLENGE RECEIPT **") + "\n")
+    t.text(bar + "\n")
+    t.set(align='left', font='a', width=1, height=1, bold=True)
+    t.cut(mode='FULL')
+    t.text("\n\n\n\n\n\n") # Extra feed after cut
+
+
+def _provision_ticket(t, bar, center):
+    # Everything up to the cut; the caller waits for the slip to print first.
+    t.text("SEND TO ELECTION ADMIN\n")
+    t.text(bar + "\n")
+    t.text("BMD PROVISIONING RECEIPT\n")
+    t.text(bar + "\n")
+    t.set(align='left', bold=False)
+    t.format("Date/Time  : {timestamp}\n")
+    t.format("BMD ID     : {bmd_id}\n")
+    t.format("HW Binding : {hw_label}\n\n")
+    t.set(align='left', bold=True)
+    t.text("QR: BMD ID + FULL PUBLIC KEY\n")
+    t.set(align='left', bold=False)
+    t.slot("qr")
+    t.text("\n")
+    t.set(align='left', bold=True)
+    t.text("PUBLIC KEY (PEM):\n")
+    t.set(align='left', bold=False)
+    t.slot("public_key")
+    t.text("\n" + bar + "\n")
+    t.text("KEEP THIS SLIP FOR SETUP\n")
+    t.text(bar + "\n")
+    t.set(align='left', font='a', width=1, height=1, bold=True)
+    t.text("\n\n\n\n\n\n\n\n")
+
+
+TICKETS = {
+    "startup": _startup_ticket,
+    "end": _end_ticket,
+    "challenge": _challenge_ticket,
+    "provision": _provision_ticket,
+}
+
+
+def build_ticket_templates(bar, center, profile=None):
+    """Encode every ticket in TICKETS; bar is the full-width rule, center centres a line."""
+    templates = {}
+    for name, define in TICKETS.items():
+        builder = TemplateBuilder(name, profile)
+        define(builder, bar, center)
+        templates[name] = builder.build()
+    return templates
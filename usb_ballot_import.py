@@ -30,13 +30,11 @@ import os
 import json
 import base64
 import shutil
-import struct
 from pathlib import Path
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-import hardware_crypto
+from chunked_aead import decrypt_envelope
+from key_service import get_key_service
 
 
 class USBBallotImporter:
@@ -83,12 +81,7 @@ class USBBallotImporter:
             raise FileNotFoundError(f"Private key not found at {self.private_key_path}")
         
         try:
-            passphrase = hardware_crypto.get_hardware_passphrase()
-            with open(self.private_key_path, "rb") as kf:
-                self.private_key = serialization.load_pem_private_key(
-                    kf.read(),
-                    password=passphrase
-                )
+            self.private_key = get_key_service().get_private_key(self.private_key_path)
             print("✓ Private key unlocked with hardware identity")
         except Exception as e:
             # Check if this is due to password mismatch (indicates non-RPi environment)
@@ -241,23 +234,8 @@ class USBBallotImporter:
             raise ValueError(f"Invalid nonce length {len(nonce_base)} in {ballot_enc_path}; expected 12 bytes")
         
         try:
-            aesgcm = AESGCM(self.decrypted_aes_key)
-            plaintext_parts = []
-
             # Decrypt each chunk independently using chunk-specific nonce + AAD(chunk_index).
-            for chunk_index, chunk_b64 in enumerate(chunks):
-                chunk_ciphertext = base64.b64decode(chunk_b64)
-
-                chunk_nonce = bytearray(nonce_base)
-                idx_bytes = struct.pack(">I", chunk_index)
-                for i in range(4):
-                    chunk_nonce[-(i + 1)] ^= idx_bytes[-(i + 1)]
-
-                aad = struct.pack(">I", chunk_index)
-                chunk_plaintext = aesgcm.decrypt(bytes(chunk_nonce), chunk_ciphertext, aad)
-                plaintext_parts.append(chunk_plaintext)
-
-            decrypted_ballot = b"".join(plaintext_parts)
+            decrypted_ballot = decrypt_envelope(self.decrypted_aes_key, ballot_data)
 
             # Parse the JSON
             ballot_json = json.loads(decrypted_ballot.decode('utf-8'))
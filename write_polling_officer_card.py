@@ -5,10 +5,15 @@ Usage:
   python write_polling_officer_card.py --command END_ELECTION_EXPORT
   python write_polling_officer_card.py --set-window "2026-04-18 16:00" "2026-04-18 18:00"
   python write_polling_officer_card.py --extend-end-minutes 30
+  python write_polling_officer_card.py --legacy-layout
 
 Card payload format:
   YOU WILL NEVER WALK ALONE
   YOU WILL NEVER WALK ALONE\nEND_ELECTION_EXPORT
+
+The payload is written in the v2 card layout (card_format.py: header block
+with length and CRC32).  --legacy-layout writes the old null-terminated
+layout for BMDs still running a reader without v2 support.
 """
 
 import argparse
@@ -39,6 +44,11 @@ def main():
         metavar="MINUTES",
         help="Write EXTEND_END_MINUTES command",
     )
+    parser.add_argument(
+        "--legacy-layout",
+        action="store_true",
+        help="Write the old null-terminated layout instead of the v2 header layout",
+    )
     args = parser.parse_args()
 
     command_text = ""
@@ -59,7 +69,9 @@ def main():
         raise SystemExit("RFID reader not connected.")
 
     print("Place RFID card on reader...")
-    uid_hex = svc.write_plaintext_card_payload(payload, wait_seconds=30)
+    uid_hex = svc.write_plaintext_card_payload(
+        payload, wait_seconds=30, legacy_layout=args.legacy_layout
+    )
     print(f"Card written successfully. UID={uid_hex}")
     print("Payload written:")
     print(payload)
@@ -0,0 +1,119 @@
+"""Write (or migrate) an encrypted voter token to an RFID card.
+
+Usage:
+  python write_voter_card.py --token '{"token_id": "SESSION_123", "voter_id": "VOTER_1044A", "eid_vector": "e1;e2", "booth": 1}'
+  python write_voter_card.py --token-file token.json --format rsa-legacy --public-key public.pem
+  python write_voter_card.py --migrate
+
+Formats (see card_format.py / card_crypto.py):
+  x25519      compact ECIES payload, ~9 blocks (default; needs card_x25519_pub.pem)
+  rsa-raw     raw RSA-OAEP ciphertext with v2 header, 17 blocks (public.pem)
+  rsa-b64     base64 RSA-OAEP ciphertext with v2 header, 23 blocks (public.pem)
+  rsa-legacy  original null-terminated base64 layout, 22 blocks (public.pem)
+
+--migrate reads the card on the reader with this BMD's keys, then rewrites
+the same token in --format.  Every BMD reads all formats, so cards can be
+migrated gradually; write rsa-legacy only for BMDs that have not been
+updated yet.
+"""
+
+import argparse
+import base64
+import json
+import os
+
+from card_crypto import (
+    CARD_PUBLIC_KEY_FILE,
+    encrypt_card_token_rsa,
+    encrypt_card_token_x25519,
+    load_public_key,
+)
+from card_format import (
+    FORMAT_RSA_OAEP_B64,
+    FORMAT_RSA_OAEP_RAW,
+    FORMAT_X25519_AESGCM,
+    blocks_for_length,
+)
+from rfid_service import RFIDService
+
+FORMATS = ("x25519", "rsa-raw", "rsa-b64", "rsa-legacy")
+
+
+def encode_token(token_bytes, fmt, public_key):
+    """Return (card_format, payload_bytes, legacy_layout) for write_card_payload."""
+    if fmt == "x25519":
+        return FORMAT_X25519_AESGCM, encrypt_card_token_x25519(public_key, token_bytes), False
+
+    ciphertext = encrypt_card_token_rsa(public_key, token_bytes)
+    if fmt == "rsa-raw":
+        return FORMAT_RSA_OAEP_RAW, ciphertext, False
+    text = base64.b64encode(ciphertext)
+    if fmt == "rsa-b64":
+        return FORMAT_RSA_OAEP_B64, text, False
+    return FORMAT_RSA_OAEP_B64, text, True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write an encrypted voter token to an RFID card")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--token", help="Token JSON text")
+    source.add_argument("--token-file", help="File holding the token JSON")
+    source.add_argument("--migrate", action="store_true",
+                        help="Re-encrypt the token already on the card in --format")
+    parser.add_argument("--format", choices=FORMATS, default="x25519",
+                        help="Card payload format (default: x25519)")
+    parser.add_argument("--public-key",
+                        help=f"Public key to encrypt to (default: {CARD_PUBLIC_KEY_FILE} for x25519, "
+                             "public.pem for RSA formats)")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    public_key_path = args.public_key or os.path.join(
+        script_dir, CARD_PUBLIC_KEY_FILE if args.format == "x25519" else "public.pem"
+    )
+    if not os.path.exists(public_key_path):
+        raise SystemExit(f"Public key not found: {public_key_path}")
+    public_key = load_public_key(public_key_path)
+
+    svc = RFIDService()
+    if not svc.connect():
+        raise SystemExit("RFID reader not connected.")
+
+    expected_uid = None
+    if args.migrate:
+        print("Place the voter card to migrate on the reader...")
+        res = None
+        for _ in range(60):
+            res = svc.read_card(mode="encrypted")
+            if res is not None:
+                break
+        if res is None or res[0] == "error":
+            raise SystemExit("Could not read and decrypt the card on this BMD.")
+        expected_uid, token_text = res
+        try:
+            json.loads(token_text)
+        except ValueError:
+            raise SystemExit("Card does not hold a voter token (plain-text card?).")
+    elif args.token_file:
+        with open(args.token_file, "r", encoding="utf-8") as f:
+            token_text = f.read().strip()
+    else:
+        token_text = args.token.strip()
+
+    # Compact JSON keeps the payload (and the number of card blocks) small.
+    token_bytes = json.dumps(json.loads(token_text), separators=(",", ":")).encode("utf-8")
+    card_format, payload, legacy_layout = encode_token(token_bytes, args.format, public_key)
+
+    if not args.migrate:
+        print("Place RFID card on reader...")
+    uid_hex = svc.write_card_payload(payload, card_format, wait_seconds=30, legacy_layout=legacy_layout)
+    if expected_uid is not None and uid_hex != expected_uid:
+        print(f"WARNING: migrated token was written to a different card (read {expected_uid}, wrote {uid_hex}).")
+
+    blocks = blocks_for_length(len(payload) + 1) if legacy_layout else 1 + blocks_for_length(len(payload))
+    print(f"Card written successfully. UID={uid_hex} format={args.format} "
+          f"payload={len(payload)} bytes ({blocks} data blocks)")
+
+
+if __name__ == "__main__":
+    main()